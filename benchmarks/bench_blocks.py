@@ -0,0 +1,75 @@
+"""
+Benchmark of basic-block engine vs interpreter of assembler.
+
+Measures steps per second of Assembler.run and BlockEngine.run on lab
+programs and on a loop-heavy program. Compilation of blocks is done
+once and isn't included.
+
+Run from the root of repository:
+    python3 benchmarks/bench_blocks.py
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.assembler_lang import Assembler
+from pyasm.block_engine import BlockEngine
+
+REPEAT = 200
+
+# Sum of numbers from 0xFF to 1 with masking of the partial sum
+LOOP_PROGRAM = """
+PUSH #FF
+POP R1
+LOOP:
+    PUSH R2
+    PUSH R1
+    ADD
+    POP R2
+    PUSH R2
+    PUSH #7F
+    AND
+    POP @F0
+    PUSH R1
+    DEC
+    POP R1
+    PUSH R1
+    PUSH #00
+    CMP
+    NJZ LOOP
+"""
+
+
+def bench(assembler, run):
+    """
+    Steps per second of run function
+    """
+    steps = 0
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        assembler.reset_all()
+        steps += run().steps
+    return steps / (time.perf_counter() - start)
+
+
+def main():
+    programs = []
+    for name in ['lab1.ass', 'lab2.ass']:
+        with open(os.path.join(ROOT, name), 'r') as f:
+            programs.append((name, f.read()))
+    programs.append(('loop', LOOP_PROGRAM))
+    for name, program in programs:
+        assembler = Assembler(verbose=False)
+        assembler.input_text_program(program)
+        interpreter = bench(assembler, assembler.run)
+        engine = BlockEngine(assembler)
+        blocks = bench(assembler, engine.run)
+        print(f'{name}: interpreter {interpreter:,.0f} steps/s, '
+            f'blocks {blocks:,.0f} steps/s (x{blocks / interpreter:.1f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark of compiler on a generated 50k-line program.
+
+Compares integer bit-packing code generator vs the previous one, which
+built every command by concatenation of binary strings. Time and memory
+of compiled commands are measured.
+
+Run from the root of repository:
+    python3 benchmarks/bench_compiler.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+from array import array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.lexer import do_lex
+from pyasm.asm_parser import Parser
+from pyasm.compiler import Compiler, COMPILED_TYPECODE
+from pyasm.constants import (
+    CMD_CODES,
+    INPUT_BASE,
+    CMDCODE_LENGTH,
+    LITERAL_LENGTH,
+    ADDRESS_LENGTH,
+    REGISTER_LENGTH,
+)
+
+N_LINES = 50000
+
+
+def to_bin(num, base=INPUT_BASE):
+    return str(bin(int(num, base)))[2:]
+
+
+def legacy_compile_cmd(jumps, cmd_line):
+    """
+    Previous code generator: command as binary string
+    """
+    literal_code = ''.zfill(LITERAL_LENGTH)
+    address_code = ''.zfill(ADDRESS_LENGTH)
+    register_code = ''.zfill(REGISTER_LENGTH)
+    cmd_code = to_bin(CMD_CODES[cmd_line[0][1]], base=10) \
+        .zfill(CMDCODE_LENGTH)
+    if len(cmd_line) == 1:
+        pass
+    elif 'J' in cmd_line[0][1]:
+        jump_address = jumps[cmd_line[1][0]] \
+            if cmd_line[1][1] == 'LABEL' else cmd_line[1][0]
+        address_code = to_bin(str(jump_address), base=10) \
+            .zfill(ADDRESS_LENGTH)
+    elif cmd_line[1][1] == 'LITERAL':
+        literal_code = to_bin(cmd_line[1][0]).zfill(LITERAL_LENGTH)
+    elif cmd_line[1][1] == 'ADDR':
+        if 'R' in cmd_line[1][0]:
+            register_code = to_bin(cmd_line[1][0][1]).zfill(REGISTER_LENGTH)
+            address_code = ''.ljust(ADDRESS_LENGTH, '1')
+        else:
+            address_code = to_bin(cmd_line[1][0]).zfill(ADDRESS_LENGTH)
+    elif cmd_line[1][1] == 'REG':
+        register_code = to_bin(cmd_line[1][0][1]).zfill(REGISTER_LENGTH)
+    return cmd_code + literal_code + address_code + register_code
+
+
+def generate_program(n_lines):
+    """
+    Program from lab1.ass, repeated with unique labels
+    (whole copies only, so every used label is defined)
+    """
+    with open(os.path.join(ROOT, 'lab1.ass'), 'r') as f:
+        lines = f.read().splitlines()
+    program = []
+    n = 0
+    while len(program) + len(lines) <= n_lines:
+        program.extend(
+            line.replace('NEXT_MAX', f'NEXT_MAX{n}')
+                .replace('END_PROGRAM', f'END_PROGRAM{n}')
+            for line in lines
+        )
+        n += 1
+    return '\n'.join(program) + '\n'
+
+
+def measure(compile_program):
+    """
+    Time of compile_program and memory of its result
+    """
+    start = time.perf_counter()
+    compile_program()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    compiled_cmds = compile_program()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return compiled_cmds, elapsed, memory
+
+
+def main():
+    parser = Parser(do_lex(generate_program(N_LINES)))
+    parser.is_valid_code()
+    compiler = Compiler(parser.valid_cmds)
+    compiler.compile()
+    jumps = compiler.jumps
+    cmd_lines = [
+        cmd_line for cmd_line in parser.valid_cmds
+        if cmd_line[0][1] != 'LABEL'
+    ]
+
+    def compile_legacy():
+        return [legacy_compile_cmd(jumps, cmd_line) for cmd_line in cmd_lines]
+
+    def compile_packed():
+        return array(COMPILED_TYPECODE, [
+            compiler.compile_cmd(cmd_line) for cmd_line in cmd_lines
+        ])
+
+    legacy_cmds, legacy, legacy_memory = measure(compile_legacy)
+    packed_cmds, packed, packed_memory = measure(compile_packed)
+    assert [int(cmd, 2) for cmd in legacy_cmds] == list(packed_cmds)
+    print(f'{len(packed_cmds)} commands: '
+        f'strings {legacy * 1000:.0f} ms, {legacy_memory / 2**20:.2f} MiB; '
+        f'integer words {packed * 1000:.0f} ms, '
+        f'{packed_memory / 2**20:.2f} MiB '
+        f'(x{legacy / packed:.1f} faster, '
+        f'x{legacy_memory / packed_memory:.0f} less memory)')
+
+
+if __name__ == '__main__':
+    main()
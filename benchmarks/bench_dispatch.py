@@ -0,0 +1,60 @@
+"""
+Microbenchmark of opcode dispatch cost.
+
+Compares linear if/elif chain over command codes (as it was in
+Assembler.execute_code_by_step) with the dispatch table, which is
+built from CMD_CODES. Handlers are empty, so only dispatch is measured.
+
+Run from the root of repository:
+    python3 benchmarks/bench_dispatch.py
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.constants import CMD_CODES, CMDCODE_LENGTH
+
+NUMBER = 200000
+CMDS = ['ADD', 'PUSH', 'JMP', 'NJS', 'MUL', 'ADC']
+
+
+def handler():
+    pass
+
+
+def build_chain():
+    """
+    Generate if/elif chain with the same order, as it was in assembler
+    """
+    lines = ['def dispatch(cmd_code):']
+    for n, code in enumerate(sorted(int(c) for c in CMD_CODES.values())):
+        keyword = 'if' if n == 0 else 'elif'
+        lines.append(f'    {keyword} cmd_code == {code}:')
+        lines.append('        handler()')
+    namespace = {'handler': handler}
+    exec('\n'.join(lines), namespace)
+    return namespace['dispatch']
+
+
+def main():
+    chain = build_chain()
+    table = [handler] * 2**CMDCODE_LENGTH
+    for code in CMD_CODES.values():
+        table[int(code)] = handler
+
+    for name in CMDS:
+        code = int(CMD_CODES[name])
+        chain_time = timeit.timeit(
+            lambda: chain(code), number=NUMBER)
+        table_time = timeit.timeit(
+            lambda: table[code](), number=NUMBER)
+        print(f'{name:5} ({code:2}): '
+            f'chain {chain_time / NUMBER * 1e9:6.1f} ns, '
+            f'table {table_time / NUMBER * 1e9:6.1f} ns')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Microbenchmark of flags update.
+
+Compares eager update of all five flags in dict after every result
+(as it was in Assembler) with lazy Flags, which store only the result.
+Typical sequence is several results and one conditional jump, which
+reads one flag.
+
+Run from the root of repository:
+    python3 benchmarks/bench_flags.py
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.constants import LITERAL_LENGTH
+from pyasm.flags import Flags
+
+NUMBER = 200000
+# Count of results before every read of flag
+RESULTS_PER_JUMP = [1, 3, 10]
+LIMIT = 2**LITERAL_LENGTH
+
+
+def eager_update(flags, res):
+    """
+    Previous update of flags: all of them are computed at once
+    """
+    flags['Z'] = res == 0
+    flags['S'] = res < 0
+    flags['P'] = res % 2 == 0
+    flags['C'] = 2 * LIMIT >= res >= LIMIT
+    flags['O'] = res >= LIMIT
+
+
+def main():
+    eager = dict.fromkeys(['Z', 'S', 'P', 'C', 'O'], False)
+    lazy = Flags(LIMIT)
+
+    for n_results in RESULTS_PER_JUMP:
+        def run_eager():
+            for res in range(n_results):
+                eager_update(eager, res)
+            return eager['Z']
+
+        def run_lazy():
+            for res in range(n_results):
+                lazy.result = res
+            return lazy.zero()
+
+        eager_time = timeit.timeit(run_eager, number=NUMBER)
+        lazy_time = timeit.timeit(run_lazy, number=NUMBER)
+        print(f'{n_results:2} results per jump: '
+            f'eager {eager_time / NUMBER * 1e9:7.1f} ns, '
+            f'lazy {lazy_time / NUMBER * 1e9:7.1f} ns '
+            f'(x{eager_time / lazy_time:.1f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark of reloading a big program after a one-line edit.
+
+Compares full Lexer -> Parser -> Compiler pipeline vs IncrementalCompiler,
+which processes only the changed line.
+
+Run from the root of repository:
+    python3 benchmarks/bench_incremental.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.lexer import do_lex
+from pyasm.asm_parser import Parser
+from pyasm.compiler import Compiler
+from pyasm.incremental import IncrementalCompiler
+
+N_LINES = 20000
+N_EDITS = 20
+
+
+def generate_program(n_lines):
+    """
+    Program from lab1.ass, repeated until n_lines with unique labels
+    """
+    with open(os.path.join(ROOT, 'lab1.ass'), 'r') as f:
+        lines = f.read().splitlines()
+    program = []
+    n = 0
+    while len(program) < n_lines:
+        program.extend(
+            line.replace('NEXT_MAX', f'NEXT_MAX{n}')
+                .replace('END_PROGRAM', f'END_PROGRAM{n}')
+            for line in lines
+        )
+        n += 1
+    return program[:n_lines]
+
+
+def full_compile(program_text):
+    parser = Parser(do_lex(program_text))
+    parser.is_valid_code()
+    compiler = Compiler(parser.valid_cmds)
+    compiler.compile()
+    return compiler.compiled_cmds
+
+
+def main():
+    lines = generate_program(N_LINES)
+    frontend = IncrementalCompiler()
+    frontend.compile('\n'.join(lines))
+    full = incremental = 0
+    for n in range(N_EDITS):
+        # Edit of one line in the middle of program
+        lines[N_LINES // 2] = f'PUSH #{n:02X}'
+        program_text = '\n'.join(lines)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            compiled_cmds = full_compile(program_text)
+            full += time.perf_counter() - start
+            start = time.perf_counter()
+            frontend.compile(program_text)
+            incremental += time.perf_counter() - start
+        assert frontend.compiled_cmds == compiled_cmds
+    print(f'{N_LINES} lines, {N_EDITS} edits: '
+        f'full {full / N_EDITS * 1000:.1f} ms, '
+        f'incremental {incremental / N_EDITS * 1000:.1f} ms '
+        f'(x{full / incremental:.1f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark of lexer on a generated 100k-line program.
+
+Compares do_lex with single master regex vs the previous lexer, which
+tried every pattern of token_exprs at every position.
+
+Run from the root of repository:
+    python3 benchmarks/bench_lexer.py
+"""
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.lexer import do_lex, token_exprs
+from pyasm.machine import DEFAULT_MACHINE
+
+N_LINES = 100000
+
+
+def legacy_lex(characters):
+    """
+    Previous lexer: patterns are tried in order at every position
+    """
+    tokens = []
+    pos = 0
+    while pos < len(characters):
+        match = None
+        for pattern, tag in token_exprs:
+            regex = re.compile(pattern.replace(
+                '{register}', DEFAULT_MACHINE.register_pattern()))
+            match = regex.match(characters, pos)
+            if match:
+                token = [match.group(0), tag]
+                if tag:
+                    if tag in ['LITERAL', 'ADDR']:
+                        token[0] = token[0][1:]
+                    tokens.append(token)
+                break
+        if not match:
+            return False, f"Wrong character '{characters[pos]}'"
+        pos = match.end(0)
+    return tokens
+
+
+def generate_program(n_lines):
+    """
+    Program from lab1.ass, repeated until n_lines with unique labels
+    """
+    with open(os.path.join(ROOT, 'lab1.ass'), 'r') as f:
+        lines = f.read().splitlines()
+    program = []
+    n = 0
+    while len(program) < n_lines:
+        program.extend(
+            line.replace('NEXT_MAX', f'NEXT_MAX{n}')
+                .replace('END_PROGRAM', f'END_PROGRAM{n}')
+            for line in lines
+        )
+        n += 1
+    return '\n'.join(program[:n_lines]) + '\n'
+
+
+def main():
+    program = generate_program(N_LINES)
+    start = time.perf_counter()
+    tokens = do_lex(program)
+    master = time.perf_counter() - start
+    start = time.perf_counter()
+    legacy_tokens = legacy_lex(program)
+    legacy = time.perf_counter() - start
+    assert [list(token[:2]) for token in tokens] == legacy_tokens
+    print(f'{N_LINES} lines, {len(tokens)} tokens: '
+        f'legacy {legacy:.2f} s, master regex {master:.2f} s '
+        f'(x{legacy / master:.1f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark of parser on generated programs of different sizes.
+
+Parser is table-driven, so time has to grow linearly with count of lines.
+
+Run from the root of repository:
+    python3 benchmarks/bench_parser.py
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.lexer import do_lex
+from pyasm.asm_parser import Parser
+
+SIZES = [1000, 10000, 100000]
+
+
+def generate_program(n_lines):
+    """
+    Program from lab1.ass, repeated until n_lines with unique labels
+    """
+    with open(os.path.join(ROOT, 'lab1.ass'), 'r') as f:
+        lines = f.read().splitlines()
+    program = []
+    n = 0
+    while len(program) < n_lines:
+        program.extend(
+            line.replace('NEXT_MAX', f'NEXT_MAX{n}')
+                .replace('END_PROGRAM', f'END_PROGRAM{n}')
+            for line in lines
+        )
+        n += 1
+    return '\n'.join(program[:n_lines]) + '\n'
+
+
+def main():
+    for n_lines in SIZES:
+        tokens = do_lex(generate_program(n_lines))
+        start = time.perf_counter()
+        parser = Parser(tokens)
+        is_valid, _ = parser.is_valid_code()
+        elapsed = time.perf_counter() - start
+        assert is_valid
+        print(f'{n_lines:>7} lines, {len(tokens):>7} tokens: '
+            f'{elapsed * 1000:7.1f} ms '
+            f'({len(tokens) / elapsed / 1e6:.2f} M tokens/s)')
+
+
+if __name__ == '__main__':
+    main()
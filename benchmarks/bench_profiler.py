@@ -0,0 +1,51 @@
+"""
+Benchmark of execution profiler.
+
+Measures steps per second of headless Assembler.run with and without
+profiler, and prints profile of every program.
+
+Run from the root of repository:
+    python3 benchmarks/bench_profiler.py
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.assembler_lang import Assembler
+
+PROGRAMS = ['lab1.ass', 'lab2.ass']
+REPEAT = 300
+
+
+def bench_run(assembler):
+    """
+    Steps per second of headless run
+    """
+    steps = 0
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        assembler.reset_all()
+        steps += assembler.run().steps
+    return steps / (time.perf_counter() - start)
+
+
+def main():
+    for name in PROGRAMS:
+        with open(os.path.join(ROOT, name), 'r') as f:
+            program = f.read()
+        assembler = Assembler(verbose=False)
+        assembler.input_text_program(program)
+        plain = bench_run(assembler)
+        profiler = assembler.enable_profiler()
+        profiled = bench_run(assembler)
+        print(f'{name}: {plain:,.0f} steps/s w/o profiler, '
+            f'{profiled:,.0f} steps/s with profiler\n')
+        print(profiler.report(top=5))
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark of interpreter speed on lab programs.
+
+Measures steps per second of Assembler.execute_code_by_step and of
+headless Assembler.run, and also the cost of instruction decoding:
+slicing of binary string on every step (as it was before decode stage)
+vs pre-decoded cache lookup.
+
+Run from the root of repository:
+    python3 benchmarks/bench_steps.py
+"""
+import contextlib
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.assembler_lang import Assembler
+from pyasm.decoder import to_binary_string
+from pyasm.constants import (
+    CMDCODE_LENGTH,
+    LITERAL_LENGTH,
+    REGISTER_LENGTH,
+)
+
+PROGRAMS = ['lab1.ass', 'lab2.ass']
+REPEAT = 300
+
+
+def legacy_decode(cmd):
+    """
+    Decoding of binary string, which was done on every step
+    """
+    cmd_code = int(cmd[:CMDCODE_LENGTH], 2)
+    literal  = int(cmd[CMDCODE_LENGTH:CMDCODE_LENGTH+LITERAL_LENGTH], 2)
+    address  = int(cmd[CMDCODE_LENGTH+LITERAL_LENGTH:-REGISTER_LENGTH], 2)
+    register = int(cmd[-REGISTER_LENGTH:], 2)
+    return cmd_code, literal, address, register
+
+
+def bench_steps(assembler):
+    """
+    Steps per second of step by step execution
+    """
+    steps = 0
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        for _ in range(REPEAT):
+            assembler.reset_all()
+            while assembler.R['PC'] < len(assembler.compiled_cmds):
+                assembler.execute_code_by_step()
+                steps += 1
+    return steps / (time.perf_counter() - start)
+
+
+def bench_run(assembler):
+    """
+    Steps per second of headless run
+    """
+    steps = 0
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        assembler.reset_all()
+        steps += assembler.run().steps
+    return steps / (time.perf_counter() - start)
+
+
+def bench_decode(assembler):
+    """
+    Decodes per second: legacy string slicing vs pre-decoded cache
+    """
+    cmds = [
+        to_binary_string(word) for word in assembler.compiled_cmds
+    ] * REPEAT
+    start = time.perf_counter()
+    for cmd in cmds:
+        legacy_decode(cmd)
+    legacy = len(cmds) / (time.perf_counter() - start)
+
+    decoded_cmds = assembler.decoded_cmds
+    pcs = list(range(len(decoded_cmds))) * REPEAT
+    start = time.perf_counter()
+    for pc in pcs:
+        decoded_cmds[pc]
+    cached = len(pcs) / (time.perf_counter() - start)
+    return legacy, cached
+
+
+def main():
+    for name in PROGRAMS:
+        with open(os.path.join(ROOT, name), 'r') as f:
+            program = f.read()
+        assembler = Assembler()
+        assembler.input_text_program(program)
+        steps_per_sec = bench_steps(assembler)
+        run_steps_per_sec = bench_run(assembler)
+        legacy, cached = bench_decode(assembler)
+        print(f'{name}: {steps_per_sec:,.0f} steps/s by step, '
+            f'{run_steps_per_sec:,.0f} steps/s headless; '
+            f'decode {legacy:,.0f}/s legacy vs {cached:,.0f}/s cached '
+            f'(x{cached / legacy:.1f})')
+
+
+if __name__ == '__main__':
+    main()
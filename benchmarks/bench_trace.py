@@ -0,0 +1,62 @@
+"""
+Benchmark of execution trace.
+
+Measures steps per second of headless Assembler.run without tracer,
+with in-memory ring buffer and with streaming to file, and size of
+trace file per step.
+
+Run from the root of repository:
+    python3 benchmarks/bench_trace.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.assembler_lang import Assembler
+from pyasm.trace import RingTracer, FileTracer, read_trace, RECORD_SIZE
+
+PROGRAMS = ['lab1.ass', 'lab2.ass']
+REPEAT = 300
+
+
+def bench_run(assembler, make_tracer=None):
+    """
+    Steps per second of headless run with tracer from make_tracer
+    """
+    steps = 0
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        assembler.reset_all()
+        if make_tracer is not None:
+            assembler.tracer = make_tracer()
+        steps += assembler.run().steps
+        if isinstance(assembler.tracer, FileTracer):
+            assembler.tracer.close()
+        assembler.tracer = None
+    return steps / (time.perf_counter() - start)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.trc')
+        for name in PROGRAMS:
+            with open(os.path.join(ROOT, name), 'r') as f:
+                program = f.read()
+            assembler = Assembler(verbose=False)
+            assembler.input_text_program(program)
+            plain = bench_run(assembler)
+            ring = bench_run(assembler, RingTracer)
+            stream = bench_run(assembler, lambda: FileTracer(path))
+            n_records = len(read_trace(path))
+            print(f'{name}: {plain:,.0f} steps/s w/o trace, '
+                f'{ring:,.0f} steps/s ring buffer, '
+                f'{stream:,.0f} steps/s file; '
+                f'{n_records} records of {RECORD_SIZE} bytes per run')
+
+
+if __name__ == '__main__':
+    main()
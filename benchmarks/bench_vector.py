@@ -0,0 +1,57 @@
+"""
+Benchmark of lockstep NumPy engine on lab1.ass (find max number).
+
+Every lane gets its own random array in @F1..@FA. Throughput of
+VectorEngine (commands of all lanes per second) is compared with
+Assembler.run, executed for every data set one by one.
+
+Run from the root of repository:
+    python3 benchmarks/bench_vector.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pyasm.assembler_lang import Assembler
+from pyasm.vector_engine import VectorEngine
+
+LANES = [1, 100, 1000, 10000]
+SCALAR_RUNS = 200
+
+
+def main():
+    with open(os.path.join(ROOT, 'lab1.ass'), 'r') as f:
+        program = f.read()
+    assembler = Assembler(verbose=False)
+    assembler.input_text_program(program)
+    rng = np.random.default_rng(0)
+
+    steps = 0
+    start = time.perf_counter()
+    for _ in range(SCALAR_RUNS):
+        assembler.reset_all()
+        for address, value in zip(
+                range(0xF1, 0xFB), rng.integers(0, 256, 10)):
+            assembler.memory[address] = int(value)
+        steps += assembler.run().steps
+    scalar = steps / (time.perf_counter() - start)
+    print(f'Assembler.run: {scalar:,.0f} steps/s')
+
+    for n_lanes in LANES:
+        assembler.reset_all()
+        engine = VectorEngine(assembler, n_lanes)
+        engine.memory[:, 0xF1:0xFB] = rng.integers(0, 256, (n_lanes, 10))
+        start = time.perf_counter()
+        engine.run()
+        vector = engine.steps.sum() / (time.perf_counter() - start)
+        print(f'VectorEngine, {n_lanes:5} lanes: {vector:,.0f} steps/s '
+            f'(x{vector / scalar:.1f})')
+
+
+if __name__ == '__main__':
+    main()
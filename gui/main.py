@@ -1,9 +1,224 @@
 import sys
+import time
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5 import uic
 
-from pyasm.assembler_lang import Assembler
+from pyasm.assembler_lang import (
+    Assembler,
+    StackError,
+    WATCH_READ,
+    WATCH_WRITE,
+)
+from pyasm.incremental import IncrementalCompiler
+from pyasm.constants import (
+    HALT_MAX_STEPS,
+    HALT_ERROR,
+    HALT_BREAKPOINT,
+    HALT_WATCHPOINT,
+)
+
+
+# Max count of cached texts of values
+HEX_TEXT_CACHE_SIZE = 4096
+# Count of commands, which worker executes between checks of buttons
+RUN_CHUNK_STEPS = 20000
+# Halt reasons, after which program can be continued by STEP and RUN
+RESUMABLE_HALTS = {HALT_MAX_STEPS, HALT_BREAKPOINT, HALT_WATCHPOINT}
+# Names of watched accesses for status bar
+WATCH_ACCESS_NAMES = {WATCH_READ: 'read', WATCH_WRITE: 'write'}
+
+# Cache of texts of values: value -> hex text
+hex_texts = {}
+
+
+def hex_text(value):
+    """
+    Text of value for stack and memory views, formatted once
+    """
+    text = hex_texts.get(value)
+    if text is None:
+        if len(hex_texts) >= HEX_TEXT_CACHE_SIZE:
+            hex_texts.clear()
+        text = hex_texts[value] = hex(value).upper()
+    return text
+
+
+class MemoryModel(QtCore.QAbstractTableModel):
+    """
+    Model of memory view, which reads cells straight from assembler.
+    Only visible rows are formatted by view on demand, so refresh
+    after step costs the same for any size of memory.
+    Rows of commands with breakpoints and data cells with watchpoints
+    are colored by marker_color.
+    """
+    HEADERS = ['addr', 'data', 'cmd']
+
+    def __init__(self, assembler, highlight_color, marker_color):
+        super().__init__()
+        self.assembler = assembler
+        self.highlight_color = highlight_color
+        self.marker_color = marker_color
+        self.n_rows = len(assembler.memory)
+        self.pc = assembler.R['PC'] # Highlighted row
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.n_rows
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole \
+                and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        address = index.row()
+        if role == QtCore.Qt.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return hex_text(address)
+            if column == 1:
+                return hex_text(self.assembler.memory[address])
+            valid_cmd_lines = self.assembler.valid_cmd_lines or []
+            if address < len(valid_cmd_lines):
+                return valid_cmd_lines[address].upper()
+            return '-'
+        if role == QtCore.Qt.BackgroundRole:
+            if address == self.pc:
+                return self.highlight_color
+            if self.marker(address) is not None:
+                return self.marker_color
+        if role == QtCore.Qt.ToolTipRole:
+            return self.marker(address)
+        return None
+
+    def marker(self, address):
+        """
+        'breakpoint' or 'watchpoint' for marked row, otherwise None
+        """
+        breakpoints = self.assembler.breakpoints
+        if breakpoints is not None and address < len(breakpoints) \
+                and breakpoints[address]:
+            return 'breakpoint'
+        watchpoints = self.assembler.watchpoints
+        if watchpoints is not None and watchpoints[address]:
+            return 'watchpoint'
+        return None
+
+    def toggle_marker(self, address):
+        """
+        Toggle breakpoint for row of command or watchpoint of reading
+        and writing for data cell. Returns new marker or None.
+        """
+        if address < len(self.assembler.decoded_cmds):
+            self.assembler.toggle_breakpoint(address)
+        else:
+            access = 0 if self.marker(address) else WATCH_READ | WATCH_WRITE
+            self.assembler.set_watchpoint(address, access)
+        self.dataChanged.emit(
+            self.index(address, 0),
+            self.index(address, len(self.HEADERS) - 1),
+        )
+        return self.marker(address)
+
+    def refresh(self, changed=None):
+        """
+        Update changed cells and highlight of PC.
+        changed -- addresses of changed cells, None for all memory
+        """
+        if len(self.assembler.memory) != self.n_rows:
+            self.beginResetModel()
+            self.n_rows = len(self.assembler.memory)
+            self.pc = self.assembler.R['PC']
+            self.endResetModel()
+            return
+        if changed is None:
+            self.dataChanged.emit(
+                self.index(0, 0),
+                self.index(self.n_rows - 1, len(self.HEADERS) - 1),
+            )
+        else:
+            for address in changed:
+                index = self.index(address, 1)
+                self.dataChanged.emit(index, index)
+        previous_pc, self.pc = self.pc, self.assembler.R['PC']
+        for row in {previous_pc, self.pc}:
+            if 0 <= row < self.n_rows:
+                self.dataChanged.emit(
+                    self.index(row, 0),
+                    self.index(row, len(self.HEADERS) - 1),
+                )
+
+    def find(self, text):
+        """
+        Row for address (hex) or label, None if it's not found.
+        Labels are searched by exact name, then by prefix.
+        """
+        text = text.strip().upper()
+        if not text:
+            return None
+        jumps = {
+            label.upper(): address
+            for label, address in self.assembler.jumps.items()
+        }
+        if text in jumps:
+            return jumps[text]
+        try:
+            address = int(text.lstrip('@'), 16)
+        except ValueError:
+            address = None
+        if address is not None and 0 <= address < self.n_rows:
+            return address
+        for label in sorted(jumps):
+            if label.startswith(text):
+                return jumps[label]
+        return None
+
+
+class RunWorker(QtCore.QObject):
+    """
+    Worker for execution of program in separate thread.
+
+    Program is executed by chunks of RUN_CHUNK_STEPS commands, after
+    every chunk progress is published and pause and stop requests are
+    checked. Assembler must not be used by GUI, until finished is
+    emitted.
+    """
+    # Count of executed commands, steps per second, PC
+    progress = QtCore.pyqtSignal(int, float, int)
+    # RunResult of the last chunk
+    finished = QtCore.pyqtSignal(object)
+
+    def __init__(self, assembler, chunk_steps=RUN_CHUNK_STEPS):
+        super().__init__()
+        self.assembler = assembler
+        self.chunk_steps = chunk_steps
+        self.is_stop_requested = False
+
+    def request_stop(self):
+        """
+        Stop execution after the current chunk (is called from GUI)
+        """
+        self.is_stop_requested = True
+
+    def run(self):
+        steps = 0
+        start = time.perf_counter()
+        while True:
+            result = self.assembler.run(max_steps=self.chunk_steps)
+            steps += result.steps
+            self.progress.emit(
+                steps,
+                steps / max(time.perf_counter() - start, 1e-9),
+                result.state['R']['PC'],
+            )
+            if result.halt_reason != HALT_MAX_STEPS \
+                    or self.is_stop_requested:
+                break
+        self.finished.emit(result)
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -24,31 +239,188 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_run.clicked.connect(self.btn_run_click)
         self.btn_reset.clicked.connect(self.btn_reset_click)
         self.btn_load.clicked.connect(self.btn_load_click)
+        self.__add_step_back_button()
+        self.__add_run_control_buttons()
 
         # Used colors
         self.qt_white_color = QtGui.QColor(255, 255, 255)
         self.qt_green_color = QtGui.QColor(127, 201, 127)
+        self.qt_red_color = QtGui.QColor(240, 150, 150)
 
         # Using the previous item to correctly visualize
         # step by step execution program
-        self.previous_mem_item = None
+        self.previous_stack_item = None
+        # Items of stack, which are updated only for changed
+        # cells (see Assembler.take_changes)
+        self.stack_items = []
 
-        self.list_memory.setHeaderLabels(['addr', 'data', 'cmd'])
         self.list_stack.setHeaderLabels(['SP', 'data'])
 
         self.textEdit_input.setLineWrapColumnOrWidth(200)
 
         # Init Assembler class
         self.assembler = Assembler()
+        # Recording of history for step back
+        self.assembler.enable_history()
+        # Front end keeps results for unchanged lines between loads
+        self.frontend = IncrementalCompiler()
+        self.__add_memory_view()
+        # Thread and worker of running program, None if it's not running
+        self.run_thread = None
+        self.run_worker = None
+        # Program is stopped by STOP button and can be only reset
+        self.is_stopped = False
     
+    def __add_step_back_button(self):
+        """
+        Button for step back, placed with STEP button in one row
+        """
+        self.btn_step_back = QtWidgets.QPushButton('BACK')
+        self.btn_step_back.setFont(self.btn_step.font())
+        self.btn_step_back.setStyleSheet(self.btn_step.styleSheet())
+        self.btn_step_back.clicked.connect(self.btn_step_back_click)
+        step_layout = QtWidgets.QHBoxLayout()
+        index = self.verticalLayout_2.indexOf(self.btn_step)
+        self.verticalLayout_2.removeWidget(self.btn_step)
+        self.verticalLayout_2.insertLayout(index, step_layout)
+        step_layout.addWidget(self.btn_step_back)
+        step_layout.addWidget(self.btn_step)
+
+    def __add_run_control_buttons(self):
+        """
+        Buttons for pause and stop of running program,
+        placed with RUN button in one row
+        """
+        self.btn_pause = QtWidgets.QPushButton('PAUSE')
+        self.btn_stop = QtWidgets.QPushButton('STOP')
+        run_layout = QtWidgets.QHBoxLayout()
+        index = self.verticalLayout_2.indexOf(self.btn_run)
+        self.verticalLayout_2.removeWidget(self.btn_run)
+        self.verticalLayout_2.insertLayout(index, run_layout)
+        run_layout.addWidget(self.btn_run)
+        for button, handler in (
+            (self.btn_pause, self.btn_pause_click),
+            (self.btn_stop, self.btn_stop_click),
+        ):
+            button.setFont(self.btn_run.font())
+            button.setStyleSheet(self.btn_run.styleSheet())
+            button.setEnabled(False)
+            button.clicked.connect(handler)
+            run_layout.addWidget(button)
+
+    def __add_memory_view(self):
+        """
+        Table of memory with MemoryModel and search of address or
+        label, placed instead of list_memory
+        """
+        self.memory_model = MemoryModel(
+            self.assembler, self.qt_green_color, self.qt_red_color)
+        self.view_memory = QtWidgets.QTableView()
+        self.view_memory.setModel(self.memory_model)
+        self.view_memory.setFont(self.list_memory.font())
+        self.view_memory.setSelectionBehavior(
+            QtWidgets.QAbstractItemView.SelectRows)
+        self.view_memory.setEditTriggers(
+            QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.view_memory.setShowGrid(False)
+        self.view_memory.setWordWrap(False)
+        self.view_memory.verticalHeader().hide()
+        # Fixed height of rows: view doesn't measure all rows
+        self.view_memory.verticalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.Fixed)
+        self.view_memory.verticalHeader().setDefaultSectionSize(
+            self.view_memory.fontMetrics().height() + 4)
+        self.view_memory.horizontalHeader().setStretchLastSection(True)
+        self.view_memory.doubleClicked.connect(
+            lambda index: self.toggle_marker(index.row()))
+
+        self.edit_memory_search = QtWidgets.QLineEdit()
+        self.edit_memory_search.setPlaceholderText('address or label')
+        self.edit_memory_search.returnPressed.connect(self.btn_go_click)
+        self.btn_go = QtWidgets.QPushButton('GO')
+        self.btn_go.clicked.connect(self.btn_go_click)
+        self.btn_break = QtWidgets.QPushButton('BREAK')
+        self.btn_break.setToolTip(
+            'Toggle breakpoint of command or watchpoint of data cell '
+            'in selected row (or double click on row)')
+        self.btn_break.clicked.connect(self.btn_break_click)
+        search_layout = QtWidgets.QHBoxLayout()
+        search_layout.addWidget(self.edit_memory_search)
+        search_layout.addWidget(self.btn_go)
+        search_layout.addWidget(self.btn_break)
+
+        memory_widget = QtWidgets.QWidget(self.list_memory.parentWidget())
+        memory_widget.setGeometry(self.list_memory.geometry())
+        memory_layout = QtWidgets.QVBoxLayout(memory_widget)
+        memory_layout.setContentsMargins(0, 0, 0, 0)
+        memory_layout.addLayout(search_layout)
+        memory_layout.addWidget(self.view_memory)
+        self.list_memory.hide()
+
+    def btn_go_click(self):
+        """
+        Scroll memory view to address or label from search field
+        """
+        address = self.memory_model.find(self.edit_memory_search.text())
+        if address is None:
+            self.statusbar.showMessage(
+                f'Not found: {self.edit_memory_search.text()}')
+            return
+        index = self.memory_model.index(address, 0)
+        self.view_memory.scrollTo(
+            index, QtWidgets.QAbstractItemView.PositionAtCenter)
+        self.view_memory.selectRow(address)
+
+    def btn_break_click(self):
+        """
+        Toggle breakpoint or watchpoint in selected row of memory view
+        """
+        index = self.view_memory.currentIndex()
+        if not index.isValid():
+            self.statusbar.showMessage('Select row of memory')
+            return
+        self.toggle_marker(index.row())
+
+    def toggle_marker(self, address):
+        """
+        Toggle breakpoint or watchpoint at address, RUN stops on them
+        """
+        if self.run_worker is not None:
+            return
+        marker = self.memory_model.toggle_marker(address)
+        state = 'cleared' if marker is None else 'set'
+        self.statusbar.showMessage(f'{hex_text(address)}: {state}')
+
     def __update_gui_conponents(self, reset=False):
         """
         Updating all components in GUI according to assembler state
         """
         self.__update_flags(reset=reset)
         self.__update_registers(reset=reset)
-        self.__update_stack(reset=reset)
-        self.__update_memory(reset=reset)
+        self.__update_views()
+
+    def __update_views(self):
+        """
+        Updating changed cells of stack and memory views
+        """
+        changes = self.assembler.take_changes()
+        self.__update_stack(changes.stack)
+        self.__update_memory(changes.memory)
+
+    def __move_highlight(self, previous_item, current_item):
+        """
+        Colorize current item instead of previous one.
+        Returns current item.
+        """
+        if previous_item is current_item:
+            return current_item
+        if previous_item is not None:
+            for column in range(previous_item.columnCount()):
+                previous_item.setBackground(column, self.qt_white_color)
+        if current_item is not None:
+            for column in range(current_item.columnCount()):
+                current_item.setBackground(column, self.qt_green_color)
+        return current_item
 
     def __update_flags(self, reset=False):
         """
@@ -84,52 +456,40 @@ class MainWindow(QtWidgets.QMainWindow):
         self.lcd_PC.display(regs[7])
         self.lcd_SP.display(regs[8])
     
-    def __update_stack(self, reset=False):
+    def __update_stack(self, changed=None):
         """
-        Updating stack in GUI according yo assembler state
+        Updating stack in GUI according yo assembler state.
+        changed -- indexes of changed slots, None for all stack
         """
-        #print(self.assembler.stack)
-        self.list_stack.clear()
-        stack_items = []
-        for i, cmd in enumerate(self.assembler.stack):
-            cmd_item = QtWidgets.QTreeWidgetItem()
-            cmd_item.setText(0, hex(i).upper())
-            cmd_item.setText(1, hex(cmd).upper())
-            stack_items.append(cmd_item)
-        self.list_stack.addTopLevelItems(stack_items[::-1])
+        stack = self.assembler.stack
+        if changed is None or len(self.stack_items) != len(stack):
+            self.list_stack.clear()
+            self.previous_stack_item = None
+            self.stack_items = []
+            for i, cmd in enumerate(stack):
+                cmd_item = QtWidgets.QTreeWidgetItem()
+                cmd_item.setText(0, hex_text(i))
+                cmd_item.setText(1, hex_text(cmd))
+                self.stack_items.append(cmd_item)
+            self.list_stack.addTopLevelItems(self.stack_items[::-1])
+        else:
+            for i in changed:
+                self.stack_items[i].setText(1, hex_text(stack[i]))
 
         # Colorize current item
-        current_stack_item = self.list_stack.topLevelItem(
-            len(self.assembler.stack) - self.assembler.R['SP'] - 1
+        self.previous_stack_item = self.__move_highlight(
+            self.previous_stack_item,
+            self.list_stack.topLevelItem(
+                len(stack) - self.assembler.R['SP'] - 1
+            ),
         )
-        current_stack_item.setBackground(0, (self.qt_green_color))
-        current_stack_item.setBackground(1, (self.qt_green_color))
-
-    def __update_memory(self, reset=False):
-        """
-        Updating memory in GUI according yo assembler state
-        """
-        #print(self.assembler.memory)
-        self.list_memory.clear()
-        memory_items = []
-        for i, cmd in enumerate(self.assembler.memory):
-            cmd_item = QtWidgets.QTreeWidgetItem()
-            cmd_item.setText(0, hex(i).upper())
-            cmd_item.setText(1, hex(int(cmd, 2)).upper())
-            cmd_item.setText(2, 
-                            (self.assembler.valid_cmd_lines[i] \
-                                if i < len(self.assembler.valid_cmd_lines) else '-')
-                            .upper())
-            memory_items.append(cmd_item)
-        self.list_memory.addTopLevelItems(memory_items)
 
-        # Colorize current item
-        current_memory_item = self.list_memory.topLevelItem(
-            self.assembler.R['PC']
-        )
-        current_memory_item.setBackground(0, (self.qt_green_color))
-        current_memory_item.setBackground(1, (self.qt_green_color))
-        current_memory_item.setBackground(2, (self.qt_green_color))
+    def __update_memory(self, changed=None):
+        """
+        Updating memory in GUI according yo assembler state.
+        changed -- addresses of changed cells, None for all memory
+        """
+        self.memory_model.refresh(changed)
 
     def btn_step_click(self):
         """
@@ -140,18 +500,132 @@ class MainWindow(QtWidgets.QMainWindow):
             self.btn_step.setEnabled(False)
             self.btn_run.setEnabled(False)
         else:
-            self.assembler.execute_code_by_step()
+            try:
+                self.assembler.execute_code_by_step()
+            except StackError as ex:
+                # Command isn't executed, program can't go further
+                self.statusbar.showMessage(f'{ex.halt_reason}: {ex}')
+                self.btn_step.setEnabled(False)
+                self.btn_run.setEnabled(False)
+            except Exception as ex:
+                # Error of command (e.g. indirect address out of memory)
+                # mustn't escape from Qt slot, it's shown as Assembler.run
+                # reports it
+                self.statusbar.showMessage(
+                    f'{HALT_ERROR}: {type(ex).__name__}: {ex}')
+                self.btn_step.setEnabled(False)
+                self.btn_run.setEnabled(False)
             self.__update_gui_conponents()
     
+    def btn_step_back_click(self):
+        """
+        Button for return to the state before the last step
+        """
+        print("step back")
+        if self.assembler.step_back():
+            self.btn_step.setEnabled(True)
+            self.btn_run.setEnabled(True)
+            self.__update_gui_conponents()
+
     def btn_run_click(self):
         """
         Button for executing all program
         """
         print("run")
-        self.assembler.execute_all_code()
-        self.btn_step.setEnabled(False)
-        self.btn_run.setEnabled(False)
+        self.is_stopped = False
+        self.__set_running(True)
+        self.run_thread = QtCore.QThread()
+        self.run_worker = RunWorker(self.assembler)
+        self.run_worker.moveToThread(self.run_thread)
+        self.run_thread.started.connect(self.run_worker.run)
+        self.run_worker.progress.connect(self.run_progress)
+        self.run_worker.finished.connect(self.run_finished)
+        self.run_thread.start()
+
+    def btn_pause_click(self):
+        """
+        Button for pause of running program, it can be continued
+        by STEP or RUN
+        """
+        print("pause")
+        if self.run_worker is not None:
+            self.btn_pause.setEnabled(False)
+            self.btn_stop.setEnabled(False)
+            self.run_worker.request_stop()
+
+    def btn_stop_click(self):
+        """
+        Button for stop of running program: it's finished as at the
+        end, STEP and RUN are disabled until reset
+        """
+        print("stop")
+        if self.run_worker is not None:
+            self.is_stopped = True
+            self.btn_pause.setEnabled(False)
+            self.btn_stop.setEnabled(False)
+            self.run_worker.request_stop()
+
+    def closeEvent(self, event):
+        """
+        Stop running program before closing of window
+        """
+        if self.run_worker is not None:
+            self.run_worker.request_stop()
+            self.run_thread.quit()
+            self.run_thread.wait()
+        super().closeEvent(event)
+
+    def run_progress(self, steps, steps_per_sec, pc):
+        """
+        Show progress of running program
+        """
+        self.lcd_PC.display(pc)
+        self.statusbar.showMessage(
+            f'Running: {steps:,} steps, {steps_per_sec:,.0f} steps/s')
+
+    def run_finished(self, result):
+        """
+        Show state of program after finish of worker
+        """
+        self.run_thread.quit()
+        self.run_thread.wait()
+        self.run_thread = None
+        self.run_worker = None
+        reason = result.halt_reason
+        if reason == HALT_MAX_STEPS:
+            reason = 'stopped' if self.is_stopped else 'paused'
+        message = f'{reason}: {self.assembler.step_count:,} steps'
+        if result.error is not None:
+            message += f', {result.error}'
+        if result.halt_reason == HALT_WATCHPOINT:
+            hit = self.assembler.watch_hit
+            message += (f', {WATCH_ACCESS_NAMES[hit.access]} of '
+                f'{hex_text(hit.address)} at PC {hit.pc}')
+        self.statusbar.showMessage(message)
+        self.__set_running(False)
+        if result.halt_reason not in RESUMABLE_HALTS or self.is_stopped:
+            self.btn_step.setEnabled(False)
+            self.btn_run.setEnabled(False)
         self.__update_gui_conponents()
+        if result.halt_reason == HALT_BREAKPOINT:
+            self.view_memory.scrollTo(
+                self.memory_model.index(self.assembler.R['PC'], 0),
+                QtWidgets.QAbstractItemView.PositionAtCenter)
+
+    def __set_running(self, is_running):
+        """
+        Enable buttons according to state of running. Assembler must
+        not be changed by GUI, while program is running.
+        """
+        for button in (
+            self.btn_step, self.btn_step_back, self.btn_run,
+            self.btn_reset, self.btn_load, self.btn_break,
+        ):
+            button.setEnabled(not is_running)
+        self.btn_pause.setEnabled(is_running)
+        self.btn_stop.setEnabled(is_running)
+        self.btn_load.setEnabled(
+            not is_running and not self.textEdit_input.isReadOnly())
 
     def btn_reset_click(self):
         """
@@ -159,6 +633,8 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         print("reset")
         self.assembler.reset_all()
+        self.is_stopped = False
+        self.statusbar.clearMessage()
         self.btn_step.setEnabled(True)
         self.btn_run.setEnabled(True)
         self.btn_load.setEnabled(True)
@@ -172,14 +648,16 @@ class MainWindow(QtWidgets.QMainWindow):
         text_program = self.textEdit_input.toPlainText()
         #print(text_program)
         if text_program != '':
-            load_result = self.assembler.input_text_program(
-                text_program.upper()
-            )
+            load_result = self.frontend.compile(text_program.upper())
             if load_result == True:
+                self.assembler.load_program(
+                    self.frontend.compiled_cmds,
+                    self.frontend.valid_cmd_lines,
+                    self.frontend.jumps,
+                )
                 self.textEdit_input.setReadOnly(True)
                 self.btn_load.setEnabled(False)
-                self.__update_memory()
-                self.__update_stack()
+                self.__update_views()
             else:
                 print(load_result)
                 msg = QtWidgets.QMessageBox()
@@ -0,0 +1,25 @@
+import argparse
+import sys
+
+from . import batch, cfg, objfile, trace
+
+
+def main(argv=None):
+    """
+    Command line interface: pyasm <command> ...
+    """
+    parser = argparse.ArgumentParser(
+        prog='pyasm',
+        description='Assembler emulator',
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    batch.add_parser(subparsers)
+    objfile.add_parser(subparsers)
+    trace.add_parser(subparsers)
+    cfg.add_parser(subparsers)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,141 @@
+import os
+import re
 from sys import exit
 
+from .constants import INPUT_BASE
+from .machine import DEFAULT_MACHINE
+
+
+# File with grammar of language
+GRAMMAR_PATH = os.path.join(os.path.dirname(__file__), 'asm_grammar.txt')
+# Rule of the whole program: expressions are repeated by loop of Parser
+PROGRAM_RULE = 'lang'
+# Items of right side of grammar rule: brackets, alternatives, quoted
+# commands, regular expressions of tokens and names of rules
+GRAMMAR_ITEM = re.compile(r"""[()|]|'[^']*'|"[^"]*"|[A-Za-z_]\w*\*?""")
+
+
+def read_grammar(path=GRAMMAR_PATH):
+    """
+    Grammar from file: nonterminal -> list of alternatives.
+    Names in lower case are nonterminals, in upper case -- tags of tokens:
+    quoted commands and names of rules with regular expression of token.
+    Every group in brackets becomes nonterminal '<rule>_<n>'.
+    """
+    rules = []
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if line[0].isspace():
+                # Continuation of the previous rule
+                name, right = rules[-1]
+                rules[-1] = (name, f'{right} {line.strip()}')
+            else:
+                name, right = line.split('->', 1)
+                rules.append((name.strip(), right.strip()))
+    token_rules = {
+        name for name, right in rules if right.startswith('"')
+    }
+    grammar = {}
+
+    def alternatives(name, items, groups):
+        """
+        Alternatives of items until closing bracket
+        """
+        result = [[]]
+        while items and items[0] != ')':
+            item = items.pop(0)
+            if item == '|':
+                result.append([])
+            elif item == '(':
+                group = f'{name}_{len(groups)}'
+                groups.append(group)
+                grammar[group] = alternatives(name, items, groups)
+                items.pop(0)
+                result[-1].append(group)
+            elif item.startswith("'"):
+                result[-1].append(item.strip("'"))
+            elif item in token_rules:
+                result[-1].append(item.upper())
+            else:
+                result[-1].append(item)
+        return result
+
+    for name, right in rules:
+        if name in token_rules or name == PROGRAM_RULE:
+            continue
+        grammar[name] = alternatives(
+            name, GRAMMAR_ITEM.findall(right), [])
+    return grammar
+
+
+# Grammar from asm_grammar.txt: nonterminal -> list of alternatives.
+GRAMMAR = read_grammar()
+
+# Names of tags in error messages
+TAG_NAMES = {
+    'NLINE': 'new line',
+    'ADDR': 'ADDRESS',
+    'REG': 'REGISTER',
+    'COLON': ':',
+}
+
+
+def first_set(symbol):
+    """
+    FIRST set of grammar symbol: tags, which can start it
+    """
+    if symbol not in GRAMMAR:
+        return [symbol]
+    first = []
+    for alternative in GRAMMAR[symbol]:
+        for tag in first_set(alternative[0]):
+            if tag not in first:
+                first.append(tag)
+    return first
+
+
+def expand(symbol, tag):
+    """
+    Terminal sequence of symbol, which starts with tag (LL(1) choice by
+    FIRST sets). Every next position of sequence is a list of tags,
+    one of them is expected there.
+    """
+    if symbol not in GRAMMAR:
+        return [[symbol]]
+    alternatives = [
+        alternative for alternative in GRAMMAR[symbol]
+        if tag in first_set(alternative[0])
+    ]
+    if len(alternatives) != 1:
+        raise ValueError(f"Grammar is not LL(1): '{symbol}' by '{tag}'")
+    first, *rest = alternatives[0]
+    sequence = expand(first, tag)
+    for symbol in rest:
+        # Only one token can be at other positions of commands
+        sequence.append(first_set(symbol))
+    return sequence
+
+
+def build_parse_table():
+    """
+    Table of parser: tag of the first token of expression -> tags, which
+    are expected after it (tuple of frozensets for checking and of lists
+    for error messages)
+    """
+    table = {}
+    for tag in first_set('expr'):
+        expected = expand('expr', tag)[1:]
+        table[tag] = (
+            tuple(frozenset(tags) for tags in expected),
+            tuple(expected),
+        )
+    return table
+
+
+PARSE_TABLE = build_parse_table()
+
 
 class Parser:
     """
@@ -17,7 +153,7 @@ class Parser:
     pop -> 'POP' (addr | reg)
     push -> 'PUSH' (addr | literal | reg)
 
-    arif_op -> 'ADD' | 'SUB' | 'INC' | 'DEC' | 'MUL' | 'ADLC'
+    arif_op -> 'ADD' | 'SUB' | 'INC' | 'DEC' | 'MUL' | 'ADC'
     log_op -> 'AND' | 'OR' | 'XOR' | 'NOR' | 'NOT'
     comp_op -> 'CMP'
     shift_op -> 'SHL' | 'SHR'
@@ -31,236 +167,123 @@ class Parser:
     NLINE -> "[\n]+"
     LABEL -> "[A-Za-z_][A-Za-z0-9_]*"
     COLON -> ":"
+
+    Grammar is LL(1): kind of expression is chosen by tag of its first
+    token through PARSE_TABLE, which is built from FIRST sets of GRAMMAR
+    (read from asm_grammar.txt).
+    After an error parser skips tokens to the next new line and goes on,
+    so all errors are collected in one pass.
+
+    Literals and addresses must fit in parts of command of config
+    (see MachineConfig).
     """
-    def __init__(self, tokens):
+    def __init__(self, tokens, config=DEFAULT_MACHINE):
         self.tokens = tokens # List of tokens after lexer
+        self.config = config
         self.__pos = 0 # Current position in tokens
-        self.__temp = [] # Temporary code lines for validation
-        self.valid_cmds = [] # List of valid cmds
-        self.__n_line = 1 # Number of code line
+        # List of valid cmds: tuple of tokens for every command or label
+        self.valid_cmds = []
+        self.errors = [] # Messages about all errors
         self.error_msg = ''
 
     def exception(self, expected):
-        self.error_msg = f"\nParse error at line {self.__n_line}: " + \
+        self.error_msg = \
+            f"\nParse error at line {self.tokens[self.__pos].line}: " + \
             f"detected '{self.tokens[self.__pos][0]}', " + \
             f"but '{expected}' are expected!"
         print(self.error_msg)
-    
-    def __check_token_tag(self, tag):
+        self.errors.append(self.error_msg)
+
+    def operand_error(self, cmd):
         """
-        Check tag of current token
+        Message about operand of command, which doesn't fit in its part
+        of command, or None
         """
-        if self.tokens[self.__pos][1] == tag:
-            if tag == 'NLINE':
-                self.__n_line += 1
-                if self.__temp:
-                    self.valid_cmds.append(self.__temp)
-                self.__temp = []
+        token = cmd[1]
+        if token[1] == 'LITERAL':
+            name, length = 'literal', self.config.literal_length
+            value = int(token[0], INPUT_BASE)
+        elif token[1] == 'ADDR' and token[0][0] != 'R':
+            name, length = 'address', self.config.address_length
+            if 'J' in cmd[0][1]:
+                # Number of command in jump is decimal
+                if not token[0].isdigit():
+                    return None # Error of compiler, as before
+                value = int(token[0])
             else:
-                self.__temp.append(self.tokens[self.__pos])
-            self.__pos += 1
-
-            return True
-        return False
+                value = int(token[0], INPUT_BASE)
+        else:
+            return None
+        if value >> length:
+            return f"\nParse error at line {token.line}: " + \
+                f"{name} '{token[0]}' doesn't fit in {length} bits!"
+        return None
 
     def is_valid_code(self):
-        return self.__lang(), self.error_msg
+        is_valid = self.__lang()
+        self.error_msg = ''.join(self.errors)
+        return is_valid, self.error_msg
 
     def __lang(self):
         """
         lang -> expr*
         """
-        while(self.__pos < len(self.tokens)):
-            if (not self.__expr()):
-                self.exception("any expression")
-                return False
-        return True    
+        tokens = self.tokens
+        n_tokens = len(tokens)
+        append = self.valid_cmds.append
+        parse_table = PARSE_TABLE
+        pos = 0
+        while pos < n_tokens:
+            tag = tokens[pos][1]
+            if tag == 'NLINE':
+                pos += 1
+                continue
+            rule = parse_table.get(tag)
+            if rule is None:
+                self.__pos = pos
+                self.exception('any expression')
+                pos = self.__skip_line()
+                continue
+            expected_tags, expected = rule
+            start = pos
+            for tags in expected_tags:
+                pos += 1
+                if pos >= n_tokens or tokens[pos][1] not in tags:
+                    self.__pos = min(pos, n_tokens - 1)
+                    self.exception(
+                        self.__expected_text(expected[pos-start-1]))
+                    pos = self.__skip_line()
+                    break
+            else:
+                # Command or label w/o NLINE at the end
+                cmd = tokens[start:pos]
+                if len(cmd) == 2:
+                    error_msg = self.operand_error(cmd)
+                    if error_msg is not None:
+                        print(error_msg)
+                        self.errors.append(error_msg)
+                append(tuple(cmd))
+                pos += 1
+        self.__pos = pos
+        return not self.errors
 
-    def __expr(self):
-        """
-        expr -> (NLINE | common | arifetic | logical | jump | label)
-        """
-        if not (
-            self.__check_token_tag('NLINE') or
-            self.__common() or
-            self.__arifetic() or
-            self.__logical() or
-            self.__jump() or
-            self.__label()
-        ):
-            return False
-        return True  
-
-    def __common(self):
-        """
-        common -> (pop | push | 'NOPE') NLINE
-        """
-        if not (
-            self.__pop() or
-            self.__push() or 
-            self.__check_token_tag('NOPE')
-        ):
-            return False
-        if not self.__check_token_tag('NLINE'):
-            self.exception('new line')
-            return False
-        return True  
-
-    def __arifetic(self):
-        """
-        arifetic -> arif_op NLINE
-        """
-        if not (
-            self.__arif_op()
-        ):
-            return False
-        elif not self.__check_token_tag('NLINE'):
-            self.exception('new line')
-            return False
-        return True  
-
-    def __logical(self):
-        """
-        logical -> (log_op | comp_op | shift_op) NLINE
-        """
-        if not (
-            self.__log_op() or
-            self.__comp_op() or 
-            self.__shift_op() 
-        ):
-            return False
-        elif not self.__check_token_tag('NLINE'):
-            self.exception('new line')
-            return False
-        return True  
-
-    def __jump(self):
+    def __skip_line(self):
         """
-        jump -> jmp_op (addr | LABEL) NLINE
+        Skip tokens to the end of line after error.
+        Returns position after the line.
         """
-        if not self.__jmp_op():
-            return False
-        if not (
-            self.__check_token_tag('ADDR') or
-            self.__check_token_tag('LABEL')
-        ):
-            self.exception('ADDRESS or LABEL')
-            return False
-        if not self.__check_token_tag('NLINE'):
-            self.exception('new line')
-            return False
-        return True
-    
-    def __label(self):
-        """
-        label -> LABEL COLON NLINE
-        """
-        if not self.__check_token_tag('LABEL'):
-            return False
-        if not self.__check_token_tag('COLON'):
-            self.exception(':')
-            return False
-        if not self.__check_token_tag('NLINE'):
-            self.exception('new line')
-            return False
-        return True 
-  
-    def __pop(self):
-        """
-        pop -> 'POP' (addr | reg)
-        """
-        if not self.__check_token_tag('POP'):
-            return False
-        if not (
-            self.__check_token_tag('ADDR') or
-            self.__check_token_tag('REG')
-        ):
-            self.exception('ADDRESS or REGISTER')
-            return False
-        return True       
-
-    def __push(self):
-        """
-        push -> 'PUSH' ('ADDR' | 'LITERAL' | 'REG')
-        """
-        if not self.__check_token_tag('PUSH'):
-            return False
-        if not (
-            self.__check_token_tag('ADDR') or
-            self.__check_token_tag('LITERAL') or
-            self.__check_token_tag('REG')
-        ):
-            self.exception('ADDRESS, LITERAL or REGISTER')
-            return False
-        return True
-
-    def __arif_op(self):
-        """
-        arif_op -> 'ADD' | 'SUB' | 'INC' | 'DEC' | 'MUL' | 'ADC'
-        """
-        if (
-            self.__check_token_tag('ADD') or
-            self.__check_token_tag('SUB') or
-            self.__check_token_tag('INC') or
-            self.__check_token_tag('DEC') or
-            self.__check_token_tag('MUL') or
-            self.__check_token_tag('ADC')
-        ):
-            return True
-        return False
-
-    def __log_op(self):
-        """
-        log_op -> 'AND' | 'OR' | 'XOR' | 'NOR' | 'NOT'
-        """
-        if (
-            self.__check_token_tag('AND') or
-            self.__check_token_tag('OR') or
-            self.__check_token_tag('XOR') or
-            self.__check_token_tag('NOR') or 
-            self.__check_token_tag('NOT')
-        ):
-            return True
-        return False       
-
-    def __comp_op(self):
-        """
-        comp_op -> 'CMP'
-        """
-        if (
-            self.__check_token_tag('CMP') 
-        ):
-            return True
-        return False
+        tokens = self.tokens
+        pos = self.__pos
+        while pos < len(tokens) and tokens[pos][1] != 'NLINE':
+            pos += 1
+        return pos + 1
 
-    def __shift_op(self):
-        """
-        shift_op -> 'SHL' | 'SHR'
-        """
-        if (
-            self.__check_token_tag('SHL') or
-            self.__check_token_tag('SHR')
-        ):
-            return True
-        return False
-
-    def __jmp_op(self):
+    @staticmethod
+    def __expected_text(tags):
         """
-        jmp_op -> 'JC' | 'JZ' | 'JP' | 'JO' | 'JS' | 'JMP'
-            | 'NJC' | 'NJZ' | 'NJP' | 'NJO' | 'NJS'
+        Expected tags for error message: 'A', 'A or B', 'A, B or C'
         """
-        if not (
-            self.__check_token_tag('JC') or
-            self.__check_token_tag('JZ') or
-            self.__check_token_tag('JS') or
-            self.__check_token_tag('JP') or
-            self.__check_token_tag('JO') or
-            self.__check_token_tag('NJC') or
-            self.__check_token_tag('NJZ') or
-            self.__check_token_tag('NJS') or
-            self.__check_token_tag('NJP') or
-            self.__check_token_tag('NJO') or
-            self.__check_token_tag('JMP')
-        ):
-            return False
-        return True
+        names = [TAG_NAMES.get(tag, tag) for tag in tags]
+        if len(names) == 1:
+            return names[0]
+        return ', '.join(names[:-1]) + ' or ' + names[-1]
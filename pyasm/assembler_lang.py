@@ -1,18 +1,109 @@
 from array import array
+from collections import namedtuple
+import time
 import numpy as np
 
-from .lexer import do_lex
-from .asm_parser import Parser
-from .compiler import Compiler
+from .compile_cache import CompiledProgram, default_cache
+from .decoder import decode, PUSH_CODE, POP_CODE
+from .history import (
+    History,
+    command_kinds,
+    KIND_PUSH,
+    KIND_STACK,
+    KIND_FULL,
+)
+from .profiler import Profiler
+from .objfile import ObjectFile
+from .machine import DEFAULT_MACHINE
+from .flags import Flags
+from .cfg import ControlFlowGraph
+from .optimizer import DEFAULT_OPT_LEVEL
 from .constants import (
     CMD_CODES,
     INPUT_BASE,
-    CMDCODE_LENGTH,
-    LITERAL_LENGTH,
-    ADDRESS_LENGTH,
-    REGISTER_LENGTH,
-    FIRST_DATA_ADDRESS,
+    MODE_LITERAL,
+    MODE_DIRECT,
+    MODE_REGISTER,
+    MODE_INDIRECT,
+    HALT_END,
+    HALT_MAX_STEPS,
+    HALT_TIMEOUT,
+    HALT_ERROR,
+    HALT_STACK_OVERFLOW,
+    HALT_STACK_UNDERFLOW,
+    HALT_VALUE_OVERFLOW,
+    HALT_BREAKPOINT,
+    HALT_WATCHPOINT,
+)
+
+
+# Type of memory cells: signed integer, at least 64 bits
+MEMORY_TYPECODE = 'q'
+# Type of stack slots, the same as of memory cells
+STACK_TYPECODE = MEMORY_TYPECODE
+# Values, which can be stored in stack slot
+MIN_VALUE = -2**63
+MAX_VALUE = 2**63 - 1
+# How often (in commands) wall-clock budget of run is checked
+TIME_CHECK_INTERVAL = 1024
+
+# Result of headless run: halt reason (see constants.py), count of
+# executed commands, final state (see Assembler.get_state) and error
+# message, if halt reason is HALT_ERROR or stack is out of bounds
+RunResult = namedtuple(
+    'RunResult',
+    ['halt_reason', 'steps', 'state', 'error'],
 )
+# Cells, which were changed since the last Assembler.take_changes:
+# sets of memory addresses and of stack indexes, None if all of them
+# could be changed
+Changes = namedtuple('Changes', ['memory', 'stack'])
+# Access to watched memory cell, which stopped run: PC of command,
+# address and access (WATCH_READ or WATCH_WRITE)
+WatchHit = namedtuple('WatchHit', ['pc', 'address', 'access'])
+
+# Bits of watchpoints of memory cell
+WATCH_READ = 1
+WATCH_WRITE = 2
+
+
+class StackError(Exception):
+    """
+    Stack is out of bounds or result doesn't fit in stack slot. Command
+    isn't executed, so state is the same as before it, and run stops
+    with halt_reason.
+    """
+    halt_reason = HALT_ERROR
+
+
+class StackOverflowError(StackError):
+    halt_reason = HALT_STACK_OVERFLOW
+
+
+class StackUnderflowError(StackError):
+    halt_reason = HALT_STACK_UNDERFLOW
+
+
+class ValueOverflowError(StackError):
+    halt_reason = HALT_VALUE_OVERFLOW
+
+
+# Registry of instructions: command code -> handler.
+# Every handler gets assembler and pre-decoded Instruction.
+INSTRUCTIONS = {}
+
+
+def instruction(name, code=None):
+    """
+    Decorator for registration of instruction handler by command name.
+    If code is given, new command is also adding to CMD_CODES.
+    """
+    if code is not None:
+        CMD_CODES[name] = str(code)
+    def register(handler):
+        INSTRUCTIONS[int(CMD_CODES[name])] = handler
+        return handler
+    return register
 
 
 class Assembler():
@@ -27,15 +118,17 @@ class Assembler():
         All memory space there are in self.memory, but logical
         separating on two parts: for commands and data.
         Memory ratio for commands and data by default -- 1:3
-        Addresses for commands: [0, FIRST_DATA_ADDRESS - 1]
-        Addresses for data: [FIRST_DATA_ADDRESS: 2**ADDRESS_LENGTH-1]
+        Addresses for commands: [0, first_data_address - 1]
+        Addresses for data: [first_data_address: memory_size-1]
 
-    Inputting RISC commands format:
+    Inputting RISC commands format (wide machine, see MachineConfig):
         X1_X2_X3_X4, 43 bits length
         [0-7]   X1 -- code of command (see constants.py)
         [8-23]  X2 -- literal (Filling zeros if not using)
         [24-39] X3 -- address (Filling zeros if not using)
         [40-42] X4 -- number of register (Filling zeros if not using)
+    Classic machine has 8-bit literals and addresses (27 bits length).
+    Sizes of memory and of registers are taken from config.
     
     Stack machine:
         Using stack for execution all opertions.
@@ -43,148 +136,370 @@ class Assembler():
         2| 0 |
         1| 0 |
         0| A | <<-- Stack Pointer
+        Depth of stack is config.stack_depth. Push to the full stack
+        and pop from the empty one stop execution (see StackError).
     """
-    def __init__(self, compiled_cmds=None, valid_cmd_lines=None):
+    # Cache of compiled programs for input_text_program
+    compile_cache = default_cache
+    # Mapped object file, if program was loaded by load_object
+    object_file = None
+    # Statistics of optimization of loaded program (see optimizer.py),
+    # None, if it wasn't optimized
+    optimization = None
+    # Execution history for step back and seek, None if it's disabled
+    history = None
+    # Tracer of executed commands (see trace.py), None if it's disabled
+    tracer = None
+    # Execution profiler, None if it's disabled
+    profiler = None
+    # Breakpoints: byte for every PC of program, None if there are no
+    # breakpoints. They are cleared on loading of program.
+    breakpoints = None
+    # Watchpoints: WATCH_READ | WATCH_WRITE bits for every memory cell,
+    # None if there are no watchpoints
+    watchpoints = None
+
+    def __init__(self, compiled_cmds=None, valid_cmd_lines=None,
+            verbose=True, jumps=None, config=DEFAULT_MACHINE):
+        # Geometry of machine
+        self.config = config
+        # Results with this value and more have carry and overflow flags
+        self.literal_limit = 2 ** config.literal_length
+        # Printing registers and stack on every step
+        self.verbose = verbose
+        # Count of executed commands
+        self.step_count = 0
+        # Step, on which run was stopped by breakpoint: the next run
+        # executes this command instead of stopping again
+        self.break_step = None
+        # The last access to watched cell, which stopped run
+        self.watch_hit = None
         # Bynary program from compiler
         self.compiled_cmds = compiled_cmds
         # Assembler program
         self.valid_cmd_lines = valid_cmd_lines
-        # List of stack, where will be executing all operations.
-        self.stack = [0x0, 0x0, 0x0, 0x0, 0x0]
-        # List, witch using as memory space for commands and operands.
-        #self.memory = array('i', [0 for _ in range(2**ADDRESS_LENGTH-1)])
+        # Dict of labels from compiler: label->address
+        self.jumps = jumps if jumps is not None else {}
+        # Pre-decoded program, filling once on init_memory
+        self.decoded_cmds = []
+        self.cfg = None
+        # Stack, where will be executing all operations: typed buffer
+        # of config.stack_depth slots. Slots above SP keep old values.
+        self.stack_depth = config.stack_depth
+        self.stack = array(STACK_TYPECODE, [0]) * self.stack_depth
+        # The maximum of SP since reset
+        self.stack_high_water = 0
+        # Typed integer buffer, witch using as memory space for commands
+        # and operands. It supports buffer protocol, so memoryview(memory)
+        # can be used for reading it without copying.
+        self.memory = array(MEMORY_TYPECODE, [0]) * config.memory_size
         if not compiled_cmds is None:
             self.init_memory()
-        # Dictionary of common registers[from 1 to 2**REGISTER_LENGTH-1]
+        # Dictionary of common registers[from 1 to config.n_registers]
         # and also of system registers -- PC and SP
         self.R = { 
-            (i+1): 0 for i in range(2**REGISTER_LENGTH-1)
+            (i+1): 0 for i in range(self.config.n_registers)
         }
         self.R.update({ 
             'PC': 0, # Programm counter.
             'SP': 0, # Stack pointer
         })
-        self.flags = {# Dictionary of flags.
-            'Z': False, # Zero
-            'S': False, # Sign 
-            'P': False, # Parity
-            'C': False, # Carry
-            'O': False, # Overflow
-        }
+        # Flags: zero, sign, parity, carry and overflow. They behave as
+        # dict, but are computed only when they are read (see Flags).
+        self.flags = Flags(self.literal_limit)
+        # Dispatch table: command code -> bound handler
+        self.dispatch = self.__build_dispatch_table()
+        # Kinds of commands by changed state (see history.py)
+        self.change_kinds = command_kinds(INSTRUCTIONS)
+        # Changed memory addresses and stack indexes for GUI, None if
+        # all of them are changed (see take_changes)
+        self.changed_memory = None
+        self.changed_stack = None
     
+    def __build_dispatch_table(self):
+        """
+        Build table of bound handlers, indexed by command code.
+        Unknown commands are ignored, as before.
+        """
+        dispatch = [self.__unknown] * self.config.n_codes
+        for code, handler in INSTRUCTIONS.items():
+            dispatch[code] = handler.__get__(self)
+        return dispatch
+
     def init_memory(self):
         """
-        Init memory
+        Init memory: commands are placing to the start of memory
+        in encoded integer form, other cells are filling by zeros
         """
-        # TODO: fix simple list 
-        self.memory = [cmd for cmd in self.compiled_cmds] + \
-            ['0' for _ in range(
-                2**ADDRESS_LENGTH-len(self.compiled_cmds))]
+        words = self.compiled_cmds
+        if len(words) > self.config.memory_size:
+            raise ValueError(
+                f'Program of {len(words)} commands is not fitting '
+                f'in memory of {self.config.memory_size} cells')
+        self.memory = array(MEMORY_TYPECODE, words) + \
+            array(MEMORY_TYPECODE, [0]) \
+            * (self.config.memory_size-len(words))
+        # Decode stage: every command is decoding only once on load
+        self.decoded_cmds = [decode(word, self.config) for word in words]
+        # Control-flow graph is built on demand (see control_flow_graph)
+        self.cfg = None
+        self.mark_all_changed()
 
     def reset_all(self):
         self.__init__(
             self.compiled_cmds,
             self.valid_cmd_lines,
+            self.verbose,
+            self.jumps,
+            self.config,
         )
+        if self.history is not None:
+            self.history.clear()
     
-    def input_text_program(self, program_text):
-        """
-        Input programm from simple text
-        """
-        tokens = do_lex(program_text)
-        if tokens[0] == False:
-            return tokens[1]
-        parser = Parser(tokens)
-        parse_result = parser.is_valid_code()
-        if parse_result[0]:
-            compiler = Compiler( parser.valid_cmds )
-            compiler.compile()
-            
-            self.valid_cmd_lines = compiler.valid_cmd_lines
-            self.compiled_cmds = compiler.compiled_cmds
-            self.init_memory()
-            return True
-        else:
-            return parse_result[1]
-    
+    def input_text_program(self, program_text, opt_level=DEFAULT_OPT_LEVEL):
+        """
+        Input programm from simple text. Program is optimized, if
+        opt_level isn't 0 (see optimizer.py), statistics of optimization
+        are in self.optimization
+        """
+        program = self.compile_cache.compile(
+            program_text, self.config, opt_level)
+        if not isinstance(program, CompiledProgram):
+            return program
+        self.load_program(
+            program.compiled_cmds,
+            program.valid_cmd_lines,
+            program.jumps,
+        )
+        self.optimization = program.optimization
+        return True
+
+    def load_program(self, compiled_cmds, valid_cmd_lines, jumps):
+        """
+        Load already compiled programm (e.g. from IncrementalCompiler)
+        """
+        self.valid_cmd_lines = valid_cmd_lines
+        self.compiled_cmds = compiled_cmds
+        self.jumps = jumps
+        self.optimization = None
+        self.breakpoints = None
+        self.init_memory()
+        if self.history is not None:
+            self.history.clear()
+        if self.profiler is not None:
+            self.profiler.clear()
+
+    def load_object(self, path):
+        """
+        Load programm from object file (see objfile.py) without
+        lexer, parser and compiler. File stays mapped while it's loaded.
+        """
+        if self.object_file is not None:
+            self.object_file.close()
+        self.object_file = ObjectFile(path, self.config)
+        self.load_program(
+            self.object_file.words,
+            self.object_file.valid_cmd_lines,
+            self.object_file.jumps,
+        )
+
+    def control_flow_graph(self):
+        """
+        Control-flow graph of loaded program (see cfg.py). It's built
+        once per program and shared by block engine and profiler.
+        """
+        if self.cfg is None:
+            self.cfg = ControlFlowGraph(self.decoded_cmds, self.jumps)
+        return self.cfg
+
+    def breakpoint_pc(self, where):
+        """
+        PC of breakpoint by PC or label of program
+        """
+        pc = self.jumps[where] if isinstance(where, str) else where
+        if not 0 <= pc < len(self.decoded_cmds):
+            raise ValueError(f'Breakpoint {where!r} is out of program')
+        return pc
+
+    def set_breakpoint(self, where, enabled=True):
+        """
+        Set (or clear, if not enabled) breakpoint by PC or label.
+        run stops before command at breakpoint with HALT_BREAKPOINT.
+        """
+        pc = self.breakpoint_pc(where)
+        if self.breakpoints is None:
+            if not enabled:
+                return
+            self.breakpoints = bytearray(len(self.decoded_cmds))
+        self.breakpoints[pc] = enabled
+        if not enabled and not any(self.breakpoints):
+            self.breakpoints = None
+
+    def toggle_breakpoint(self, where):
+        """
+        Set or clear breakpoint by PC or label, returns new state
+        """
+        pc = self.breakpoint_pc(where)
+        enabled = self.breakpoints is None or not self.breakpoints[pc]
+        self.set_breakpoint(pc, enabled)
+        return enabled
+
+    def clear_breakpoints(self):
+        self.breakpoints = None
+
+    def set_watchpoint(self, address, access=WATCH_READ | WATCH_WRITE):
+        """
+        Watch reading and (or) writing of memory cell, 0 access clears
+        watchpoint. run stops after command, which has accessed the cell,
+        with HALT_WATCHPOINT and the access in self.watch_hit.
+        """
+        if not 0 <= address < len(self.memory):
+            raise ValueError(f'Watchpoint {address:#x} is out of memory')
+        if self.watchpoints is None:
+            if not access:
+                return
+            self.watchpoints = bytearray(len(self.memory))
+        self.watchpoints[address] = access
+        if not access and not any(self.watchpoints):
+            self.watchpoints = None
+
+    def clear_watchpoints(self):
+        self.watchpoints = None
+
+    def enable_history(self, **limits):
+        """
+        Start recording of execution history, see History for limits
+        """
+        self.history = History(self, **limits)
+
+    def enable_profiler(self):
+        """
+        Start profiling of execution, returns Profiler with counters.
+        Counters are kept after reset_all and cleared on loading of
+        new program.
+        """
+        self.profiler = Profiler(self)
+        return self.profiler
+
+    def has_hooks(self):
+        """
+        History, trace, profiler, breakpoints or watchpoints are enabled,
+        so every command must go through slow path of run
+        """
+        return self.history is not None or self.tracer is not None \
+            or self.profiler is not None or self.breakpoints is not None \
+            or self.watchpoints is not None
+
+    def step_back(self):
+        """
+        Return to the state before the last executed command.
+        Returns False, if history is disabled or it's the start.
+        """
+        if self.history is None:
+            return False
+        return self.history.step_back()
+
+    def seek(self, step):
+        """
+        Go to the state after given count of executed commands.
+        Returns False, if history is disabled.
+        """
+        if self.history is None:
+            return False
+        self.history.seek(step)
+        self.mark_all_changed()
+        return True
+
     def execute_code_by_step(self):
         """
         Function for execution binary code step by step.
         """
-        print(self.R)
-        print(self.stack)
-        if self.R['PC'] < len(self.compiled_cmds):
-            cmd = self.compiled_cmds[self.R['PC']]
+        if self.verbose:
+            print(self.R)
+            print(self.stack[:self.R['SP']].tolist())
+        if self.R['PC'] < len(self.decoded_cmds):
+            cmd = self.decoded_cmds[self.R['PC']]
         else:
             return
-        cmd_code = int(cmd[:CMDCODE_LENGTH], 2)
-        literal  = int(cmd[CMDCODE_LENGTH:CMDCODE_LENGTH+LITERAL_LENGTH], 2)
-        address  = int(cmd[CMDCODE_LENGTH+LITERAL_LENGTH:-REGISTER_LENGTH], 2)
-        register = int(cmd[-REGISTER_LENGTH:], 2)
-
-        if cmd_code == 1:
-            self.__add()
-        elif cmd_code == 2:
-            self.__sub()
-        elif cmd_code == 3:
-            self.__inc()
-        elif cmd_code == 4:
-            self.__dec()
-        elif cmd_code == 5:
-            self.__push(
-                literal=literal,
-                address=address,
-                register=register,
-            )
-        elif cmd_code == 6:
-            self.__pop(
-                address=address,
-                register=register,
-            )
-        elif cmd_code == 7:
-            self.__cmp()
-        elif cmd_code == 8:
-            self.__not()
-        elif cmd_code == 9:
-            self.__or()
-        elif cmd_code == 10:
-            self.__and()
-        elif cmd_code == 11:
-            self.__xor()
-        elif cmd_code == 12:
-            self.__nor()
-        elif cmd_code == 13:
-            self.__shl()
-        elif cmd_code == 14:
-            self.__shr()
-        elif cmd_code == 15:
-            self.__jmp(new_pc=address)
-        elif cmd_code == 16:
-            self.__jc(new_pc=address)
-        elif cmd_code == 17:
-            self.__jz(new_pc=address)
-        elif cmd_code == 18:
-            self.__jp(new_pc=address)
-        elif cmd_code == 19:
-            self.__js(new_pc=address)
-        elif cmd_code == 20:
-            self.__jo(new_pc=address)
-        elif cmd_code == 21:
-            self.__njc(new_pc=address)
-        elif cmd_code == 22:
-            self.__njz(new_pc=address)
-        elif cmd_code == 23:
-            self.__njp(new_pc=address)
-        elif cmd_code == 24:
-            self.__njs(new_pc=address)
-        elif cmd_code == 25:
-            self.__njo(new_pc=address)
-        elif cmd_code == 26:
-            self.__nope()
-        elif cmd_code == 27:
-            self.__mul()
-        elif cmd_code == 28:
-            self.__adc()
+        sp = self.R['SP']
+        address = self.memory_write_address(cmd)
+        if self.history is not None or self.tracer is not None \
+                or self.profiler is not None:
+            self.__execute_hooked(cmd)
+        else:
+            self.dispatch[cmd.code](cmd)
+        self.step_count += 1
+        self.__mark_step_changes(cmd, sp, address)
+
+    def __mark_step_changes(self, cmd, sp, address):
+        """
+        Mark cells, which were changed by executed cmd.
+        sp and address are taken before execution.
+        """
+        kind = self.change_kinds.get(cmd.code)
+        if kind == KIND_FULL:
+            self.mark_all_changed()
+            return
+        if address is not None:
+            self.mark_changed(memory=(address,))
+        if kind == KIND_STACK:
+            self.mark_changed(stack=range(max(sp - 2, 0), sp))
+        elif kind == KIND_PUSH:
+            self.mark_changed(stack=(sp,))
+
+    def mark_changed(self, memory=(), stack=()):
+        """
+        Add memory addresses and stack indexes to changed cells.
+        Indexes can be negative as in handlers.
+        """
+        for changed, cells, indexes in (
+            (self.changed_memory, self.memory, memory),
+            (self.changed_stack, self.stack, stack),
+        ):
+            if changed is not None:
+                size = len(cells)
+                changed.update(i % size for i in indexes if -size <= i < size)
+
+    def mark_all_changed(self):
+        """
+        Mark all cells as changed, e.g. after run or loading of program
+        """
+        self.changed_memory = None
+        self.changed_stack = None
+
+    def take_changes(self):
+        """
+        Cells, which were changed since the previous call (see Changes).
+        Execution step by step marks only changed cells, other ways of
+        changing of state (run, seek, reset_all) mark all cells.
+        """
+        changes = Changes(self.changed_memory, self.changed_stack)
+        self.changed_memory = set()
+        self.changed_stack = set()
+        return changes
+
+    def __execute_hooked(self, cmd):
+        """
+        Execute one command with recording of history, trace and
+        profile. self.step_count must be the number of this step.
+        """
+        if self.history is not None:
+            self.history.record(cmd)
+        if self.tracer is not None:
+            pc = self.R['PC']
+            address = self.memory_write_address(cmd)
+        try:
+            if self.profiler is not None:
+                self.profiler.execute(cmd)
+            else:
+                self.dispatch[cmd.code](cmd)
+        except Exception:
+            # Failed step isn't done, so it isn't in history
+            if self.history is not None:
+                self.history.discard()
+            raise
+        if self.tracer is not None:
+            self.tracer.write(self, pc, cmd, address)
 
     def execute_all_code(self):
         """
@@ -192,338 +507,527 @@ class Assembler():
         """
         while self.R['PC'] < len(self.compiled_cmds):
             self.execute_code_by_step()
-            
+
+    def run(self, max_steps=None, time_limit=None):
+        """
+        Headless execution of program w/o printing of state.
+        Execution stops at the end of program, after max_steps commands
+        or after time_limit seconds, and can be continued by next call.
+        Exceptions of commands don't go out and stop execution too.
+        Execution also stops at breakpoints and after access to watched
+        memory cells (see set_breakpoint and set_watchpoint). The next
+        call continues from breakpoint.
+        Returns RunResult.
+        """
+        R = self.R
+        cmds = self.decoded_cmds
+        dispatch = self.dispatch
+        n_cmds = len(cmds)
+        breakpoints = self.breakpoints
+        watchpoints = self.watchpoints
+        # Slow path is used only if history, trace, profiler, breakpoints
+        # or watchpoints are enabled
+        hooked = self.has_hooks()
+        deadline = None
+        if time_limit is not None:
+            deadline = time.perf_counter() + time_limit
+        steps = 0
+        start_count = self.step_count
+        halt_reason = None
+        error = None
+        try:
+            while halt_reason is None:
+                chunk = TIME_CHECK_INTERVAL
+                if max_steps is not None:
+                    chunk = min(chunk, max_steps - steps)
+                for _ in range(chunk):
+                    if R['PC'] >= n_cmds:
+                        break
+                    cmd = cmds[R['PC']]
+                    if hooked:
+                        self.step_count = start_count + steps
+                        if breakpoints is not None \
+                                and breakpoints[R['PC']] \
+                                and self.break_step != self.step_count:
+                            self.break_step = self.step_count
+                            halt_reason = HALT_BREAKPOINT
+                            break
+                        watch_hit = None
+                        if watchpoints is not None:
+                            watch_hit = self.__watched_access(cmd)
+                        self.__execute_hooked(cmd)
+                        steps += 1
+                        if watch_hit is not None:
+                            self.watch_hit = watch_hit
+                            halt_reason = HALT_WATCHPOINT
+                            break
+                    else:
+                        dispatch[cmd.code](cmd)
+                        steps += 1
+                if halt_reason is not None:
+                    break
+                if R['PC'] >= n_cmds:
+                    halt_reason = HALT_END
+                elif max_steps is not None and steps >= max_steps:
+                    halt_reason = HALT_MAX_STEPS
+                elif deadline is not None and time.perf_counter() >= deadline:
+                    halt_reason = HALT_TIMEOUT
+        except StackError as ex:
+            halt_reason = ex.halt_reason
+            error = str(ex)
+        except Exception as ex:
+            halt_reason = HALT_ERROR
+            error = f'{type(ex).__name__}: {ex}'
+        self.step_count = start_count + steps
+        self.mark_all_changed()
+        return RunResult(halt_reason, steps, self.get_state(), error)
+
+    def get_state(self):
+        """
+        Copy of current state: registers, flags, stack and memory
+        """
+        return {
+            'R': dict(self.R),
+            'flags': self.flags.copy(),
+            'stack': self.stack[:],
+            'memory': self.memory[:],
+        }
+
+    def set_state(self, state):
+        """
+        Restore state from get_state. Objects of registers, flags, stack
+        and memory are kept, only their values are changed.
+        """
+        self.R.clear()
+        self.R.update(state['R'])
+        self.flags.update(state['flags'])
+        self.stack[:] = state['stack']
+        self.memory[:] = state['memory']
+        self.mark_all_changed()
+
+    def memory_write_address(self, cmd):
+        """
+        Address of memory cell, which command is going to change,
+        or None
+        """
+        if cmd.code == POP_CODE:
+            if cmd.mode == MODE_DIRECT:
+                return cmd.address
+            if cmd.mode == MODE_INDIRECT:
+                return self.R[cmd.register]
+        return None
+
+    def memory_read_address(self, cmd):
+        """
+        Address of memory cell, which command is going to read, or None
+        """
+        if cmd.code == PUSH_CODE:
+            if cmd.mode == MODE_DIRECT:
+                return cmd.address
+            if cmd.mode == MODE_INDIRECT:
+                return self.R[cmd.register]
+        return None
+
+    def __watched_access(self, cmd):
+        """
+        WatchHit, if command is going to access watched memory cell,
+        or None
+        """
+        watchpoints = self.watchpoints
+        for address, access in (
+            (self.memory_write_address(cmd), WATCH_WRITE),
+            (self.memory_read_address(cmd), WATCH_READ),
+        ):
+            if address is not None and 0 <= address < len(watchpoints) \
+                    and watchpoints[address] & access:
+                return WatchHit(self.R['PC'], address, access)
+        return None
+
     def __cmd_stack_push(self, el):
-        self.stack[self.R['SP']] = el
-        self.R['SP'] += 1
+        R = self.R
+        sp = R['SP']
+        if sp >= self.stack_depth:
+            raise StackOverflowError(
+                f"stack overflow at PC {R['PC']}: "
+                f'depth is {self.stack_depth}')
+        self.stack[sp] = el
+        sp += 1
+        R['SP'] = sp
+        if sp > self.stack_high_water:
+            self.stack_high_water = sp
 
     def __cmd_stack_pop(self):
-        self.stack[self.R['SP']] = 0
-        self.R['SP'] -= 1
-        return self.stack[self.R['SP']]
+        R = self.R
+        sp = R['SP'] - 1
+        if sp < 0:
+            raise StackUnderflowError(f"stack underflow at PC {R['PC']}")
+        R['SP'] = sp
+        return self.stack[sp]
+
+    def __cmd_stack_pop2(self):
+        """
+        Pop two operands at once: the top and the one under it.
+        Stack isn't changed, if there are less than two operands.
+        """
+        R = self.R
+        sp = R['SP'] - 2
+        if sp < 0:
+            raise StackUnderflowError(f"stack underflow at PC {R['PC']}")
+        R['SP'] = sp
+        stack = self.stack
+        return stack[sp + 1], stack[sp]
+
+    def __check_value(self, value, n_operands):
+        """
+        Value, which command is going to push, must fit in stack slot.
+        Otherwise popped operands are returned (pop doesn't change
+        slots), so state is the same as before command.
+        """
+        if not MIN_VALUE <= value <= MAX_VALUE:
+            R = self.R
+            R['SP'] += n_operands
+            raise ValueOverflowError(
+                f"value overflow at PC {R['PC']}: {value:#x} "
+                f"doesn't fit in stack slot")
 
     def __update_flags(self, res):
         """
-        Updating flags depends of res
+        Updating flags depends of res. Only res is stored, flags are
+        computed from it, when they are read.
         """
         if isinstance(res, str):
             res = int(res, 2)
-        self.flags['Z'] = res == 0
-        self.flags['S'] = res < 0
-        self.flags['P'] = res % 2 == 0
-        self.flags['C'] = 2 ** (LITERAL_LENGTH+1) >= res >= 2 ** LITERAL_LENGTH
-        self.flags['O'] = res >= 2 ** LITERAL_LENGTH
+        self.flags.result = res
+
+    def __unknown(self, cmd):
+        """
+        Handler of not registered command
+        """
+        pass
 
-    def __add(self):
+    @instruction('ADD')
+    def __add(self, cmd):
         """
         Addition of the last 2 elements of the stack.
         Result also pushing to the stack.
         """        
-        op1 = self.__cmd_stack_pop()
-        op2 = self.__cmd_stack_pop()
+        op1, op2 = self.__cmd_stack_pop2()
         res = int(str(op1), 0) + int(str(op2), 0)
+        self.__check_value(res, 2)
         self.__update_flags(res)
-        self.__push(
-                    literal=res,
-                    address=0,
-                    register=0,
-                )
+        self.__push_result(res)
     
-    def __sub(self):
+    @instruction('SUB')
+    def __sub(self, cmd):
         """
         Subtraction of the last 2 elements of the stack.
         Result also pushing to the stack.
         """
-        op1 = self.__cmd_stack_pop()
-        op2 = self.__cmd_stack_pop()
+        op1, op2 = self.__cmd_stack_pop2()
         res = op2 - op1
+        self.__check_value(abs(res), 2)
         self.__update_flags(res)
-        self.__push(
-            literal=abs(res),
-            address=0,
-            register=0,
-        )
+        self.__push_result(abs(res))
 
-    def __inc(self):
+    @instruction('INC')
+    def __inc(self, cmd):
         """
         Increment of last stack element
         """
         op = self.__cmd_stack_pop()
         op += 1
+        self.__check_value(op, 1)
         self.__cmd_stack_push(op)
         self.__update_flags(op)
         self.R['PC'] += 1
 
-    def __dec(self):
+    @instruction('DEC')
+    def __dec(self, cmd):
         """
         Decrement of last stack element
         """
         op = self.__cmd_stack_pop()
         op -= 1
+        self.__check_value(abs(op), 1)
         self.__cmd_stack_push(abs(op))
         self.__update_flags(op)
         self.R['PC'] += 1
         
-    def __push(self, literal, address, register):
+    @instruction('PUSH')
+    def __push(self, cmd):
         """
         Pushing element to stack as literal or from register or from memory
         """
-        if (register != 0 and address == 2**ADDRESS_LENGTH - 1):
-            address = self.R[register] # Indirect addressing by register
-            self.__cmd_stack_push(int(self.memory[address], 2))
-        elif address == register == 0:
-            self.__cmd_stack_push(literal)
-        elif literal == register == 0:
-            self.__cmd_stack_push(int(self.memory[address], 2))
-        elif address == literal == 0:
-            self.__cmd_stack_push(self.R[register])
+        if cmd.mode == MODE_INDIRECT:
+            address = self.R[cmd.register] # Indirect addressing by register
+            self.__cmd_stack_push(self.memory[address])
+        elif cmd.mode == MODE_LITERAL:
+            self.__cmd_stack_push(cmd.literal)
+        elif cmd.mode == MODE_DIRECT:
+            self.__cmd_stack_push(self.memory[cmd.address])
+        elif cmd.mode == MODE_REGISTER:
+            self.__cmd_stack_push(self.R[cmd.register])
         else:
             print('Empty stack!')
         self.R['PC'] += 1
+
+    def __push_result(self, res):
+        """
+        Pushing result of operation to stack as literal
+        """
+        self.__cmd_stack_push(res)
+        self.R['PC'] += 1
         
-    def __pop(self, address, register):
+    @instruction('POP')
+    def __pop(self, cmd):
         """
         Moving last element of stack to register or to memory
         """
-        if (register != 0 and address == 2**ADDRESS_LENGTH - 1) \
-                or register == 0:
-            if register != 0: # If indirect addressing by register
-                address = self.R[register]
+        if cmd.mode == MODE_INDIRECT or cmd.mode == MODE_DIRECT:
+            address = cmd.address
+            if cmd.mode == MODE_INDIRECT: # Indirect addressing by register
+                address = self.R[cmd.register]
             # If direct addressing by address
-            self.memory[address] = bin(self.__cmd_stack_pop())[2:]
-        elif address == 0:
-            self.R[register] = self.__cmd_stack_pop()
-        elif register == 0:
-            self.R[register] = self.__cmd_stack_pop()
+            self.memory[address] = self.__cmd_stack_pop()
+        elif cmd.mode == MODE_REGISTER:
+            self.R[cmd.register] = self.__cmd_stack_pop()
         self.R['PC'] += 1
     
-    def __cmp(self):
+    @instruction('CMP')
+    def __cmp(self, cmd):
         """
         Comparing last two numbers on stack
         """
-        op1 = self.__cmd_stack_pop()
-        op2 = self.__cmd_stack_pop()
+        op1, op2 = self.__cmd_stack_pop2()
         res = op2 - op1
         self.__update_flags(res)
         self.R['PC'] += 1
     
-    def __not(self):
+    @instruction('NOT')
+    def __not(self, cmd):
         """
         Logical NOT
         """
         op = self.__cmd_stack_pop()
         res = ~op
         self.__update_flags(res)
-        self.__push(
-            literal=res,
-            address=0,
-            register=0,
-        )
+        self.__push_result(res)
     
-    def __or(self):
+    @instruction('OR')
+    def __or(self, cmd):
         """
         Logical OR
         """
-        op1 = self.__cmd_stack_pop()
-        op2 = self.__cmd_stack_pop()
+        op1, op2 = self.__cmd_stack_pop2()
         res = op1 | op2
         self.__update_flags(res)
-        self.__push(
-            literal=res,
-            address=0,
-            register=0,
-        )
+        self.__push_result(res)
 
-    def __and(self):
+    @instruction('AND')
+    def __and(self, cmd):
         """
         Logical AND
         """
-        op1 = self.__cmd_stack_pop()
-        op2 = self.__cmd_stack_pop()
+        op1, op2 = self.__cmd_stack_pop2()
         res = op1 & op2
         self.__update_flags(res)
-        self.__push(
-            literal=res,
-            address=0,
-            register=0,
-        )
+        self.__push_result(res)
 
-    def __xor(self):
+    @instruction('XOR')
+    def __xor(self, cmd):
         """
         Logical XOR
         """
-        op1 = self.__cmd_stack_pop()
-        op2 = self.__cmd_stack_pop()
+        op1, op2 = self.__cmd_stack_pop2()
         res = op1 ^ op2
         self.__update_flags(res)
-        self.__push(
-            literal=res,
-            address=0,
-            register=0,
-        )
+        self.__push_result(res)
 
-    def __nor(self):
+    @instruction('NOR')
+    def __nor(self, cmd):
         """
         Logical NOR
         """
-        op1 = self.__cmd_stack_pop()
-        op2 = self.__cmd_stack_pop()
+        op1, op2 = self.__cmd_stack_pop2()
         res = ~(op1 | op2)
         self.__update_flags(res)
-        self.__push(
-            literal=res,
-            address=0,
-            register=0,
-        )
+        self.__push_result(res)
 
-    def __shl(self):
+    @instruction('SHL')
+    def __shl(self, cmd):
         """
         Logical left shift by 1
         """
         op = self.__cmd_stack_pop()
         res = op << 1
+        self.__check_value(res, 1)
         self.__update_flags(res)
-        self.__push(
-            literal=res,
-            address=0,
-            register=0,
-        )
+        self.__push_result(res)
 
-    def __shr(self):
+    @instruction('SHR')
+    def __shr(self, cmd):
         """
         Logical right shift by 1
         """
         op = self.__cmd_stack_pop()
         res = op >> 1
         self.__update_flags(res)
-        self.__push(
-            literal=res,
-            address=0,
-            register=0,
-        )
+        self.__push_result(res)
 
-    def __jmp(self, new_pc):
+    @instruction('JMP')
+    def __jmp(self, cmd):
         """
         Go to the new PC obtained from the label
         """
-        self.R['PC'] = new_pc
+        self.R['PC'] = cmd.address
 
-    def __jc(self, new_pc):
+    @instruction('JC')
+    def __jc(self, cmd):
         """
         Go to the new PC if carry flag
         """
-        if self.flags['C']:
-            self.R['PC'] = new_pc
+        if self.flags.carry():
+            self.R['PC'] = cmd.address
         else:
             self.R['PC'] += 1
 
-    def __njc(self, new_pc):
-        self.flags['C'] = not self.flags['C']
-        self.__jc(new_pc)
-        self.flags['C'] = not self.flags['C']
+    @instruction('NJC')
+    def __njc(self, cmd):
+        """
+        Go to the new PC if not carry flag
+        """
+        if not self.flags.carry():
+            self.R['PC'] = cmd.address
+        else:
+            self.R['PC'] += 1
 
-    def __jz(self, new_pc):
+    @instruction('JZ')
+    def __jz(self, cmd):
         """
         Go to the new PC if zero flag
         """
-        if self.flags['Z']:
-            self.R['PC'] = new_pc
+        if self.flags.zero():
+            self.R['PC'] = cmd.address
         else:
             self.R['PC'] += 1
 
-    def __njz(self, new_pc):
-        self.flags['Z'] = not self.flags['Z']
-        self.__jz(new_pc)
-        self.flags['Z'] = not self.flags['Z']
+    @instruction('NJZ')
+    def __njz(self, cmd):
+        """
+        Go to the new PC if not zero flag
+        """
+        if not self.flags.zero():
+            self.R['PC'] = cmd.address
+        else:
+            self.R['PC'] += 1
 
-    def __jp(self, new_pc):
+    @instruction('ZP')
+    def __jp(self, cmd):
         """
         Go to the new PC if parity flag (even number)
         """
-        if self.flags['P']:
-            self.R['PC'] = new_pc
+        if self.flags.parity():
+            self.R['PC'] = cmd.address
         else:
             self.R['PC'] += 1
 
-    def __njp(self, new_pc):
-        self.flags['P'] = not self.flags['P']
-        self.__jp(new_pc)
-        self.flags['P'] = not self.flags['P']
+    @instruction('NZP')
+    def __njp(self, cmd):
+        """
+        Go to the new PC if not parity flag (even number)
+        """
+        if not self.flags.parity():
+            self.R['PC'] = cmd.address
+        else:
+            self.R['PC'] += 1
 
-    def __js(self, new_pc):
+    @instruction('JS')
+    def __js(self, cmd):
         """
         Go to the new PC if sign flag (number < 0)
         """
-        if self.flags['S']:
-            self.R['PC'] = new_pc
+        if self.flags.sign():
+            self.R['PC'] = cmd.address
         else:
             self.R['PC'] += 1
     
-    def __njs(self, new_pc):
-        self.flags['S'] = not self.flags['S']
-        self.__js(new_pc)
-        self.flags['S'] = not self.flags['S']
+    @instruction('NJS')
+    def __njs(self, cmd):
+        """
+        Go to the new PC if not sign flag (number < 0)
+        """
+        if not self.flags.sign():
+            self.R['PC'] = cmd.address
+        else:
+            self.R['PC'] += 1
 
-    def __jo(self, new_pc):
+    @instruction('JO')
+    def __jo(self, cmd):
         """
         Go to the new PC if overflow flag
         """
-        if self.flags['O']:
-            self.R['PC'] = new_pc
+        if self.flags.overflow():
+            self.R['PC'] = cmd.address
         else:
             self.R['PC'] += 1
     
-    def __njo(self, new_pc):
-        self.flags['O'] = not self.flags['O']
-        self.__jo(new_pc)
-        self.flags['O'] = not self.flags['O']
+    @instruction('NJO')
+    def __njo(self, cmd):
+        """
+        Go to the new PC if not overflow flag
+        """
+        if not self.flags.overflow():
+            self.R['PC'] = cmd.address
+        else:
+            self.R['PC'] += 1
 
-    def __nope(self):
+    @instruction('NOPE')
+    def __nope(self, cmd):
         """
         Skip clock and just increment PC
         """
         self.R['PC'] += 1
     
-    def __mul(self):
+    @instruction('MUL')
+    def __mul(self, cmd):
         """
         Multiply two last numbers in stack.
-        Result always has length 2*LITERAL_LENGTH.
+        Result always has length 2*config.literal_length.
         """
-        op1 = self.__cmd_stack_pop()
-        op2 = self.__cmd_stack_pop()
+        op1, op2 = self.__cmd_stack_pop2()
         res = int(str(op1), 0) * int(str(op2), 0)
+        if res < self.flags.limit:
+            # Without overflow result is pushed as it is
+            self.__check_value(res, 2)
         self.__update_flags(res)
         # Overflow check
-        if not self.flags['O']:
+        if not self.flags.overflow():
             junior_bits = res
             senior_bits = 0
         else:
-            junior_bits = int(bin(res)[2:][-LITERAL_LENGTH:], 2) 
-            senior_bits = int(bin(res)[2:][:LITERAL_LENGTH], 2)
+            literal_length = self.config.literal_length
+            junior_bits = int(bin(res)[2:][-literal_length:], 2) 
+            senior_bits = int(bin(res)[2:][:literal_length], 2)
         for bits in [senior_bits, junior_bits]:
-            self.__push(
-                    literal=bits,
-                    address=0,
-                    register=0,
-                )
+            self.__push_result(bits)
         # Correction, because after 2 __push PC inc by 2   
         self.R['PC'] -= 1
     
-    def __adc(self):
+    @instruction('ADC')
+    def __adc(self, cmd):
         """
         Addition tow last number in stack + Carry.
         Result also pushing to the stack.
         """        
-        op1 = self.__cmd_stack_pop()
-        op2 = self.__cmd_stack_pop()
+        op1, op2 = self.__cmd_stack_pop2()
         res = int(str(op1), 0) + int(str(op2), 0) \
-            + (1 if self.flags['C'] else 0)
+            + (1 if self.flags.carry() else 0)
+        limit = self.flags.limit
+        if not 2 * limit >= res >= limit:
+            # Without carry result is pushed as it is
+            self.__check_value(res, 2)
         self.__update_flags(res)
         # If carry, С->1, push only junior bits of number
-        if self.flags['C']:
-            res = int(bin(res)[2:][-LITERAL_LENGTH:], 2) 
-        self.__push(
-                    literal=res,
-                    address=0,
-                    register=0,
-                )
\ No newline at end of file
+        if self.flags.carry():
+            res = int(bin(res)[2:][-self.config.literal_length:], 2) 
+        self.__push_result(res)
\ No newline at end of file
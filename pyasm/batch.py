@@ -0,0 +1,229 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .lexer import do_lex
+from .asm_parser import Parser
+from .compiler import Compiler
+from .assembler_lang import Assembler
+from .objfile import OBJECT_EXTENSION
+from .machine import MACHINES
+
+
+PROGRAM_EXTENSION = '.ass'
+DEFAULT_MAX_STEPS = 1000000
+DEFAULT_MACHINE_NAME = 'classic'
+
+
+def find_programs(paths, machine=DEFAULT_MACHINE_NAME):
+    """
+    List of programs from directories (all .ass files in them),
+    single programs or object files and manifests (text files with one path on line,
+    relative to the manifest, and optionally with name of machine after it).
+    Every program is a pair (path, name of machine), machine is the given
+    one, if it isn't set in manifest. Path, which can't be read, is kept
+    as program, so its error is in results.
+    """
+    programs = []
+    for path in paths:
+        if not os.path.exists(path):
+            programs.append((path, machine))
+        elif os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                programs.extend(
+                    (os.path.join(root, name), machine)
+                    for name in sorted(files)
+                    if name.endswith(PROGRAM_EXTENSION)
+                )
+        elif path.endswith((PROGRAM_EXTENSION, OBJECT_EXTENSION)):
+            programs.append((path, machine))
+        else:
+            manifest_dir = os.path.dirname(path)
+            try:
+                with open(path, 'r') as f:
+                    lines = f.readlines()
+            except OSError:
+                programs.append((path, machine))
+                continue
+            for line in lines:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    program, *line_machine = line.split()
+                    programs.append((
+                        os.path.join(manifest_dir, program),
+                        line_machine[0] if line_machine else machine,
+                    ))
+    return programs
+
+
+def compile_program(path, result, config):
+    """
+    Lex, parse and compile program from source file for machine config.
+    Returns Assembler with loaded program or None, if program has errors.
+    """
+    timings = result['timings']
+    with open(path, 'r') as f:
+        program = f.read()
+
+    start = time.perf_counter()
+    tokens = do_lex(program, config=config)
+    timings['lex'] = time.perf_counter() - start
+    if tokens[0] == False:
+        result['error'] = tokens[1]
+        return None
+
+    start = time.perf_counter()
+    parser = Parser(tokens, config)
+    is_valid, error_msg = parser.is_valid_code()
+    timings['parse'] = time.perf_counter() - start
+    if not is_valid:
+        result['error'] = error_msg.strip()
+        return None
+
+    start = time.perf_counter()
+    compiler = Compiler(parser.valid_cmds, config)
+    compiler.compile()
+    timings['compile'] = time.perf_counter() - start
+
+    return Assembler(
+        compiler.compiled_cmds,
+        compiler.valid_cmd_lines,
+        verbose=False,
+        jumps=compiler.jumps,
+        config=config,
+    )
+
+
+def run_program(path, max_steps=DEFAULT_MAX_STEPS, time_limit=None,
+        machine=DEFAULT_MACHINE_NAME):
+    """
+    Lex, parse, compile (or load from object file) and execute one
+    program on machine with given name (see machine.MACHINES).
+    Returns dict, which is ready for JSON.
+    """
+    result = {
+        'program': path,
+        'machine': machine,
+        'halt_reason': None,
+        'steps': 0,
+        'R': None,
+        'flags': None,
+        'stack_high_water': None,
+        'memory_diff': None,
+        'error': None,
+        'timings': {},
+    }
+    timings = result['timings']
+    # Parser and assembler print messages, they mustn't go to results
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            config = MACHINES[machine]
+            if path.endswith(OBJECT_EXTENSION):
+                start = time.perf_counter()
+                assembler = Assembler(verbose=False, config=config)
+                assembler.load_object(path)
+                timings['load'] = time.perf_counter() - start
+            else:
+                assembler = compile_program(path, result, config)
+                if assembler is None:
+                    return result
+            initial_memory = assembler.memory[:]
+            start = time.perf_counter()
+            run_result = assembler.run(max_steps, time_limit)
+            timings['execute'] = time.perf_counter() - start
+        except Exception as ex:
+            result['error'] = f'{type(ex).__name__}: {ex}'
+            return result
+
+    state = run_result.state
+    result.update({
+        'halt_reason': run_result.halt_reason,
+        'steps': run_result.steps,
+        'R': state['R'],
+        'flags': state['flags'],
+        'stack_high_water': assembler.stack_high_water,
+        'memory_diff': {
+            f'{address:02X}': value
+            for address, (old, value)
+                in enumerate(zip(initial_memory, state['memory']))
+            if old != value
+        },
+        'error': run_result.error,
+    })
+    return result
+
+
+def run_batch(programs, jobs=None, max_steps=DEFAULT_MAX_STEPS,
+        time_limit=None):
+    """
+    Execute programs (pairs of path and name of machine, see
+    find_programs) across process pool.
+    Yields results as workers finish.
+    """
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(run_program, path, max_steps, time_limit, machine)
+            for path, machine in programs
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def add_parser(subparsers):
+    """
+    Add 'batch' command to command line interface
+    """
+    parser = subparsers.add_parser(
+        'batch',
+        help='execute directories or manifests of programs',
+        description='Lex, parse, compile and execute programs across '
+            'process pool. Results are written as JSON lines.',
+    )
+    parser.add_argument(
+        'paths', nargs='+',
+        help='directories with .ass programs, programs or manifests')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help='count of worker processes (default: count of CPUs)')
+    parser.add_argument(
+        '--max-steps', type=int, default=DEFAULT_MAX_STEPS,
+        help=f'limit of commands for every program '
+            f'(default: {DEFAULT_MAX_STEPS})')
+    parser.add_argument(
+        '--time-limit', type=float, default=None,
+        help='wall-clock budget for every program in seconds')
+    parser.add_argument(
+        '--machine', choices=sorted(MACHINES), default=DEFAULT_MACHINE_NAME,
+        help='geometry of machine for programs, which have no machine '
+            f'in manifest (default: {DEFAULT_MACHINE_NAME})')
+    parser.add_argument(
+        '-o', '--output', default=None,
+        help='file for results (default: stdout)')
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    """
+    Entry point of 'pyasm batch'.
+    Returns 1, if some of paths doesn't exist.
+    """
+    programs = find_programs(args.paths, args.machine)
+    status = 0
+    for path in args.paths:
+        if not os.path.exists(path):
+            print(f'{path}: no such file or directory', file=sys.stderr)
+            status = 1
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in run_batch(
+                programs, args.jobs, args.max_steps, args.time_limit):
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+    finally:
+        if args.output:
+            output.close()
+    return status
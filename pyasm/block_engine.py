@@ -0,0 +1,462 @@
+import time
+
+from .decoder import (
+    JMP_CODE,
+    PUSH_CODE,
+    POP_CODE,
+    CONDITIONAL_JUMPS,
+)
+from .constants import (
+    CMD_CODES,
+    MODE_LITERAL,
+    MODE_DIRECT,
+    MODE_REGISTER,
+    MODE_INDIRECT,
+    HALT_END,
+    HALT_MAX_STEPS,
+    HALT_TIMEOUT,
+    HALT_ERROR,
+)
+from .assembler_lang import RunResult, StackError
+
+
+# How often (in blocks) wall-clock budget of run is checked
+TIME_CHECK_INTERVAL = 256
+
+# Command codes of stack operations
+ALU_CODES = {
+    int(CMD_CODES[name]): name for name in [
+        'ADD', 'SUB', 'INC', 'DEC', 'CMP', 'NOT', 'OR', 'AND',
+        'XOR', 'NOR', 'SHL', 'SHR', 'MUL', 'ADC',
+    ]
+}
+NOPE_CODE = int(CMD_CODES['NOPE'])
+# Results of stack operations, which can be stored in stack slot
+# (with abs() of SUB and DEC)
+MAX_RESULT = 2**63 - 1
+# Stack operations, which never go out of stack slot
+SAFE_ALU = {'CMP', 'NOT', 'OR', 'AND', 'XOR', 'NOR', 'SHR'}
+
+
+class BlockEngine:
+    """
+    Optional execution engine, that's compiling program of assembler
+    to Python functions by basic blocks.
+
+    Program is splitting to basic blocks at labels, jump targets and
+    after every jump (blocks of Assembler.control_flow_graph). Every block becomes one generated function with
+    inlined stack, register and flag updates, which returns next PC.
+    Registers, SP and flags are kept in local variables and written
+    back only on exit from the block.
+
+    If block can't be executed safely (stack would go out of bounds,
+    indirect address is out of memory or result of stack operation
+    doesn't fit in stack slot), it makes side exit with
+    consistent state, and the failing command is executed by
+    interpreter of assembler. So final R, flags, stack and memory are
+    the same, as after Assembler.run.
+
+    Stack high-water mark is updated once per block by the highest
+    slot, which block (or its part before side exit) pushes to.
+    """
+    def __init__(self, assembler):
+        # Assembler with loaded program, its state is used for execution
+        self.assembler = assembler
+        self.cfg = assembler.control_flow_graph()
+        # Basic blocks: leader PC -> (function, count of commands,
+        # stack peak, stack peaks of side exits by PC)
+        self.blocks = [None] * len(assembler.decoded_cmds)
+        # Generated source code of all blocks
+        self.source = ''
+        self.__compile()
+
+    def leaders(self):
+        """
+        Sorted list of PCs, where basic blocks start
+        """
+        return self.cfg.leaders
+
+    def __compile(self):
+        """
+        Generate and compile functions of all basic blocks
+        """
+        cmds = self.assembler.decoded_cmds
+        sources = []
+        peaks = []
+        for block in self.cfg.blocks:
+            codegen = _BlockCodegen(
+                block.start,
+                cmds[block.start:block.end],
+                self.assembler.stack_depth,
+                len(self.assembler.memory),
+                self.assembler.config.literal_length,
+            )
+            sources.append(codegen.generate())
+            peaks.append((codegen.peak(), codegen.exit_peaks))
+        self.source = '\n\n'.join(sources)
+        namespace = {}
+        exec(compile(self.source, '<pyasm blocks>', 'exec'), namespace)
+        for n, block in enumerate(self.cfg.blocks):
+            self.blocks[block.start] = (
+                namespace[f'block_{block.start}'],
+                block.end - block.start,
+            ) + peaks[n]
+
+    def run(self, max_steps=None, time_limit=None):
+        """
+        Execution of program by blocks, the same as Assembler.run.
+        Program with history, trace, profiler, breakpoints or watchpoints
+        is executed by Assembler.run, which calls them on every command.
+        Returns RunResult.
+        """
+        assembler = self.assembler
+        if assembler.has_hooks():
+            return assembler.run(max_steps, time_limit)
+        R = assembler.R
+        flags = assembler.flags
+        stack = assembler.stack
+        memory = assembler.memory
+        cmds = assembler.decoded_cmds
+        dispatch = assembler.dispatch
+        blocks = self.blocks
+        n_cmds = len(cmds)
+        deadline = None
+        if time_limit is not None:
+            deadline = time.perf_counter() + time_limit
+        steps = 0
+        n_blocks = 0
+        halt_reason = None
+        error = None
+        pc = R['PC']
+        try:
+            while True:
+                if pc >= n_cmds:
+                    halt_reason = HALT_END
+                    break
+                if max_steps is not None and steps >= max_steps:
+                    halt_reason = HALT_MAX_STEPS
+                    break
+                n_blocks += 1
+                if deadline is not None \
+                        and n_blocks % TIME_CHECK_INTERVAL == 0 \
+                        and time.perf_counter() >= deadline:
+                    halt_reason = HALT_TIMEOUT
+                    break
+                block = blocks[pc]
+                if block is not None and (max_steps is None
+                        or steps + block[1] <= max_steps):
+                    sp = R['SP']
+                    R['PC'] = pc
+                    next_pc = block[0](R, flags, stack, memory)
+                    if next_pc >= 0:
+                        if sp + block[2] > assembler.stack_high_water:
+                            assembler.stack_high_water = sp + block[2]
+                        steps += block[1]
+                        pc = next_pc
+                        continue
+                    # Side exit: count executed commands of the block
+                    # and execute failing command by interpreter
+                    peak = block[3].get(~next_pc, 0)
+                    if sp + peak > assembler.stack_high_water:
+                        assembler.stack_high_water = sp + peak
+                    steps += ~next_pc - pc
+                    pc = ~next_pc
+                R['PC'] = pc
+                cmd = cmds[pc]
+                dispatch[cmd.code](cmd)
+                steps += 1
+                pc = R['PC']
+        except StackError as ex:
+            halt_reason = ex.halt_reason
+            error = str(ex)
+        except Exception as ex:
+            # PC is left by failed command, as it is in Assembler.run
+            halt_reason = HALT_ERROR
+            error = f'{type(ex).__name__}: {ex}'
+        else:
+            R['PC'] = pc
+        assembler.step_count += steps
+        return RunResult(halt_reason, steps, assembler.get_state(), error)
+
+
+class _BlockCodegen:
+    """
+    Generator of Python function for one basic block.
+    Keeps values of registers, stack slots and flags, known at the
+    current command, to inline them into expressions.
+    """
+    def __init__(self, start, cmds, stack_size, memory_size,
+            literal_length):
+        self.start = start
+        self.cmds = cmds
+        self.stack_size = stack_size
+        self.memory_size = memory_size
+        self.literal_length = literal_length
+        self.lines = []
+        self.n_temp = 0
+        # Offset of SP from its value on block entry
+        self.offset = 0
+        # Lowest and highest stack slot offsets, used by block
+        self.min_slot = 0
+        self.max_slot = -1
+        # Known values: stack slot offset -> expression
+        self.slots = {}
+        self.dirty_slots = set()
+        # Known values: register -> expression
+        self.regs = {}
+        self.dirty_regs = set()
+        # Expression with last result for flags, if flags were updated
+        self.flags_result = None
+        # Stack peaks (see peak) of side exits by PC of failing command
+        self.exit_peaks = {}
+
+    def generate(self):
+        """
+        Source code of block function
+        """
+        pc = self.start
+        for cmd in self.cmds:
+            if not self.__command(pc, cmd):
+                break
+            pc += 1
+        else:
+            # Fall through to the next block
+            self.__exit(str(pc))
+        body = self.lines
+        guard = []
+        if self.max_slot >= self.min_slot:
+            guard = [
+                f'    if {self.__slot_index(self.min_slot)} < 0 '
+                f'or {self.__slot_index(self.max_slot)} '
+                f'>= {self.stack_size}:',
+                f'        return ~{self.start}',
+            ]
+        return '\n'.join(
+            [
+                f'def block_{self.start}(R, flags, stack, memory):',
+                "    sp = R['SP']",
+            ]
+            + guard
+            + body
+        )
+
+    def peak(self):
+        """
+        Count of stack slots above SP on entry, which block has pushed to
+        """
+        return self.max_slot + 1 if self.max_slot >= 0 else 0
+
+    def __emit(self, line, indent=1):
+        self.lines.append('    ' * indent + line)
+
+    def __temp(self, expr):
+        """
+        Assign expression to new local variable
+        """
+        name = f't{self.n_temp}'
+        self.n_temp += 1
+        self.__emit(f'{name} = {expr}')
+        return name
+
+    def __slot_index(self, offset):
+        if offset == 0:
+            return 'sp'
+        elif offset > 0:
+            return f'sp + {offset}'
+        return f'sp - {-offset}'
+
+    def __slot(self, offset):
+        """
+        Stack slot relative to SP on block entry
+        """
+        self.min_slot = min(self.min_slot, offset)
+        self.max_slot = max(self.max_slot, offset)
+        return f'stack[{self.__slot_index(offset)}]'
+
+    def __stack_push(self, expr):
+        self.__slot(self.offset)
+        self.slots[self.offset] = expr
+        self.dirty_slots.add(self.offset)
+        self.offset += 1
+
+    def __stack_pop(self):
+        self.offset -= 1
+        if self.offset not in self.slots:
+            self.slots[self.offset] = self.__temp(self.__slot(self.offset))
+        return self.slots[self.offset]
+
+    def __reg(self, register):
+        if register not in self.regs:
+            self.regs[register] = self.__temp(f'R[{register}]')
+        return self.regs[register]
+
+    def __set_reg(self, register, expr):
+        self.regs[register] = expr
+        self.dirty_regs.add(register)
+
+    def __flag(self, flag):
+        """
+        Expression of flag value
+        """
+        res = self.flags_result
+        if res is None:
+            return f"flags['{flag}']"
+        return {
+            'Z': f'{res} == 0',
+            'S': f'{res} < 0',
+            'P': f'{res} % 2 == 0',
+            'C': f'{2 ** (self.literal_length+1)} >= {res} '
+                f'>= {2 ** self.literal_length}',
+            'O': f'{res} >= {2 ** self.literal_length}',
+        }[flag]
+
+    def __exit(self, next_pc, indent=1):
+        """
+        Write back known state and return next PC
+        """
+        for offset in sorted(self.dirty_slots):
+            self.__emit(
+                f'{self.__slot(offset)} = {self.slots[offset]}', indent)
+        for register in sorted(self.dirty_regs):
+            self.__emit(f'R[{register}] = {self.regs[register]}', indent)
+        if self.offset:
+            self.__emit(f"R['SP'] = sp + {self.offset}", indent)
+        if self.flags_result is not None:
+            # Flags are computed from the result, when they are read
+            self.__emit(f'flags.result = {self.flags_result}', indent)
+        self.__emit(f'return {next_pc}', indent)
+
+    def __indirect_address(self, pc, register):
+        """
+        Address from register with side exit, if it's out of memory
+        """
+        address = self.__reg(register)
+        self.__emit(f'if not 0 <= {address} < {self.memory_size}:')
+        self.exit_peaks[pc] = self.peak()
+        self.__exit(f'~{pc}', indent=2)
+        return address
+
+    def __command(self, pc, cmd):
+        """
+        Generate code of one command.
+        Returns False, if command finishes the block.
+        """
+        code = cmd.code
+        if code in ALU_CODES:
+            self.__alu(pc, ALU_CODES[code])
+        elif code == PUSH_CODE:
+            if cmd.mode == MODE_LITERAL:
+                self.__stack_push(str(cmd.literal))
+            elif cmd.mode == MODE_REGISTER:
+                self.__stack_push(self.__reg(cmd.register))
+            elif cmd.mode == MODE_DIRECT:
+                self.__stack_push(self.__temp(f'memory[{cmd.address}]'))
+            elif cmd.mode == MODE_INDIRECT:
+                address = self.__indirect_address(pc, cmd.register)
+                self.__stack_push(self.__temp(f'memory[{address}]'))
+            else:
+                self.__emit("print('Empty stack!')")
+        elif code == POP_CODE:
+            if cmd.mode == MODE_DIRECT:
+                self.__emit(f'memory[{cmd.address}] = {self.__stack_pop()}')
+            elif cmd.mode == MODE_INDIRECT:
+                address = self.__indirect_address(pc, cmd.register)
+                self.__emit(f'memory[{address}] = {self.__stack_pop()}')
+            elif cmd.mode == MODE_REGISTER:
+                self.__set_reg(cmd.register, self.__stack_pop())
+        elif code == JMP_CODE:
+            self.__exit(str(cmd.address))
+            return False
+        elif code in CONDITIONAL_JUMPS:
+            flag, value = CONDITIONAL_JUMPS[code]
+            condition = self.__flag(flag)
+            if not value:
+                condition = f'not ({condition})'
+            self.__exit(f'{cmd.address} if {condition} else {pc + 1}')
+            return False
+        elif code != NOPE_CODE:
+            # Unknown command is executed by interpreter
+            self.exit_peaks[pc] = self.peak()
+            self.__exit(f'~{pc}')
+            return False
+        return True
+
+    def __check_result(self, pc, name, res, offset, flags_result):
+        """
+        Side exit with state before command, if result can't be stored
+        in stack slot: interpreter raises error of this command
+        """
+        if name in SAFE_ALU:
+            return
+        self.__emit(f'if not {-MAX_RESULT} <= {res} <= {MAX_RESULT}:')
+        current = self.offset, self.flags_result
+        self.offset, self.flags_result = offset, flags_result
+        self.exit_peaks[pc] = self.peak()
+        self.__exit(f'~{pc}', indent=2)
+        self.offset, self.flags_result = current
+
+    def __alu(self, pc, name):
+        """
+        Generate code of stack operation
+        """
+        max_literal = 2 ** self.literal_length - 1
+        offset, flags_result = self.offset, self.flags_result
+        if name in ['INC', 'DEC', 'NOT', 'SHL', 'SHR']:
+            op = self.__stack_pop()
+            expr = {
+                'INC': f'{op} + 1',
+                'DEC': f'{op} - 1',
+                'NOT': f'~{op}',
+                'SHL': f'{op} << 1',
+                'SHR': f'{op} >> 1',
+            }[name]
+            res = self.__temp(expr)
+            self.__check_result(pc, name, res, offset, flags_result)
+            self.flags_result = res
+            self.__stack_push(self.__temp(f'abs({res})')
+                if name == 'DEC' else res)
+            return
+        op1 = self.__stack_pop()
+        op2 = self.__stack_pop()
+        if name == 'ADC':
+            carry = self.__flag('C')
+            res = self.__temp(f'{op1} + {op2} + (1 if {carry} else 0)')
+            self.__check_result(pc, name, res, offset, flags_result)
+            self.flags_result = res
+            # If carry, push only junior bits of number
+            self.__stack_push(self.__temp(
+                f'{res} & {max_literal} if {self.__flag("C")} else {res}'))
+            return
+        expr = {
+            'ADD': f'{op1} + {op2}',
+            'SUB': f'{op2} - {op1}',
+            'CMP': f'{op2} - {op1}',
+            'OR': f'{op1} | {op2}',
+            'AND': f'{op1} & {op2}',
+            'XOR': f'{op1} ^ {op2}',
+            'NOR': f'~({op1} | {op2})',
+            'MUL': f'{op1} * {op2}',
+        }[name]
+        res = self.__temp(expr)
+        self.__check_result(pc, name, res, offset, flags_result)
+        self.flags_result = res
+        if name == 'SUB':
+            self.__stack_push(self.__temp(f'abs({res})'))
+        elif name == 'MUL':
+            # On overflow, senior part is first literal_length bits
+            # of result and junior part is last literal_length bits
+            senior = f't{self.n_temp}'
+            junior = f't{self.n_temp + 1}'
+            self.n_temp += 2
+            self.__emit(f'if {self.__flag("O")}:')
+            self.__emit(f'{junior} = {res} & {max_literal}', 2)
+            self.__emit(
+                f'{senior} = {res} >> ({res}.bit_length() - '
+                f'{self.literal_length})', 2)
+            self.__emit('else:')
+            self.__emit(f'{junior} = {res}', 2)
+            self.__emit(f'{senior} = 0', 2)
+            self.__stack_push(senior)
+            self.__stack_push(junior)
+        elif name != 'CMP':
+            self.__stack_push(res)
@@ -0,0 +1,339 @@
+from array import array
+from collections import namedtuple
+
+from .lexer import do_lex
+from .asm_parser import Parser
+from .compiler import Compiler
+from .decoder import JMP_CODE, CONDITIONAL_JUMPS, decode, is_jump
+from .machine import DEFAULT_MACHINE, MACHINES
+
+
+# Type of index of blocks by PC: signed integer, 32 bits
+BLOCK_INDEX_TYPECODE = 'i'
+
+# Basic block: commands from start to end (not included), indexes of
+# successor and predecessor blocks, and exits = the block can go out of
+# program (to PC after the last command or by jump out of program)
+BasicBlock = namedtuple(
+    'BasicBlock', ['start', 'end', 'succs', 'preds', 'exits'])
+# Natural loop: header block, all blocks of loop, blocks with back edges
+# to header and exits from loop: (block, successor block or None, if
+# it's the end of program)
+Loop = namedtuple('Loop', ['header', 'blocks', 'latches', 'exits'])
+# Warning of static analysis for command of program
+CFGWarning = namedtuple('CFGWarning', ['pc', 'label', 'message'])
+
+
+class ControlFlowGraph:
+    """
+    Control-flow graph of compiled program.
+
+    Program is splitting to basic blocks at labels, jump targets and
+    after every jump, block index by PC is in block_of. The first block
+    is the entry. Jumps by addresses out of program and the last command
+    go to the end of program, which is not a block (see BasicBlock.exits).
+
+    On top of graph:
+        order     -- reachable blocks in reverse postorder
+        idom      -- immediate dominator of every block (entry for itself,
+                     None for unreachable blocks)
+        loops()   -- natural loops by back edges to dominators
+        warnings()-- loops, which never exit
+
+    Graph is built once per program and shared by block engine,
+    profiler and optimizer (see Assembler.control_flow_graph).
+    """
+    def __init__(self, cmds, jumps=None):
+        # Decoded commands (Instruction or anything with code and address)
+        self.cmds = cmds
+        # Labels from compiler: label->address
+        self.jumps = jumps if jumps is not None else {}
+        # Label by PC, the first one, if PC has several labels
+        self.labels = {}
+        for label, pc in self.jumps.items():
+            self.labels.setdefault(pc, label)
+        self.leaders = self.__leaders()
+        self.block_of = array(BLOCK_INDEX_TYPECODE, [0]) * len(cmds)
+        for index, start in enumerate(self.leaders):
+            end = self.__block_end(index)
+            self.block_of[start:end] = array(
+                BLOCK_INDEX_TYPECODE, [index]) * (end - start)
+        self.blocks = self.__blocks()
+        self.order = self.__reverse_postorder()
+        self.idom = self.__dominators()
+        self.__loops = None
+
+    @classmethod
+    def from_compiled(cls, compiled_cmds, jumps=None, config=DEFAULT_MACHINE):
+        """
+        Graph of compiler output: binary commands and labels
+        """
+        return cls([decode(cmd, config) for cmd in compiled_cmds], jumps)
+
+    def __leaders(self):
+        """
+        Sorted list of PCs, where basic blocks start
+        """
+        cmds = self.cmds
+        leaders = {0}
+        leaders.update(self.jumps.values())
+        for pc, cmd in enumerate(cmds):
+            if is_jump(cmd.code):
+                leaders.add(cmd.address)
+                leaders.add(pc + 1)
+        return sorted(pc for pc in leaders if 0 <= pc < len(cmds))
+
+    def __block_end(self, index):
+        if index + 1 < len(self.leaders):
+            return self.leaders[index + 1]
+        return len(self.cmds)
+
+    def __blocks(self):
+        n_cmds = len(self.cmds)
+        succs = []
+        exits = []
+        preds = [[] for _ in self.leaders]
+        for index in range(len(self.leaders)):
+            end = self.__block_end(index)
+            last = self.cmds[end - 1]
+            if last.code == JMP_CODE:
+                targets = (last.address,)
+            elif last.code in CONDITIONAL_JUMPS:
+                targets = (last.address, end)
+            else:
+                targets = (end,)
+            block_succs = []
+            block_exits = False
+            for target in targets:
+                if not 0 <= target < n_cmds:
+                    block_exits = True
+                    continue
+                succ = self.block_of[target]
+                if succ not in block_succs:
+                    block_succs.append(succ)
+                    preds[succ].append(index)
+            succs.append(tuple(block_succs))
+            exits.append(block_exits)
+        return [
+            BasicBlock(
+                start, self.__block_end(index),
+                succs[index], tuple(preds[index]), exits[index],
+            )
+            for index, start in enumerate(self.leaders)
+        ]
+
+    def __reverse_postorder(self):
+        """
+        Blocks, reachable from entry, in reverse postorder of DFS
+        """
+        if not self.blocks:
+            return []
+        postorder = []
+        visited = {0}
+        stack = [(0, iter(self.blocks[0].succs))]
+        while stack:
+            index, succs = stack[-1]
+            for succ in succs:
+                if succ not in visited:
+                    visited.add(succ)
+                    stack.append((succ, iter(self.blocks[succ].succs)))
+                    break
+            else:
+                stack.pop()
+                postorder.append(index)
+        postorder.reverse()
+        return postorder
+
+    def __dominators(self):
+        """
+        Immediate dominators by iterative algorithm of Cooper, Harvey
+        and Kennedy over reverse postorder
+        """
+        idom = [None] * len(self.blocks)
+        if not self.order:
+            return idom
+        position = {index: n for n, index in enumerate(self.order)}
+
+        def intersect(a, b):
+            while a != b:
+                while position[a] > position[b]:
+                    a = idom[a]
+                while position[b] > position[a]:
+                    b = idom[b]
+            return a
+
+        idom[0] = 0
+        changed = True
+        while changed:
+            changed = False
+            for index in self.order[1:]:
+                new_idom = None
+                for pred in self.blocks[index].preds:
+                    if idom[pred] is None:
+                        continue
+                    if new_idom is None:
+                        new_idom = pred
+                    else:
+                        new_idom = intersect(pred, new_idom)
+                if idom[index] != new_idom:
+                    idom[index] = new_idom
+                    changed = True
+        return idom
+
+    def is_reachable(self, index):
+        """
+        Block can be executed from the start of program
+        """
+        return self.idom[index] is not None
+
+    def dominates(self, a, b):
+        """
+        Every path from entry to block b goes through block a
+        """
+        if self.idom[a] is None or self.idom[b] is None:
+            return False
+        while b != a:
+            if b == 0:
+                return False
+            b = self.idom[b]
+        return True
+
+    def loops(self):
+        """
+        Natural loops in order of headers. Back edges to the same
+        header make one loop.
+        """
+        if self.__loops is not None:
+            return self.__loops
+        bodies = {}
+        latches = {}
+        for index in self.order:
+            for succ in self.blocks[index].succs:
+                if not self.dominates(succ, index):
+                    continue
+                body = bodies.setdefault(succ, {succ})
+                latches.setdefault(succ, []).append(index)
+                stack = [index]
+                while stack:
+                    block = stack.pop()
+                    if block in body:
+                        continue
+                    body.add(block)
+                    stack.extend(
+                        pred for pred in self.blocks[block].preds
+                        if self.is_reachable(pred))
+        loops = []
+        for header in sorted(bodies):
+            body = bodies[header]
+            exits = []
+            for index in sorted(body):
+                block = self.blocks[index]
+                exits.extend(
+                    (index, succ) for succ in block.succs
+                    if succ not in body)
+                if block.exits:
+                    exits.append((index, None))
+            loops.append(Loop(
+                header, frozenset(body), tuple(latches[header]),
+                tuple(exits),
+            ))
+        self.__loops = loops
+        return loops
+
+    def loop_pcs(self, loop):
+        """
+        PCs of all commands of loop
+        """
+        for index in sorted(loop.blocks):
+            yield from range(self.blocks[index].start, self.blocks[index].end)
+
+    def warnings(self):
+        """
+        Warnings of static analysis: loops without any exit, so program
+        never ends, when it comes to them
+        """
+        warnings = []
+        for loop in self.loops():
+            if loop.exits:
+                continue
+            start = self.blocks[loop.header].start
+            end = max(self.blocks[index].end for index in loop.blocks) - 1
+            warnings.append(CFGWarning(
+                start, self.labels.get(start, ''),
+                f'infinite loop: commands {start}-{end} never exit',
+            ))
+        return warnings
+
+    def report(self):
+        """
+        Text report: blocks, loops and warnings
+        """
+        lines = [f'{len(self.blocks)} blocks, {len(self.loops())} loops']
+        for index, block in enumerate(self.blocks):
+            succs = ', '.join(str(succ) for succ in block.succs)
+            if block.exits:
+                succs = f'{succs}, end' if succs else 'end'
+            label = self.labels.get(block.start, '')
+            unreachable = '' if self.is_reachable(index) else ' unreachable'
+            lines.append(
+                f'block {index:>3}: {block.start:>4}-{block.end - 1:<4} '
+                f'-> {succs:<12} {label}{unreachable}'.rstrip())
+        for loop in self.loops():
+            start = self.blocks[loop.header].start
+            blocks = ', '.join(str(index) for index in sorted(loop.blocks))
+            lines.append(
+                f'loop at {start} {self.labels.get(start, "")}: '
+                f'blocks {blocks}, exits {len(loop.exits)}')
+        for warning in self.warnings():
+            lines.append(
+                f'warning: {warning.pc} {warning.label}: {warning.message}')
+        return '\n'.join(lines)
+
+
+def add_parser(subparsers):
+    """
+    Add 'cfg' command to command line interface
+    """
+    parser = subparsers.add_parser(
+        'cfg',
+        help='print control-flow graph of programs',
+        description='Print basic blocks, loops and warnings of static '
+            'analysis of programs.',
+    )
+    parser.add_argument('sources', nargs='+', help='.ass programs')
+    parser.add_argument(
+        '--machine', choices=sorted(MACHINES), default='classic',
+        help='geometry of machine (default: classic)')
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    """
+    Entry point of 'pyasm cfg'
+    """
+    config = MACHINES[args.machine]
+    status = 0
+    for source_path in args.sources:
+        try:
+            with open(source_path, 'r') as f:
+                tokens = do_lex(f.read(), config=config)
+        except OSError as ex:
+            print(f'{source_path}: {ex}')
+            status = 1
+            continue
+        if tokens[0] == False:
+            print(f'{source_path}: {tokens[1]}')
+            status = 1
+            continue
+        parser = Parser(tokens, config)
+        is_valid, error_msg = parser.is_valid_code()
+        if not is_valid:
+            print(f'{source_path}: {error_msg.strip()}')
+            status = 1
+            continue
+        compiler = Compiler(parser.valid_cmds, config)
+        compiler.compile()
+        cfg = ControlFlowGraph.from_compiled(
+            compiler.compiled_cmds, compiler.jumps, config)
+        print(f'{source_path}: {cfg.report()}')
+    return status
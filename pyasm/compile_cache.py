@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+from array import array
+from collections import namedtuple, OrderedDict
+
+from . import constants
+from .lexer import do_lex
+from .asm_parser import Parser
+from .compiler import Compiler
+from .machine import DEFAULT_MACHINE
+from .optimizer import DEFAULT_OPT_LEVEL, OptimizationStats, Optimizer
+
+
+# Version of cached data, must be changed with format of compiled commands
+CACHE_FORMAT_VERSION = 4
+# Default size limit of in-process layer (count of programs)
+DEFAULT_MAX_ENTRIES = 128
+# Environment variable with directory of on-disk layer
+CACHE_DIR_ENV = 'PYASM_CACHE_DIR'
+
+# Result of front end for one program, optimization is OptimizationStats
+# or None, if program wasn't optimized
+CompiledProgram = namedtuple(
+    'CompiledProgram',
+    ['compiled_cmds', 'valid_cmd_lines', 'jumps', 'optimization'],
+)
+
+
+def config_fingerprint(config=DEFAULT_MACHINE, opt_level=DEFAULT_OPT_LEVEL):
+    """
+    Text with all settings of constants.py, of machine config and
+    level of optimization, which change compiled code
+    """
+    settings = {
+        name: value for name, value in vars(constants).items()
+        if name.isupper()
+    }
+    settings['CACHE_FORMAT_VERSION'] = CACHE_FORMAT_VERSION
+    settings['MACHINE'] = config.fingerprint()
+    settings['OPT_LEVEL'] = opt_level
+    return json.dumps(settings, sort_keys=True)
+
+
+def cache_key(program_text, fingerprint=None):
+    """
+    Key of program in cache: hash of source text and configuration
+    """
+    if fingerprint is None:
+        fingerprint = config_fingerprint()
+    digest = hashlib.sha256(fingerprint.encode())
+    digest.update(b'\0')
+    digest.update(program_text.encode())
+    return digest.hexdigest()
+
+
+class CompileCache:
+    """
+    Content-addressed cache of compiled programs.
+
+    In-process layer keeps max_entries last used programs. If cache_dir
+    is given, programs are also stored there as JSON files, named by
+    key, so they are shared between processes and runs.
+    Only successfully compiled programs are cached.
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.__entries = OrderedDict() # key->CompiledProgram
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def compile(self, program_text, config=DEFAULT_MACHINE,
+            opt_level=DEFAULT_OPT_LEVEL):
+        """
+        Compiled program from cache or from Lexer -> Parser ->
+        -> Optimizer (if opt_level isn't 0) -> Compiler for machine config.
+        Returns CompiledProgram or error message.
+        """
+        key = cache_key(program_text, config_fingerprint(config, opt_level))
+        program = self.get(key)
+        if program is not None:
+            return program
+        self.misses += 1
+        tokens = do_lex(program_text, config=config)
+        if tokens[0] == False:
+            return tokens[1]
+        parser = Parser(tokens, config)
+        is_valid, error_msg = parser.is_valid_code()
+        if not is_valid:
+            return error_msg
+        valid_cmds = parser.valid_cmds
+        optimization = None
+        if opt_level:
+            optimizer = Optimizer(valid_cmds, opt_level, config)
+            valid_cmds = optimizer.optimize()
+            optimization = optimizer.stats
+        compiler = Compiler(valid_cmds, config)
+        compiler.compile()
+        program = CompiledProgram(
+            compiler.compiled_cmds,
+            compiler.valid_cmd_lines,
+            compiler.jumps,
+            optimization,
+        )
+        self.put(key, program)
+        return self.__copy(program)
+
+    def get(self, key):
+        """
+        Program by key or None
+        """
+        program = self.__entries.get(key)
+        if program is not None:
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return self.__copy(program)
+        program = self.__load(key)
+        if program is not None:
+            self.__remember(key, program)
+            self.disk_hits += 1
+            return self.__copy(program)
+        return None
+
+    def put(self, key, program):
+        """
+        Store program in both layers
+        """
+        self.__remember(key, program)
+        self.__save(key, program)
+
+    def clear(self):
+        """
+        Clear in-process layer (files of on-disk layer are kept)
+        """
+        self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @staticmethod
+    def __copy(program):
+        """
+        Assembler owns loaded lists, so cached program is copied
+        """
+        return CompiledProgram(
+            array(program.compiled_cmds.typecode, program.compiled_cmds),
+            list(program.valid_cmd_lines),
+            dict(program.jumps),
+            program.optimization,
+        )
+
+    def __remember(self, key, program):
+        self.__entries[key] = program
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+
+    def __path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def __load(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self.__path(key), 'r') as f:
+                data = json.load(f)
+            return CompiledProgram(
+                array(data['typecode'], data['compiled_cmds']),
+                data['valid_cmd_lines'],
+                data['jumps'],
+                None if data['optimization'] is None
+                    else OptimizationStats(*data['optimization']),
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            # No file or broken file: program will be compiled again
+            return None
+
+    def __save(self, key, program):
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # File is replaced atomically, so parallel processes never
+            # read a half-written program
+            temp_path = f'{self.__path(key)}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({
+                    'typecode': program.compiled_cmds.typecode,
+                    'compiled_cmds': program.compiled_cmds.tolist(),
+                    'valid_cmd_lines': program.valid_cmd_lines,
+                    'jumps': program.jumps,
+                    'optimization': program.optimization,
+                }, f)
+            os.replace(temp_path, self.__path(key))
+        except OSError as ex:
+            print(f'Compile cache is not saved: {ex}')
+
+
+# Cache, which is used by Assembler.input_text_program
+default_cache = CompileCache(cache_dir=os.environ.get(CACHE_DIR_ENV))
@@ -1,29 +1,38 @@
-from .constants import (
-    CMD_CODES,
-    INPUT_BASE,
-    CMDCODE_LENGTH,
-    LITERAL_LENGTH,
-    ADDRESS_LENGTH,
-    REGISTER_LENGTH,
-)
+from array import array
+
+from .constants import CMD_CODES, INPUT_BASE
+from .decoder import encode, to_binary_string
+from .machine import DEFAULT_MACHINE
+
+
+# Type of compiled commands of the classic machine (unsigned integer,
+# see MachineConfig.word_typecode)
+COMPILED_TYPECODE = DEFAULT_MACHINE.word_typecode
+# Codes of commands as integers
+COMMAND_CODES = {name: int(code) for name, code in CMD_CODES.items()}
 
 
 class Compiler:
     """
     A Compiler class, that's translates valid command
     to machine code and setts jump addresses.
+    Layout of commands is taken from config (see MachineConfig).
     """
-    def __init__(self, valid_cmds):
+    def __init__(self, valid_cmds, config=DEFAULT_MACHINE):
         # List of valid comands from parser
         self.valid_cmds = valid_cmds
+        self.config = config
         # List of valid comands by lines for GUI
         self.valid_cmd_lines = []
         self.jumps = {} # Dict of jumsp: label->address
-        self.compiled_cmds = [] # Result of compilation
+        # Result of compilation: commands as integer words
+        self.compiled_cmds = array(config.word_typecode)
+        # Line of source for every compiled command
+        self.source_lines = []
 
     def compile(self):
         """
-        Compile all program to bynary code
+        Compile all program to integer words
         """
         # Detect all jumps
         line_correction = 0
@@ -34,75 +43,83 @@ class Compiler:
                 })
                 line_correction += 1
         # To bynary code
-        for n_line, cmd_line in enumerate(self.valid_cmds):
-            literal_code = ''.zfill(LITERAL_LENGTH)
-            address_code = ''.zfill(ADDRESS_LENGTH)
-            register_code = ''.zfill(REGISTER_LENGTH)
-            if cmd_line[0][1] == 'LABEL':
-                continue
+        for cmd_line in self.valid_cmds:
+            if cmd_line[0][1] != 'LABEL':
+                self.compiled_cmds.append(self.compile_cmd(cmd_line))
+                self.source_lines.append(cmd_line[0].line)
+        # Create valid cmd lines for GUI
+        self.valid_cmd_lines = self.join_cmd_lines(
+            [self.cmd_line_text(cmd_line) for cmd_line in self.valid_cmds],
+            [cmd_line[0][1] == 'LABEL' for cmd_line in self.valid_cmds],
+        )
+
+    def compile_cmd(self, cmd_line):
+        """
+        Compile one command (not a label) to integer word.
+        Jump addresses are taken from self.jumps.
+        """
+        literal = address = register = 0
+        cmd_code = COMMAND_CODES[cmd_line[0][1]]
+        if len(cmd_line) == 1: # For comands w/o addresses and literals
+            pass
+        elif 'J' in cmd_line[0][1]: # For all jumps
+            try:
+                # Number of command in jump is decimal
+                jump_address = self.jumps[cmd_line[1][0]] \
+                    if cmd_line[1][1] == 'LABEL' else int(cmd_line[1][0])
+            except KeyError as ex:
+                print(ex)
+            address = jump_address
+        elif cmd_line[1][1] == 'LITERAL':
+            literal = int(cmd_line[1][0], INPUT_BASE)
+        elif cmd_line[1][1] == 'ADDR':
+            # If indetect addressing by register
+            if 'R' in cmd_line[1][0]:
+                register = int(cmd_line[1][0][1:])
+                # Address = 1..1 as a signal for assembler, that's a
+                # indetect addressing by register
+                address = self.config.indirect_address
             else:
-                cmd_code = self.__to_bin(
-                    CMD_CODES[cmd_line[0][1]],
-                    base=10
-                ).zfill(CMDCODE_LENGTH)
-                if len(cmd_line) == 1: # For comands w/o addresses and literals
-                    pass
-                elif 'J' in cmd_line[0][1]: # For all jumps
-                    try:
-                        jump_address = self.jumps[cmd_line[1][0]] \
-                            if cmd_line[1][1] == 'LABEL' else cmd_line[1][0]
-                    except Exception as ex:
-                        print(ex)
-                    address_code = self.__to_bin(
-                            str(jump_address),
-                            base=10,
-                        ).zfill(ADDRESS_LENGTH)
-                elif cmd_line[1][1] == 'LITERAL':
-                    literal_code = self.__to_bin(cmd_line[1][0]) \
-                        .zfill(LITERAL_LENGTH)
-                elif cmd_line[1][1] == 'ADDR':
-                    # If indetect addressing by register
-                    if 'R' in cmd_line[1][0]:
-                        register_code = self.__to_bin(cmd_line[1][0][1]) \
-                            .zfill(REGISTER_LENGTH)
-                        # Address = 1..1 as a signal for assembler, that's a
-                        # indetect addressing by register
-                        address_code = ''.ljust(ADDRESS_LENGTH, '1')
-                    else:
-                        address_code = self.__to_bin(cmd_line[1][0]) \
-                            .zfill(ADDRESS_LENGTH)
-                elif cmd_line[1][1] == 'REG':
-                    register_code = self.__to_bin(cmd_line[1][0][1]) \
-                        .zfill(REGISTER_LENGTH)
+                address = int(cmd_line[1][0], INPUT_BASE)
+        elif cmd_line[1][1] == 'REG':
+            register = int(cmd_line[1][0][1:])
 
-                self.compiled_cmds.append(
-                    cmd_code 
-                    + literal_code  
-                    + address_code
-                    + register_code
-                )
-        # Create valid cmd lines for GUI
+        return encode(cmd_code, literal, address, register, self.config)
+
+    def binary_cmds(self):
+        """
+        Compiled commands as binary strings, e.g. for GUI
+        """
+        return [
+            to_binary_string(word, self.config) for word in self.compiled_cmds
+        ]
+
+    @staticmethod
+    def cmd_line_text(cmd_line):
+        """
+        Text of one valid command for GUI
+        """
+        return ''.join([f'#{cmd[0]} '
+            if cmd[1] == 'LITERAL'
+            else (f'@{cmd[0]} ' if cmd[1] == 'ADDR' else f'{cmd[0]} ')
+                for cmd in cmd_line])
+
+    @staticmethod
+    def join_cmd_lines(texts, is_labels):
+        """
+        Join texts of valid commands for GUI: every label is
+        concatenated with the next command
+        """
+        cmd_lines = []
         label = ''
         is_previos_label = False
-        for line in self.valid_cmds:
-            self.valid_cmd_lines.append(
-                ''.join([f'#{cmd[0]} ' 
-                    if cmd[1] == 'LITERAL' 
-                    else (f'@{cmd[0]} ' if cmd[1] == 'ADDR' else f'{cmd[0]} ')
-                        for cmd in line]))
+        for text, is_label in zip(texts, is_labels):
+            cmd_lines.append(text)
             # Concatinete LABEL with next command
             if is_previos_label:
-                self.valid_cmd_lines[-1] = label + ' ' + self.valid_cmd_lines[-1]
+                cmd_lines[-1] = label + ' ' + cmd_lines[-1]
                 is_previos_label = False
-            if line[0][1] == 'LABEL':
-                label = self.valid_cmd_lines.pop(-1).replace(' ', '')
+            if is_label:
+                label = cmd_lines.pop(-1).replace(' ', '')
                 is_previos_label = True
-
-    def __to_bin(self, num, base=None):
-        """
-        Converting address or literal to binary number in str format
-        """
-        if base is None:
-            base = INPUT_BASE
-        # [2:] -- for removing '0b' from binary
-        return str(bin(int(num, base)))[2:]
+        return cmd_lines
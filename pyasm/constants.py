@@ -4,6 +4,7 @@ LITERAL_LENGTH = 8
 ADDRESS_LENGTH = 8
 REGISTER_LENGTH = 3
 MEMORY_RATIO = 4
+STACK_DEPTH = 256
 FIRST_DATA_ADDRESS = (2**ADDRESS_LENGTH) / MEMORY_RATIO
 
 CMD_CODES = {
@@ -35,4 +36,22 @@ CMD_CODES = {
     'NOPE' : '26',
     'MUL'  : '27',
     'ADC'  : '28',
-}
\ No newline at end of file
+}
+
+# Addressing modes of pre-decoded commands (see decoder.py)
+MODE_NONE = 0      # Command w/o operand or unknown operand combination
+MODE_LITERAL = 1   # PUSH #FF
+MODE_DIRECT = 2    # PUSH @BB, POP @CC
+MODE_REGISTER = 3  # PUSH R1, POP R2
+MODE_INDIRECT = 4  # PUSH @R1, POP @R2
+
+# Reasons of program halt (see Assembler.run)
+HALT_END = 'end'              # PC is out of program
+HALT_MAX_STEPS = 'max_steps'  # Limit of executed commands is reached
+HALT_TIMEOUT = 'timeout'      # Wall-clock budget is over
+HALT_ERROR = 'error'          # Command raised an exception
+HALT_STACK_OVERFLOW = 'stack_overflow'    # Push to the full stack
+HALT_STACK_UNDERFLOW = 'stack_underflow'  # Pop from the empty stack
+HALT_VALUE_OVERFLOW = 'value_overflow'    # Result doesn't fit in stack slot
+HALT_BREAKPOINT = 'breakpoint'  # PC has come to breakpoint
+HALT_WATCHPOINT = 'watchpoint'  # Command has accessed watched memory cell
@@ -0,0 +1,124 @@
+from collections import namedtuple
+
+from .constants import (
+    CMD_CODES,
+    MODE_NONE,
+    MODE_LITERAL,
+    MODE_DIRECT,
+    MODE_REGISTER,
+    MODE_INDIRECT,
+)
+from .machine import DEFAULT_MACHINE
+
+
+# Pre-decoded command, which assembler is executing instead of binary string
+Instruction = namedtuple(
+    'Instruction',
+    ['code', 'literal', 'address', 'register', 'mode'],
+)
+
+PUSH_CODE = int(CMD_CODES['PUSH'])
+POP_CODE = int(CMD_CODES['POP'])
+JMP_CODE = int(CMD_CODES['JMP'])
+# Conditional jumps: command code -> (flag, jump if flag value is)
+CONDITIONAL_JUMPS = {
+    int(CMD_CODES['JC']): ('C', True),
+    int(CMD_CODES['JZ']): ('Z', True),
+    int(CMD_CODES['ZP']): ('P', True),
+    int(CMD_CODES['JS']): ('S', True),
+    int(CMD_CODES['JO']): ('O', True),
+    int(CMD_CODES['NJC']): ('C', False),
+    int(CMD_CODES['NJZ']): ('Z', False),
+    int(CMD_CODES['NZP']): ('P', False),
+    int(CMD_CODES['NJS']): ('S', False),
+    int(CMD_CODES['NJO']): ('O', False),
+}
+# Address = 1..1 as a signal of indirect addressing by register
+# (for the classic machine, see MachineConfig.indirect_address)
+INDIRECT_ADDRESS = DEFAULT_MACHINE.indirect_address
+# Length of command in bits (for the classic machine)
+WORD_LENGTH = DEFAULT_MACHINE.word_length
+
+
+def encode(code, literal=0, address=0, register=0, config=DEFAULT_MACHINE):
+    """
+    Pack parts of command to integer word, inverse of decode
+    """
+    if code >> config.cmdcode_length or literal >> config.literal_length \
+            or address >> config.address_length \
+            or register >> config.register_length:
+        # Too long part isn't cut, but moves other parts, as it was
+        # with concatenation of binary strings
+        word = 0
+        for value, length in zip(
+            (code, literal, address, register), config.layout()
+        ):
+            word = word << max(length, value.bit_length()) | value
+        return word
+    return (
+        (((code << config.literal_length) | literal)
+            << config.address_length | address)
+        << config.register_length | register
+    )
+
+
+def to_binary_string(word, config=DEFAULT_MACHINE):
+    """
+    Binary string of command, e.g. for GUI
+    """
+    return format(word, f'0{config.word_length}b')
+
+
+def decode(cmd, config=DEFAULT_MACHINE):
+    """
+    Decode one binary command from compiler to Instruction.
+    Command can be given as binary string or as integer.
+    """
+    if isinstance(cmd, str):
+        cmd = int(cmd, 2)
+    register = cmd & (2**config.register_length - 1)
+    cmd >>= config.register_length
+    address = cmd & (2**config.address_length - 1)
+    cmd >>= config.address_length
+    literal = cmd & (2**config.literal_length - 1)
+    code = cmd >> config.literal_length
+    return Instruction(
+        code,
+        literal,
+        address,
+        register,
+        addressing_mode(code, literal, address, register, config),
+    )
+
+
+def is_jump(code):
+    """
+    Check, that command is unconditional or conditional jump
+    """
+    return code == JMP_CODE or code in CONDITIONAL_JUMPS
+
+
+def addressing_mode(code, literal, address, register,
+        config=DEFAULT_MACHINE):
+    """
+    Detect addressing mode of PUSH and POP commands
+    by the same rules, as assembler does
+    """
+    indirect_address = config.indirect_address
+    if code == PUSH_CODE:
+        if register != 0 and address == indirect_address:
+            return MODE_INDIRECT
+        elif address == register == 0:
+            return MODE_LITERAL
+        elif literal == register == 0:
+            return MODE_DIRECT
+        elif address == literal == 0:
+            return MODE_REGISTER
+    elif code == POP_CODE:
+        if register != 0 and address == indirect_address:
+            return MODE_INDIRECT
+        elif register == 0:
+            return MODE_DIRECT
+        elif address == 0:
+            return MODE_REGISTER
+    return MODE_NONE
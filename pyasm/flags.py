@@ -0,0 +1,109 @@
+from collections.abc import MutableMapping
+
+
+# Names of flags in order of GUI, trace and state
+FLAG_NAMES = ('Z', 'S', 'P', 'C', 'O')
+
+
+class Flags(MutableMapping):
+    """
+    Flags of assembler: zero, sign, parity, carry and overflow.
+
+    Commands only store their result in flags.result, and every flag
+    is computed from it, when it's read. Most results are overwritten
+    by the next command before any jump reads them, so it's cheaper
+    than computing all five flags after every command.
+
+    Flags behave as dict {'Z': ..., 'S': ..., 'P': ..., 'C': ..., 'O': ...}
+    as before: they can be read, set, updated and copied by dict(flags)
+    or faster by flags.copy().
+    Setting of flag fixes values of all flags, computed from the result.
+    """
+    __slots__ = ('limit', 'result', 'stored')
+
+    def __init__(self, limit):
+        # Results with this value and more have carry and overflow flags
+        self.limit = limit
+        # The last result, from which flags are computed, or None,
+        # if flags are taken from stored values
+        self.result = None
+        self.stored = dict.fromkeys(FLAG_NAMES, False)
+
+    def zero(self):
+        res = self.result
+        if res is None:
+            return self.stored['Z']
+        return res == 0
+
+    def sign(self):
+        res = self.result
+        if res is None:
+            return self.stored['S']
+        return res < 0
+
+    def parity(self):
+        res = self.result
+        if res is None:
+            return self.stored['P']
+        return res % 2 == 0
+
+    def carry(self):
+        res = self.result
+        if res is None:
+            return self.stored['C']
+        return 2 * self.limit >= res >= self.limit
+
+    def overflow(self):
+        res = self.result
+        if res is None:
+            return self.stored['O']
+        return res >= self.limit
+
+    def __getitem__(self, key):
+        return FLAG_GETTERS[key](self)
+
+    def __setitem__(self, key, value):
+        if key not in FLAG_GETTERS:
+            raise KeyError(key)
+        if self.result is not None:
+            self.stored = self.copy()
+            self.result = None
+        self.stored[key] = value
+
+    def __delitem__(self, key):
+        raise TypeError('flags of assembler can\'t be deleted')
+
+    def __iter__(self):
+        return iter(FLAG_NAMES)
+
+    def __len__(self):
+        return len(FLAG_NAMES)
+
+    def copy(self):
+        """
+        Dict of all flags, it's faster than reading them one by one
+        """
+        res = self.result
+        if res is None:
+            return dict(self.stored)
+        limit = self.limit
+        return {
+            'Z': res == 0,
+            'S': res < 0,
+            'P': res % 2 == 0,
+            'C': 2 * limit >= res >= limit,
+            'O': res >= limit,
+        }
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
+# Getters of flags by name
+FLAG_GETTERS = {
+    'Z': Flags.zero,
+    'S': Flags.sign,
+    'P': Flags.parity,
+    'C': Flags.carry,
+    'O': Flags.overflow,
+}
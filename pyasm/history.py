@@ -0,0 +1,244 @@
+from collections import deque, namedtuple
+
+from .constants import CMD_CODES
+from .decoder import PUSH_CODE, POP_CODE, is_jump
+
+
+# Default budget of history in bytes
+DEFAULT_HISTORY_MEMORY = 16 * 2**20
+# Default count of steps between full checkpoints
+DEFAULT_CHECKPOINT_INTERVAL = 1024
+# Approximate size of one journal entry in bytes
+JOURNAL_ENTRY_SIZE = 320
+# Part of budget for journal, the rest is for checkpoints
+JOURNAL_MEMORY_PART = 0.75
+
+# Commands, which pop operands from the stack and push result, and also
+# update flags. They change only stack slots SP-2 and SP-1.
+STACK_COMMANDS = [
+    'ADD', 'SUB', 'INC', 'DEC', 'MUL', 'ADC', 'CMP',
+    'NOT', 'OR', 'AND', 'XOR', 'NOR', 'SHL', 'SHR',
+]
+
+# Kinds of commands by changed state
+KIND_CONTROL = 0 # Only PC (jumps, NOPE, unknown commands)
+KIND_PUSH = 1    # PC, SP and one stack slot
+KIND_POP = 2     # PC, SP, register or memory cell
+KIND_STACK = 3   # PC, SP, stack slots SP-2, SP-1 and flags
+KIND_FULL = 4    # Any state (other registered commands)
+
+# Undo record of one step: values before the step. Only changed parts
+# are kept, others are None.
+JournalEntry = namedtuple(
+    'JournalEntry',
+    ['step', 'pc', 'sp', 'flags', 'slots', 'register', 'cell', 'state'],
+)
+# Full state before step number 'step' (see Assembler.get_state)
+Checkpoint = namedtuple('Checkpoint', ['step', 'state'])
+
+
+def command_kinds(instructions):
+    """
+    Kind of every command code (see KIND_*)
+    """
+    stack_codes = {int(CMD_CODES[name]) for name in STACK_COMMANDS}
+    nope_code = int(CMD_CODES['NOPE'])
+    kinds = {}
+    for code in instructions:
+        if code == PUSH_CODE:
+            kinds[code] = KIND_PUSH
+        elif code == POP_CODE:
+            kinds[code] = KIND_POP
+        elif code in stack_codes:
+            kinds[code] = KIND_STACK
+        elif is_jump(code) or code == nope_code:
+            kinds[code] = KIND_CONTROL
+        else:
+            kinds[code] = KIND_FULL
+    return kinds
+
+
+class History:
+    """
+    Execution history of assembler for stepping back and seeking.
+
+    Before every step a journal entry with values, which the step is
+    going to change, is recorded, so step back is O(1). Every
+    checkpoint_interval steps a full checkpoint is taken. Seek to any
+    step restores the nearest checkpoint and replays commands from it.
+
+    Memory is limited by max_memory bytes: the oldest journal entries
+    are dropped, and if there are too many checkpoints, every second of
+    them is dropped and the interval is doubled. The first checkpoint
+    (start of program) is always kept.
+    """
+    def __init__(self, assembler, max_memory=DEFAULT_HISTORY_MEMORY,
+            checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        from .assembler_lang import INSTRUCTIONS
+        self.assembler = assembler
+        self.max_memory = max_memory
+        self.initial_interval = checkpoint_interval
+        self.kinds = command_kinds(INSTRUCTIONS)
+        self.max_entries = max(
+            1, int(max_memory * JOURNAL_MEMORY_PART) // JOURNAL_ENTRY_SIZE)
+        self.clear()
+
+    def clear(self):
+        """
+        Forget history, current state becomes the start
+        """
+        self.journal = deque(maxlen=self.max_entries)
+        self.checkpoints = []
+        self.interval = self.initial_interval
+        self.__take_checkpoint()
+
+    def __checkpoint_size(self):
+        """
+        Approximate size of one checkpoint in bytes
+        """
+        assembler = self.assembler
+        return 1024 + assembler.memory.itemsize * len(assembler.memory) \
+            + 8 * len(assembler.stack)
+
+    def __take_checkpoint(self):
+        step = self.assembler.step_count
+        self.checkpoints.append(Checkpoint(step, self.assembler.get_state()))
+        self.next_checkpoint = step + self.interval
+        max_checkpoints = max(2, int(
+            self.max_memory * (1 - JOURNAL_MEMORY_PART)
+        ) // self.__checkpoint_size())
+        if len(self.checkpoints) > max_checkpoints:
+            # Thinning: every second checkpoint is dropped
+            self.checkpoints = self.checkpoints[::2]
+            self.interval *= 2
+            self.next_checkpoint = self.checkpoints[-1].step + self.interval
+
+    def record(self, cmd):
+        """
+        Record values, which cmd is going to change.
+        Must be called just before execution of cmd.
+        """
+        assembler = self.assembler
+        step = assembler.step_count
+        if step >= self.next_checkpoint:
+            self.__take_checkpoint()
+        R = assembler.R
+        sp = R['SP']
+        flags = slots = register = cell = state = None
+        kind = self.kinds.get(cmd.code, KIND_CONTROL)
+        if kind == KIND_STACK:
+            flags = tuple(assembler.flags.copy().values())
+            slots = self.__save_slots(assembler.stack, sp - 2, sp)
+        elif kind == KIND_PUSH:
+            slots = self.__save_slots(assembler.stack, sp, sp + 1)
+        elif kind == KIND_POP:
+            address = assembler.memory_write_address(cmd)
+            if address is not None:
+                memory = assembler.memory
+                if -len(memory) <= address < len(memory):
+                    cell = (address, memory[address])
+            elif cmd.register in R:
+                register = (cmd.register, R[cmd.register])
+        elif kind == KIND_FULL:
+            state = assembler.get_state()
+        self.journal.append(JournalEntry(
+            step, R['PC'], sp, flags, slots, register, cell, state))
+
+    def discard(self):
+        """
+        Forget the last recorded entry: its command raised error, so the
+        step wasn't done. Checkpoint of this step is kept, it's the state
+        before the command.
+        """
+        if self.journal \
+                and self.journal[-1].step == self.assembler.step_count:
+            self.journal.pop()
+
+    @staticmethod
+    def __save_slots(stack, start, end):
+        """
+        Values of stack slots in range, which are in stack bounds
+        """
+        return tuple(
+            (i, stack[i]) for i in range(max(start, 0), min(end, len(stack)))
+        )
+
+    def step_back(self):
+        """
+        Return to the state before the last step.
+        Returns False, if it's the start of program.
+        """
+        if self.journal:
+            self.__undo(self.journal.pop())
+            return True
+        if self.assembler.step_count == 0:
+            return False
+        self.seek(self.assembler.step_count - 1)
+        return True
+
+    def __undo(self, entry):
+        assembler = self.assembler
+        if entry.state is not None:
+            assembler.set_state(entry.state)
+        R = assembler.R
+        R['PC'] = entry.pc
+        R['SP'] = entry.sp
+        if entry.flags is not None:
+            for key, value in zip(assembler.flags, entry.flags):
+                assembler.flags[key] = value
+        if entry.slots is not None:
+            stack = assembler.stack
+            for i, value in reversed(entry.slots):
+                stack[i] = value
+            assembler.mark_changed(stack=[i for i, _ in entry.slots])
+        if entry.register is not None:
+            R[entry.register[0]] = entry.register[1]
+        if entry.cell is not None:
+            assembler.memory[entry.cell[0]] = entry.cell[1]
+            assembler.mark_changed(memory=(entry.cell[0],))
+        assembler.step_count = entry.step
+
+    def seek(self, step):
+        """
+        Go to the state after given count of steps. Seek forward stops
+        at the end of program.
+        """
+        assembler = self.assembler
+        if step < assembler.step_count:
+            back = assembler.step_count - step
+            checkpoint = self.checkpoints[0]
+            for candidate in self.checkpoints:
+                if candidate.step <= step:
+                    checkpoint = candidate
+            if back <= len(self.journal) \
+                    and back <= step - checkpoint.step:
+                for _ in range(back):
+                    self.__undo(self.journal.pop())
+                return
+            assembler.set_state(checkpoint.state)
+            assembler.step_count = checkpoint.step
+            self.journal.clear()
+            self.checkpoints = [
+                candidate for candidate in self.checkpoints
+                if candidate.step <= checkpoint.step
+            ]
+            self.next_checkpoint = checkpoint.step + self.interval
+        self.__replay(step)
+
+    def __replay(self, step):
+        """
+        Execute commands with recording until given step
+        """
+        assembler = self.assembler
+        R = assembler.R
+        cmds = assembler.decoded_cmds
+        dispatch = assembler.dispatch
+        while assembler.step_count < step and R['PC'] < len(cmds):
+            cmd = cmds[R['PC']]
+            self.record(cmd)
+            try:
+                dispatch[cmd.code](cmd)
+            except Exception:
+                self.discard()
+                raise
+            assembler.step_count += 1
@@ -0,0 +1,186 @@
+import contextlib
+import io
+from array import array
+
+from .lexer import do_lex
+from .asm_parser import Parser
+from .compiler import Compiler
+from .machine import DEFAULT_MACHINE
+
+
+class _Line:
+    """
+    Cached result of lexing, parsing and compiling one source line
+    """
+    def __init__(self, text, n_line, config):
+        self.text = text
+        self.n_line = n_line
+        self.config = config
+        tokens = do_lex(text + '\n', first_line=n_line, config=config)
+        self.lex_error = None
+        self.parse_error = None
+        self.valid_cmds = []
+        if tokens[0] == False:
+            self.lex_error = tokens[1]
+            return
+        parser = Parser(tokens, config)
+        # Messages are printed by parser of the whole program, see
+        # IncrementalCompiler.compile
+        with contextlib.redirect_stdout(io.StringIO()):
+            is_valid, error_msg = parser.is_valid_code()
+        if not is_valid:
+            self.parse_error = error_msg
+            return
+        self.valid_cmds = parser.valid_cmds
+        # Label, defined on the line
+        self.label = None
+        # Label, used by jump on the line
+        self.jump_label = None
+        self.n_cmds = 0
+        for cmd_line in self.valid_cmds:
+            if cmd_line[0][1] == 'LABEL':
+                self.label = cmd_line[0][0]
+            else:
+                self.n_cmds += 1
+                if len(cmd_line) > 1 and cmd_line[1][1] == 'LABEL':
+                    self.jump_label = cmd_line[1][0]
+        self.texts = [
+            Compiler.cmd_line_text(cmd_line) for cmd_line in self.valid_cmds
+        ]
+        # Compiled commands, None until labels are resolved
+        self.compiled_cmds = None
+
+    def move(self, n_line):
+        """
+        Line after the edit is moved to n_line.
+        Returns the line with updated line numbers.
+        """
+        if n_line == self.n_line:
+            return self
+        if self.lex_error or self.parse_error:
+            # Error message contains old number of line
+            return _Line(self.text, n_line, self.config)
+        self.valid_cmds = [
+            tuple(token._replace(line=n_line) for token in cmd_line)
+            for cmd_line in self.valid_cmds
+        ]
+        self.n_line = n_line
+        return self
+
+
+class IncrementalCompiler:
+    """
+    Incremental front end for the editor: lexer, parser and compiler
+    results are cached by source lines.
+
+    After an edit only changed lines are lexed, parsed and compiled
+    again. Label addresses are resolved again for all labels, but only
+    jumps to labels, whose addresses were changed, are recompiled.
+    Result is the same, as after Lexer -> Parser -> Compiler.
+    """
+    def __init__(self, config=DEFAULT_MACHINE):
+        self.config = config
+        self.lines = [] # Source lines
+        self.__cache = [] # _Line for every source line
+        self.valid_cmds = []
+        self.valid_cmd_lines = []
+        self.jumps = {} # Dict of jumps: label->address
+        self.compiled_cmds = array(config.word_typecode)
+        # Line of source for every compiled command
+        self.source_lines = []
+        # Count of lines, processed by the last compile
+        self.n_processed = 0
+
+    def compile(self, program_text):
+        """
+        Compile program, using results for unchanged lines.
+        Returns True or error message, as Assembler.input_text_program.
+        """
+        lines = program_text.split('\n')
+        old_lines = self.lines
+        # Unchanged lines at the begin and at the end of program
+        n_max = min(len(lines), len(old_lines))
+        prefix = 0
+        while prefix < n_max and lines[prefix] == old_lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < n_max - prefix \
+                and lines[-suffix-1] == old_lines[-suffix-1]:
+            suffix += 1
+        changed = [
+            _Line(text, n_line, self.config)
+            for n_line, text in enumerate(
+                lines[prefix:len(lines)-suffix], start=prefix+1)
+        ]
+        # Lines after the edit may be moved
+        old_suffix = [
+            line.move(n_line)
+            for n_line, line in enumerate(
+                self.__cache[len(old_lines)-suffix:],
+                start=len(lines)-suffix+1)
+        ]
+        self.__cache = self.__cache[:prefix] + changed + old_suffix
+        self.lines = lines
+        self.n_processed = len(changed)
+
+        for line in self.__cache:
+            if line.lex_error:
+                return line.lex_error
+        if any(line.parse_error for line in self.__cache):
+            # Message about the error depends on the next lines (e.g. a
+            # lexem of several new lines), so the whole program is parsed
+            # again. It's slow, but only for invalid programs.
+            return Parser(
+                do_lex(program_text, config=self.config), self.config,
+            ).is_valid_code()[1]
+        return self.__resolve_labels(changed)
+
+    def __resolve_labels(self, changed):
+        """
+        Resolve label addresses and compile commands, which were changed
+        or which jump to labels with changed addresses.
+        Returns True or error message about undefined label. Nothing is
+        compiled on error, so all compiled lines match self.jumps.
+        """
+        jumps = {}
+        pc = 0
+        for line in self.__cache:
+            if line.label is not None:
+                jumps[line.label] = pc
+            pc += line.n_cmds
+        for line in self.__cache:
+            if line.jump_label is not None and line.jump_label not in jumps:
+                return (f"\nCompile error at line {line.n_line}: "
+                    f"label '{line.jump_label}' is not defined!")
+        changed_labels = {
+            label for label in set(jumps) | set(self.jumps)
+            if jumps.get(label) != self.jumps.get(label)
+        }
+
+        compiler = Compiler([], self.config)
+        compiler.jumps = jumps
+        changed = set(map(id, changed))
+        for line in self.__cache:
+            if line.compiled_cmds is None or id(line) in changed \
+                    or line.jump_label in changed_labels:
+                line.compiled_cmds = [
+                    compiler.compile_cmd(cmd_line)
+                    for cmd_line in line.valid_cmds
+                    if cmd_line[0][1] != 'LABEL'
+                ]
+        self.jumps = jumps
+
+        self.valid_cmds = []
+        self.compiled_cmds = array(self.config.word_typecode)
+        self.source_lines = []
+        texts = []
+        is_labels = []
+        for line in self.__cache:
+            self.valid_cmds.extend(line.valid_cmds)
+            self.compiled_cmds.extend(line.compiled_cmds)
+            self.source_lines.extend([line.n_line] * line.n_cmds)
+            texts.extend(line.texts)
+            is_labels.extend(
+                cmd_line[0][1] == 'LABEL' for cmd_line in line.valid_cmds)
+        self.valid_cmd_lines = Compiler.join_cmd_lines(texts, is_labels)
+        return True
@@ -1,16 +1,19 @@
 import re
 import sys
+from collections import namedtuple
+
+from .machine import DEFAULT_MACHINE
 
 
 token_exprs = [
     (r'[\n]+',                  'NLINE'), # New lines
     (r'[ \t]+',                    None), # Spaces, tabs between comands
-    (r';[^\n]*',                   None), # Comment 
+    (r';[^\n]*',                   None), # Comment
 
     (r'PUSH',                    "PUSH"),
     (r'POP',                      "POP"),
 
-    (r'R[1-7]',                   "REG"), # One of registers R1-R7
+    (r'{register}',               "REG"), # One of registers R1-Rn
 
     (r'CMP',                      "CMP"),
     (r'NOPE',                    "NOPE"),
@@ -33,50 +36,96 @@ token_exprs = [
     (r'DEC',                      "DEC"),
     (r'MUL',                      "MUL"),
     (r'ADC',                      "ADC"),
- 
+
     (r'SHL',                      "SHL"), # Shift left
     (r'SHR',                      "SHR"), # Shift right
- 
+
     (r'AND',                      "AND"),
     (r'OR',                        "OR"),
     (r'NOR',                      "NOR"),
-    (r'XOR',                      "XOR"),     
+    (r'XOR',                      "XOR"),
     (r'NOT',                      "NOT"),
 
     (r'#[0-9A-F]+',           "LITERAL"),
-    (r'@[0-9A-F]+|@R[1-7]',      "ADDR"),
+    (r'@[0-9A-F]+|@{register}',  "ADDR"),
     (r':',                      "COLON"),
     (r',',                      "COMMA"),
-    (r'[A-Za-z_][A-Za-z0-9_]*', "LABEL"),                                          
+    (r'[A-Za-z_][A-Za-z0-9_]*', "LABEL"),
 ]
 
+# Token of program: lexem, tag and its position (line and column from 1)
+Token = namedtuple('Token', ['value', 'tag', 'line', 'column'])
+
+# Master regexes by pattern of registers (see MachineConfig)
+master_regexes = {}
+
+
+def build_master_regex(register_pattern):
+    """
+    All patterns are compiled once into a single alternation with a named
+    group for every pattern. Alternatives are tried in order of
+    token_exprs, as before, and the last group catches a wrong character.
+    {register} in patterns is replaced by register_pattern.
+    """
+    return re.compile('|'.join(
+        [
+            f'(?P<{tag or f"SKIP{n}"}>'
+            f'{pattern.replace("{register}", register_pattern)})'
+            for n, (pattern, tag) in enumerate(token_exprs)
+        ]
+        + ['(?P<WRONG>.)']
+    ), re.DOTALL)
+
+
+def get_master_regex(config):
+    register_pattern = config.register_pattern()
+    regex = master_regexes.get(register_pattern)
+    if regex is None:
+        regex = master_regexes[register_pattern] = \
+            build_master_regex(register_pattern)
+    return regex
+
+
+master_regex = get_master_regex(DEFAULT_MACHINE)
+# Tags by number of group, interned for fast comparison
+group_tags = [None] + [
+    sys.intern(tag) if tag else None for _, tag in token_exprs
+] + [None]
+WRONG_CHARACTER_GROUP = len(token_exprs) + 1
+
 
-def do_lex(characters):
-    characters.upper()
+def do_lex(characters, first_line=1, config=DEFAULT_MACHINE):
+    """
+    Split program to tokens. Lines are counted from first_line by
+    lines of text (empty lines too, though several new lines are one
+    NLINE token), names of registers are taken from config.
+    Returns list of tokens or (False, error message).
+    """
+    master_regex = get_master_regex(config)
     tokens = []
-    pos = 0
-    n_line = 0
-    while pos < len(characters):
-        match = None
-        for token_expr in token_exprs:
-            pattern, tag = token_expr
-            regex = re.compile(pattern)
-            match = regex.match(characters, pos)
-            if match:
-                lexem = match.group(0)
-                token = [lexem.replace('"', ''), tag]
-                if tag:
-                    # Removing # and @ for literals and addresses
-                    if tag in ['LITERAL', 'ADDR']:
-                        token[0] = token[0][1:]
-                    tokens.append(token)
-                    if tag == 'NLINE':
-                        n_line += 1     
-                break   
-        if not match:
-            return False, f"Wrong character '{characters[pos]}' at {n_line+1} line"
+    append = tokens.append
+    n_line = first_line
+    line_start = 0
+    for match in master_regex.finditer(characters):
+        group = match.lastindex
+        tag = group_tags[group]
+        if tag is None:
+            if group == WRONG_CHARACTER_GROUP:
+                return False, \
+                    f"Wrong character '{match.group()}' at {n_line} line"
+            continue
+        lexem = match.group()
+        start = match.start()
+        if tag == 'NLINE':
+            append(Token(lexem, tag, n_line, start - line_start + 1))
+            n_line += len(lexem)
+            line_start = match.end()
         else:
-            pos = match.end(0)
-    if tokens[-1][1] != 'NLINE':
-        tokens.append(['\n', 'NLINE'])
+            # Removing # and @ for literals and addresses
+            if tag == 'LITERAL' or tag == 'ADDR':
+                lexem = lexem[1:]
+            append(Token(lexem, tag, n_line, start - line_start + 1))
+    if not tokens or tokens[-1].tag != 'NLINE':
+        tokens.append(Token('\n', 'NLINE', n_line, len(characters)
+            - line_start + 1))
     return tokens
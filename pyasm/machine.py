@@ -0,0 +1,147 @@
+import json
+
+from .constants import (
+    CMD_CODES,
+    CMDCODE_LENGTH,
+    LITERAL_LENGTH,
+    ADDRESS_LENGTH,
+    REGISTER_LENGTH,
+    MEMORY_RATIO,
+    STACK_DEPTH,
+)
+
+
+# Limits of lengths of parts of command in bits. Memory is up to 64K
+# cells, parts fit in fields of trace records and command fits in
+# 64-bit word.
+MAX_CMDCODE_LENGTH = 8
+MAX_LITERAL_LENGTH = 16
+MAX_ADDRESS_LENGTH = 16
+MAX_REGISTER_LENGTH = 8
+# Limit of depth of stack: SP fits in field of trace records
+MAX_STACK_DEPTH = 2**15 - 1
+
+
+class MachineConfig:
+    """
+    Geometry of emulated machine: lengths of parts of command in bits,
+    ratio of memory for commands and data and depth of stack.
+
+    Lexer, parser, compiler and assembler take config, so machines of
+    different sizes can be used in one process:
+        wide = MachineConfig(literal_length=16, address_length=16)
+        assembler = Assembler(verbose=False, config=wide)
+
+    Config is validated on creation and it's immutable.
+    By default it's the classic machine from constants.py.
+    """
+    def __init__(self, cmdcode_length=CMDCODE_LENGTH,
+            literal_length=LITERAL_LENGTH, address_length=ADDRESS_LENGTH,
+            register_length=REGISTER_LENGTH, memory_ratio=MEMORY_RATIO,
+            stack_depth=STACK_DEPTH):
+        for name, value, limit in (
+            ('cmdcode_length', cmdcode_length, MAX_CMDCODE_LENGTH),
+            ('literal_length', literal_length, MAX_LITERAL_LENGTH),
+            ('address_length', address_length, MAX_ADDRESS_LENGTH),
+            ('register_length', register_length, MAX_REGISTER_LENGTH),
+            ('stack_depth', stack_depth, MAX_STACK_DEPTH),
+        ):
+            if not isinstance(value, int) or not 1 <= value <= limit:
+                raise ValueError(
+                    f'{name} must be an integer from 1 to {limit}, '
+                    f'got {value!r}')
+        max_code = max(int(code) for code in CMD_CODES.values())
+        if max_code >> cmdcode_length:
+            raise ValueError(
+                f'cmdcode_length {cmdcode_length} is too short '
+                f'for command code {max_code}')
+        if not isinstance(memory_ratio, int) or memory_ratio < 1:
+            raise ValueError(
+                f'memory_ratio must be a positive integer, '
+                f'got {memory_ratio!r}')
+        self.__dict__.update(
+            cmdcode_length=cmdcode_length,
+            literal_length=literal_length,
+            address_length=address_length,
+            register_length=register_length,
+            memory_ratio=memory_ratio,
+            stack_depth=stack_depth,
+        )
+        # Derived values
+        self.__dict__.update(
+            word_length=cmdcode_length + literal_length + address_length
+                + register_length,
+            n_codes=2**cmdcode_length,
+            memory_size=2**address_length,
+            first_data_address=2**address_length // memory_ratio,
+            # Address = 1..1 as a signal of indirect addressing by register
+            indirect_address=2**address_length - 1,
+            n_registers=2**register_length - 1,
+        )
+        # Size and type of typed arrays with commands
+        word_size = 4 if self.word_length <= 32 else 8
+        self.__dict__.update(
+            word_size=word_size,
+            word_typecode='I' if word_size == 4 else 'Q',
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError('MachineConfig is immutable')
+
+    def layout(self):
+        """
+        Lengths of parts of command: code, literal, address, register
+        """
+        return (
+            self.cmdcode_length,
+            self.literal_length,
+            self.address_length,
+            self.register_length,
+        )
+
+    def key(self):
+        return self.layout() + (self.memory_ratio, self.stack_depth)
+
+    def fingerprint(self):
+        """
+        Text of config for keys of caches
+        """
+        return json.dumps(self.key())
+
+    def register_pattern(self):
+        """
+        Regular expression of register names R1..Rn for lexer
+        """
+        if self.n_registers <= 9:
+            return f'R[1-{self.n_registers}]'
+        # The longest numbers are first, so R12 isn't lexed as R1
+        numbers = sorted(
+            range(1, self.n_registers + 1), key=lambda n: -len(str(n)))
+        return 'R(?:' + '|'.join(str(n) for n in numbers) + ')'
+
+    def __eq__(self, other):
+        return isinstance(other, MachineConfig) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return (
+            f'MachineConfig(cmdcode_length={self.cmdcode_length}, '
+            f'literal_length={self.literal_length}, '
+            f'address_length={self.address_length}, '
+            f'register_length={self.register_length}, '
+            f'memory_ratio={self.memory_ratio}, '
+            f'stack_depth={self.stack_depth})'
+        )
+
+
+# Classic machine: 8-bit literals and addresses, 256 cells of memory
+DEFAULT_MACHINE = MachineConfig()
+
+# Named machines, e.g. for command line
+MACHINES = {
+    'classic': DEFAULT_MACHINE,
+    # 16-bit literals and addresses, 64K cells of memory
+    'wide': MachineConfig(literal_length=16, address_length=16),
+}
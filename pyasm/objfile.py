@@ -0,0 +1,205 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from .lexer import do_lex
+from .asm_parser import Parser
+from .compiler import Compiler
+from .machine import DEFAULT_MACHINE, MACHINES
+
+
+OBJECT_EXTENSION = '.aso'
+OBJECT_MAGIC = b'PYASMOBJ'
+OBJECT_VERSION = 1
+
+# Header of object file (little-endian):
+#   magic, version, lengths of 4 parts of command (see constants.py),
+#   count of commands, sizes of symbols and display lines sections
+# Header is padded to 32 bytes, so words are aligned
+HEADER = struct.Struct('<8sHBBBBIII6x')
+# Commands are stored as packed fixed-width words of 4 or 8 bytes,
+# size is defined by layout of command (see MachineConfig.word_size)
+# Lines of source are stored as 4-byte words
+LINE_TYPECODE = 'I'
+LINE_SIZE = 4
+
+# Sections after header:
+#   words          -- count * word size, commands in integer form
+#   source lines   -- count * LINE_SIZE, line of source for every command
+#   symbols        -- JSON, labels: label->address
+#   display lines  -- JSON, valid_cmd_lines for GUI
+
+
+def write_object(path, compiled_cmds, valid_cmd_lines, jumps,
+        source_lines=None, config=DEFAULT_MACHINE):
+    """
+    Write compiled program to object file
+    """
+    words = array(config.word_typecode, compiled_cmds)
+    if source_lines is None:
+        source_lines = [0] * len(words)
+    lines = array(LINE_TYPECODE, source_lines)
+    if sys.byteorder != 'little':
+        words.byteswap()
+        lines.byteswap()
+    symbols = json.dumps(jumps).encode()
+    display = json.dumps(valid_cmd_lines).encode()
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(
+            OBJECT_MAGIC,
+            OBJECT_VERSION,
+            *config.layout(),
+            len(words),
+            len(symbols),
+            len(display),
+        ))
+        f.write(words.tobytes())
+        f.write(lines.tobytes())
+        f.write(symbols)
+        f.write(display)
+
+
+class ObjectFile:
+    """
+    Object file, which is memory-mapped on open.
+
+    Commands and source lines are read from mapped pages without copying,
+    so processes, which are opening the same file, share its memory.
+    Layout of commands in file must be the same, as in config.
+    """
+    def __init__(self, path, config=DEFAULT_MACHINE):
+        self.path = path
+        self.config = config
+        with open(path, 'rb') as f:
+            self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.__mmap) < HEADER.size:
+            raise ValueError(f'{path} is not a pyasm object file')
+        magic, version, *layout, count, symbols_size, display_size = \
+            HEADER.unpack_from(self.__mmap)
+        if magic != OBJECT_MAGIC:
+            raise ValueError(f'{path} is not a pyasm object file')
+        if version != OBJECT_VERSION:
+            raise ValueError(
+                f'{path}: version {version} of object file is not supported')
+        if tuple(layout) != config.layout():
+            raise ValueError(
+                f'{path} is compiled for command layout {tuple(layout)}, '
+                f'but current layout is {config.layout()}')
+        offset = HEADER.size
+        size = count * config.word_size
+        lines_size = count * LINE_SIZE
+        if len(self.__mmap) != offset + size + lines_size + symbols_size \
+                + display_size:
+            raise ValueError(f'{path}: object file is truncated')
+        view = memoryview(self.__mmap)
+        # Commands in integer form
+        self.words = self.__words(
+            view[offset:offset+size], config.word_typecode)
+        offset += size
+        # Line of source for every command (0 if unknown)
+        self.source_lines = self.__words(
+            view[offset:offset+lines_size], LINE_TYPECODE)
+        offset += lines_size
+        # Dict of labels: label->address
+        self.jumps = json.loads(bytes(view[offset:offset+symbols_size]))
+        offset += symbols_size
+        # Valid cmd lines for GUI
+        self.valid_cmd_lines = json.loads(
+            bytes(view[offset:offset+display_size]))
+        view.release()
+
+    @staticmethod
+    def __words(view, typecode):
+        """
+        Words from mapped bytes, copying is needed only on big-endian
+        """
+        if sys.byteorder == 'little':
+            return view.cast(typecode)
+        words = array(typecode, bytes(view))
+        words.byteswap()
+        return words
+
+    def close(self):
+        for words in (self.words, self.source_lines):
+            if isinstance(words, memoryview):
+                words.release()
+        self.__mmap.close()
+
+    def __len__(self):
+        return len(self.words)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def build_object(source_path, object_path=None, config=DEFAULT_MACHINE):
+    """
+    Compile program from source file to object file.
+    Returns path of object file or raises ValueError with error message.
+    """
+    if object_path is None:
+        object_path = os.path.splitext(source_path)[0] + OBJECT_EXTENSION
+    with open(source_path, 'r') as f:
+        tokens = do_lex(f.read(), config=config)
+    if tokens[0] == False:
+        raise ValueError(tokens[1])
+    parser = Parser(tokens, config)
+    is_valid, error_msg = parser.is_valid_code()
+    if not is_valid:
+        raise ValueError(error_msg.strip())
+    compiler = Compiler(parser.valid_cmds, config)
+    compiler.compile()
+    write_object(
+        object_path,
+        compiler.compiled_cmds,
+        compiler.valid_cmd_lines,
+        compiler.jumps,
+        compiler.source_lines,
+        config,
+    )
+    return object_path
+
+
+def add_parser(subparsers):
+    """
+    Add 'build' command to command line interface
+    """
+    parser = subparsers.add_parser(
+        'build',
+        help='compile programs to object files',
+        description='Compile programs to object files, which are loaded '
+            'without lexer, parser and compiler.',
+    )
+    parser.add_argument('sources', nargs='+', help='.ass programs')
+    parser.add_argument(
+        '-o', '--output', default=None,
+        help=f'object file (default: program with {OBJECT_EXTENSION} '
+            'extension), only for one program')
+    parser.add_argument(
+        '--machine', choices=sorted(MACHINES), default='classic',
+        help='geometry of machine (default: classic)')
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    """
+    Entry point of 'pyasm build'
+    """
+    if args.output and len(args.sources) > 1:
+        print('Option -o is allowed only for one program')
+        return 2
+    status = 0
+    for source_path in args.sources:
+        try:
+            print(build_object(
+                source_path, args.output, MACHINES[args.machine]))
+        except (OSError, ValueError) as ex:
+            print(f'{source_path}: {ex}')
+            status = 1
+    return status
@@ -0,0 +1,338 @@
+from collections import namedtuple
+
+from .cfg import ControlFlowGraph
+from .constants import CMD_CODES, INPUT_BASE, MODE_NONE
+from .decoder import Instruction
+from .machine import DEFAULT_MACHINE
+
+
+# Levels of optimization:
+#   0 -- program is compiled as it is
+#   1 -- jump threading and removal of unreachable blocks
+#   2 -- also folding of constants and removal of PUSH X / POP X pairs
+OPT_LEVELS = (0, 1, 2)
+DEFAULT_OPT_LEVEL = 0
+# Limit of passes over program: every pass can give work to the next one
+MAX_PASSES = 8
+
+# Tags of jumps
+JUMP_TAGS = {
+    'JMP', 'JC', 'JZ', 'JP', 'JO', 'JS', 'NJC', 'NJZ', 'NJP', 'NJO', 'NJS',
+}
+# Commands, which read flags
+FLAG_READERS = (JUMP_TAGS - {'JMP'}) | {'ADC'}
+# Commands, which set flags
+FLAG_WRITERS = {
+    'ADD', 'SUB', 'INC', 'DEC', 'MUL', 'ADC', 'CMP',
+    'NOT', 'OR', 'AND', 'XOR', 'NOR', 'SHL', 'SHR',
+}
+
+# Folding of PUSH #a / PUSH #b / OP: tag -> value, which OP pushes
+BINARY_FOLDS = {
+    'ADD': lambda a, b: a + b,
+    'SUB': lambda a, b: abs(a - b),
+    'AND': lambda a, b: a & b,
+    'OR': lambda a, b: a | b,
+    'XOR': lambda a, b: a ^ b,
+}
+# Folding of PUSH #a / OP: tag -> value, which OP pushes
+UNARY_FOLDS = {
+    'INC': lambda a: a + 1,
+    'DEC': lambda a: abs(a - 1),
+    'SHL': lambda a: a << 1,
+    'SHR': lambda a: a >> 1,
+}
+
+# Result of optimization: count of removed commands, counts of folded
+# operations, of removed PUSH/POP pairs, of retargeted jumps and of
+# removed unreachable commands, and reason, why program wasn't
+# optimized, or None
+OptimizationStats = namedtuple(
+    'OptimizationStats',
+    ['removed', 'folded', 'pairs', 'threaded', 'unreachable', 'skipped'],
+)
+
+
+class Optimizer:
+    """
+    Peephole optimizer of valid commands between Parser and Compiler:
+        optimizer = Optimizer(parser.valid_cmds, opt_level, config)
+        compiler = Compiler(optimizer.optimize(), config)
+
+    Labels are kept, so Compiler computes jumps, lines for GUI and
+    lines of source (the line of the first command of folded sequence)
+    for optimized program. Sequences never go through labels.
+    Reachability and liveness of flags are taken from control-flow
+    graph of commands (see cfg.py).
+
+    Optimized program has the same results, but not the same steps:
+    removed PUSH/POP don't leave old values in stack slots above SP and
+    stack is shallower, so it's assumed that program doesn't go out of
+    stack bounds. Folding removes operations, which set flags, so it's
+    done only if flags are set again on every path before any command
+    reads them (flags at the end of program are considered as read).
+    Program isn't optimized, if it has jumps by number of command or
+    reads and writes its own commands in memory by direct addresses
+    (see OptimizationStats.skipped).
+    """
+    def __init__(self, valid_cmds, opt_level=DEFAULT_OPT_LEVEL,
+            config=DEFAULT_MACHINE):
+        if opt_level not in OPT_LEVELS:
+            raise ValueError(
+                f'Optimization level must be one of {OPT_LEVELS}, '
+                f'got {opt_level!r}')
+        self.valid_cmds = list(valid_cmds)
+        self.opt_level = opt_level
+        self.config = config
+        self.folded = 0
+        self.pairs = 0
+        self.threaded = 0
+        self.unreachable = 0
+        self.stats = None
+
+    def optimize(self):
+        """
+        Optimized list of valid commands, statistics are in self.stats
+        """
+        cmds = self.valid_cmds
+        n_cmds = self.__count_cmds(cmds)
+        skipped = self.__skip_reason(cmds, n_cmds)
+        if skipped is None and self.opt_level > 0:
+            for _ in range(MAX_PASSES):
+                changes = self.__changes()
+                cmds = self.__thread_jumps(cmds)
+                cmds = self.__remove_unreachable(cmds)
+                if self.opt_level >= 2:
+                    cmds = self.__fold(cmds)
+                if self.__changes() == changes:
+                    break
+        self.valid_cmds = cmds
+        self.stats = OptimizationStats(
+            n_cmds - self.__count_cmds(cmds),
+            self.folded,
+            self.pairs,
+            self.threaded,
+            self.unreachable,
+            skipped,
+        )
+        return cmds
+
+    def __changes(self):
+        return self.folded + self.pairs + self.threaded + self.unreachable
+
+    @staticmethod
+    def __count_cmds(cmds):
+        """
+        Count of commands w/o labels
+        """
+        return sum(1 for cmd in cmds if cmd[0][1] != 'LABEL')
+
+    @staticmethod
+    def __skip_reason(cmds, n_cmds):
+        """
+        Reason, why program can't be optimized, or None
+        """
+        for cmd in cmds:
+            tag = cmd[0][1]
+            if len(cmd) < 2 or cmd[1][1] != 'ADDR':
+                continue
+            if tag in JUMP_TAGS:
+                return 'jump by number of command'
+            if cmd[1][0][0] != 'R' and int(cmd[1][0], INPUT_BASE) < n_cmds:
+                return 'commands are accessed as data'
+        return None
+
+    @staticmethod
+    def __targets(cmds):
+        """
+        Label -> index of the first command after it or None at the end
+        """
+        targets = {}
+        waiting = []
+        for i, cmd in enumerate(cmds):
+            if cmd[0][1] == 'LABEL':
+                waiting.append(cmd[0][0])
+            else:
+                for label in waiting:
+                    targets[label] = i
+                waiting = []
+        for label in waiting:
+            targets[label] = None
+        return targets
+
+    def __thread_jumps(self, cmds):
+        """
+        Jump to unconditional jump goes directly to its target
+        """
+        targets = self.__targets(cmds)
+        result = []
+        for cmd in cmds:
+            if cmd[0][1] in JUMP_TAGS and cmd[1][1] == 'LABEL':
+                label = cmd[1][0]
+                visited = {label}
+                while True:
+                    target = targets.get(label)
+                    if target is None:
+                        break
+                    target_cmd = cmds[target]
+                    if target_cmd[0][1] != 'JMP' \
+                            or target_cmd[1][1] != 'LABEL' \
+                            or target_cmd[1][0] in visited:
+                        break
+                    label = target_cmd[1][0]
+                    visited.add(label)
+                if label != cmd[1][0]:
+                    cmd = (cmd[0], cmd[1]._replace(value=label))
+                    self.threaded += 1
+            result.append(cmd)
+        return result
+
+    @staticmethod
+    def __graph(cmds):
+        """
+        Control-flow graph of valid commands, tags of commands by PC
+        and PC of every item of cmds (None for labels)
+        """
+        jumps = {}
+        tags = []
+        pcs = []
+        for cmd in cmds:
+            if cmd[0][1] == 'LABEL':
+                jumps[cmd[0][0]] = len(tags)
+                pcs.append(None)
+            else:
+                pcs.append(len(tags))
+                tags.append(cmd[0][1])
+        instructions = []
+        for cmd in cmds:
+            tag = cmd[0][1]
+            if tag == 'LABEL':
+                continue
+            address = jumps[cmd[1][0]] if tag in JUMP_TAGS else 0
+            instructions.append(Instruction(
+                int(CMD_CODES[tag]), 0, address, 0, MODE_NONE))
+        return ControlFlowGraph(instructions, jumps), tags, pcs
+
+    def __remove_unreachable(self, cmds):
+        """
+        Commands of blocks, which can't be reached from the start
+        """
+        cfg, _, pcs = self.__graph(cmds)
+        result = []
+        for cmd, pc in zip(cmds, pcs):
+            if pc is not None \
+                    and not cfg.is_reachable(cfg.block_of[pc]):
+                self.unreachable += 1
+                continue
+            result.append(cmd)
+        return result
+
+    @staticmethod
+    def __flags_live_out(cfg, tags):
+        """
+        Flags can be read after every block: by reader of flags in
+        any successor before writer or at the end of program
+        """
+        # Flags on entry of block: True -- read, False -- set before
+        # reading, None -- not used
+        uses = []
+        for block in cfg.blocks:
+            use = None
+            for pc in range(block.start, block.end):
+                if tags[pc] in FLAG_READERS:
+                    use = True
+                    break
+                if tags[pc] in FLAG_WRITERS:
+                    use = False
+                    break
+            uses.append(use)
+        live_in = [False] * len(cfg.blocks)
+        live_out = [block.exits for block in cfg.blocks]
+        changed = True
+        while changed:
+            changed = False
+            for index in reversed(cfg.order):
+                block = cfg.blocks[index]
+                out = block.exits or any(
+                    live_in[succ] for succ in block.succs)
+                live = uses[index] or (uses[index] is None and out)
+                if out != live_out[index] or live != live_in[index]:
+                    live_out[index] = out
+                    live_in[index] = live
+                    changed = True
+        return live_out
+
+    @staticmethod
+    def __flags_are_dead(cfg, tags, live_out, pc):
+        """
+        Flags, which are set by command at PC, are set again before
+        any command reads them
+        """
+        index = cfg.block_of[pc]
+        for next_pc in range(pc + 1, cfg.blocks[index].end):
+            if tags[next_pc] in FLAG_READERS:
+                return False
+            if tags[next_pc] in FLAG_WRITERS:
+                return True
+        return not live_out[index]
+
+    @staticmethod
+    def __literal(cmd):
+        """
+        Value of PUSH #literal or None
+        """
+        if cmd[0][1] == 'PUSH' and cmd[1][1] == 'LITERAL':
+            return int(cmd[1][0], INPUT_BASE)
+        return None
+
+    def __fold(self, cmds):
+        """
+        Fold operations with literals and remove PUSH X / POP X pairs
+        """
+        max_literal = 2 ** self.config.literal_length - 1
+        cfg, tags, pcs = self.__graph(cmds)
+        live_out = self.__flags_live_out(cfg, tags)
+        result = []
+        for cmd, pc in zip(cmds, pcs):
+            tag = cmd[0][1]
+            value = None
+            if tag in BINARY_FOLDS and len(result) >= 2:
+                a = self.__literal(result[-2])
+                b = self.__literal(result[-1])
+                if a is not None and b is not None:
+                    value = BINARY_FOLDS[tag](a, b)
+                    n_operands = 2
+            elif tag in UNARY_FOLDS and result:
+                a = self.__literal(result[-1])
+                if a is not None:
+                    value = UNARY_FOLDS[tag](a)
+                    n_operands = 1
+            if value is not None and 0 <= value <= max_literal \
+                    and self.__flags_are_dead(cfg, tags, live_out, pc):
+                push = result[-n_operands]
+                del result[-n_operands:]
+                result.append(
+                    (push[0], push[1]._replace(value=f'{value:X}')))
+                self.folded += 1
+                continue
+            if tag == 'POP' and result and self.__same_operand(
+                    result[-1], cmd):
+                result.pop()
+                self.pairs += 1
+                continue
+            result.append(cmd)
+        return result
+
+    @staticmethod
+    def __same_operand(push, pop):
+        """
+        PUSH and POP of the same register or memory cell by direct
+        address (indirect address can be out of memory)
+        """
+        if push[0][1] != 'PUSH' or push[1][1] != pop[1][1]:
+            return False
+        if pop[1][1] == 'REG':
+            return push[1][0] == pop[1][0]
+        if pop[1][0][0] == 'R' or push[1][0][0] == 'R':
+            return False
+        return int(push[1][0], INPUT_BASE) == int(pop[1][0], INPUT_BASE)
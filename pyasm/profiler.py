@@ -0,0 +1,210 @@
+import time
+from array import array
+from collections import namedtuple
+
+from .constants import CMD_CODES
+from .decoder import CONDITIONAL_JUMPS
+
+
+# Type of counters: unsigned integer, 64 bits
+COUNTER_TYPECODE = 'Q'
+# Count of rows in every part of report by default
+DEFAULT_REPORT_TOP = 10
+
+# Names of commands by code
+COMMAND_NAMES = {int(code): name for name, code in CMD_CODES.items()}
+
+# Statistics of one command of program
+LineStats = namedtuple('LineStats', ['pc', 'hits', 'text', 'label'])
+# Statistics of one command code: count and wall time in nanoseconds
+OpcodeStats = namedtuple('OpcodeStats', ['code', 'name', 'count', 'time_ns'])
+# Statistics of one conditional jump
+BranchStats = namedtuple(
+    'BranchStats', ['pc', 'text', 'taken', 'not_taken'])
+# Natural loop (see cfg.py): commands from start (header) to end,
+# count of iterations and count of executed commands in the loop
+LoopStats = namedtuple(
+    'LoopStats', ['start', 'end', 'label', 'iterations', 'steps'])
+
+
+class Profiler:
+    """
+    Execution profiler of assembler.
+
+    All counters are typed arrays, indexed by PC or by command code,
+    so every step costs a few index increments:
+        hits      -- executions of every command of program
+        counts    -- executions of every command code
+        times     -- wall time of every command code in nanoseconds
+        taken     -- taken conditional jumps by PC
+        not_taken -- not taken conditional jumps by PC
+    and max_stack_depth is the maximum of SP.
+
+    Jump to the next command is counted as not taken, because PC after
+    it is the same.
+    """
+    def __init__(self, assembler):
+        self.assembler = assembler
+        self.clear()
+
+    def clear(self):
+        """
+        Reset all counters, e.g. after loading of new program
+        """
+        n_cmds = len(self.assembler.decoded_cmds)
+        zeros = array(COUNTER_TYPECODE, [0])
+        self.hits = zeros * n_cmds
+        self.taken = zeros * n_cmds
+        self.not_taken = zeros * n_cmds
+        self.counts = zeros * self.assembler.config.n_codes
+        self.times = zeros * self.assembler.config.n_codes
+        self.max_stack_depth = self.assembler.R['SP']
+        self.steps = 0
+
+    def execute(self, cmd):
+        """
+        Execute one command with counting.
+        Must be called instead of dispatch of assembler. Command, which
+        raised error, isn't counted: the step wasn't done.
+        """
+        R = self.assembler.R
+        pc = R['PC']
+        code = cmd.code
+        start = time.perf_counter_ns()
+        self.assembler.dispatch[code](cmd)
+        self.times[code] += time.perf_counter_ns() - start
+        self.hits[pc] += 1
+        self.counts[code] += 1
+        self.steps += 1
+        if code in CONDITIONAL_JUMPS:
+            if R['PC'] == pc + 1:
+                self.not_taken[pc] += 1
+            else:
+                self.taken[pc] += 1
+        if R['SP'] > self.max_stack_depth:
+            self.max_stack_depth = R['SP']
+
+    def __text(self, pc):
+        lines = self.assembler.valid_cmd_lines
+        if lines is not None and pc < len(lines):
+            return lines[pc].strip()
+        return ''
+
+    def __label(self, pc):
+        return self.assembler.control_flow_graph().labels.get(pc, '')
+
+    def line_stats(self):
+        """
+        Statistics of executed commands, the most frequent first
+        """
+        stats = [
+            LineStats(pc, hits, self.__text(pc), self.__label(pc))
+            for pc, hits in enumerate(self.hits) if hits
+        ]
+        stats.sort(key=lambda line: (-line.hits, line.pc))
+        return stats
+
+    def opcode_stats(self):
+        """
+        Statistics of executed command codes, the most expensive first
+        """
+        stats = [
+            OpcodeStats(
+                code, COMMAND_NAMES.get(code, f'?{code}'),
+                count, self.times[code],
+            )
+            for code, count in enumerate(self.counts) if count
+        ]
+        stats.sort(key=lambda opcode: (-opcode.time_ns, opcode.code))
+        return stats
+
+    def branch_stats(self):
+        """
+        Statistics of executed conditional jumps in order of program
+        """
+        return [
+            BranchStats(pc, self.__text(pc), taken, not_taken)
+            for pc, (taken, not_taken)
+                in enumerate(zip(self.taken, self.not_taken))
+            if taken or not_taken
+        ]
+
+    def loop_stats(self):
+        """
+        Hot loops: natural loops of control-flow graph, iterations are
+        counted by back edges to header. The most expensive loops first.
+        """
+        cfg = self.assembler.control_flow_graph()
+        loops = []
+        for loop in cfg.loops():
+            start = cfg.blocks[loop.header].start
+            iterations = 0
+            for latch in loop.latches:
+                pc = cfg.blocks[latch].end - 1
+                cmd = self.assembler.decoded_cmds[pc]
+                if cmd.code in CONDITIONAL_JUMPS and cmd.address != pc + 1:
+                    if cmd.address == start:
+                        iterations += self.taken[pc]
+                    else:
+                        iterations += self.not_taken[pc]
+                else:
+                    iterations += self.hits[pc]
+            if iterations:
+                pcs = list(cfg.loop_pcs(loop))
+                loops.append(LoopStats(
+                    start, pcs[-1], self.__label(start), iterations,
+                    sum(self.hits[pc] for pc in pcs),
+                ))
+        loops.sort(key=lambda loop: (-loop.steps, loop.start))
+        return loops
+
+    def report(self, top=DEFAULT_REPORT_TOP):
+        """
+        Text report of profile, every part has at most top rows
+        """
+        steps = max(self.steps, 1)
+        lines = [
+            f'Steps: {self.steps}, max stack depth: {self.max_stack_depth}',
+            '',
+            'Hot commands:',
+            f'{"PC":>4} {"hits":>10} {"%":>6}  command',
+        ]
+        for line in self.line_stats()[:top]:
+            lines.append(
+                f'{line.pc:>4} {line.hits:>10} '
+                f'{100 * line.hits / steps:>6.2f}  {line.text}')
+        lines += [
+            '',
+            'Commands by time:',
+            f'{"code":<5} {"count":>10} {"time, ms":>10} {"ns/cmd":>8}',
+        ]
+        for opcode in self.opcode_stats()[:top]:
+            lines.append(
+                f'{opcode.name:<5} {opcode.count:>10} '
+                f'{opcode.time_ns / 1e6:>10.3f} '
+                f'{opcode.time_ns / opcode.count:>8.0f}')
+        branches = self.branch_stats()
+        if branches:
+            lines += [
+                '',
+                'Conditional jumps:',
+                f'{"PC":>4} {"taken":>10} {"not taken":>10}  command',
+            ]
+            for branch in branches[:top]:
+                lines.append(
+                    f'{branch.pc:>4} {branch.taken:>10} '
+                    f'{branch.not_taken:>10}  {branch.text}')
+        loops = self.loop_stats()
+        if loops:
+            lines += [
+                '',
+                'Hot loops:',
+                f'{"from":>4} {"to":>4} {"iterations":>10} {"steps":>10} '
+                f'{"%":>6}  label',
+            ]
+            for loop in loops[:top]:
+                lines.append(
+                    f'{loop.start:>4} {loop.end:>4} {loop.iterations:>10} '
+                    f'{loop.steps:>10} {100 * loop.steps / steps:>6.2f}  '
+                    f'{loop.label}')
+        return '\n'.join(lines)
@@ -0,0 +1,237 @@
+import struct
+from collections import namedtuple
+
+from .constants import CMD_CODES
+
+
+TRACE_EXTENSION = '.trc'
+TRACE_MAGIC = b'PYASMTRC'
+TRACE_VERSION = 1
+# Header of trace file: magic, version, size of record
+TRACE_HEADER = struct.Struct('<8sHH4x')
+
+# Record of one executed command (little-endian, 32 bytes):
+#   step, PC, code, register, literal, address of command,
+#   SP and flags after command, memory write flag, address and value
+RECORD = struct.Struct('<IHBBHHhBBiq4x')
+RECORD_SIZE = RECORD.size
+
+# Bits of flags in record
+FLAG_BITS = {'Z': 1, 'S': 2, 'P': 4, 'C': 8, 'O': 16}
+
+# Default count of records in ring buffer
+DEFAULT_RING_CAPACITY = 65536
+# Default count of records, which are written to file at once
+DEFAULT_FILE_BUFFER = 4096
+
+# Decoded record of trace
+TraceRecord = namedtuple(
+    'TraceRecord',
+    ['step', 'pc', 'code', 'register', 'literal', 'address', 'sp', 'flags',
+     'write_address', 'write_value'],
+)
+
+# Names of commands by code
+COMMAND_NAMES = {int(code): name for name, code in CMD_CODES.items()}
+
+
+class Tracer:
+    """
+    Base class of tracers: packs records of executed commands.
+    Assembler calls write after every command, if tracer is set:
+        assembler.tracer = RingTracer()
+    """
+    def write(self, assembler, pc, cmd, write_address):
+        """
+        Record command, which was executed at pc.
+        write_address is address of changed memory cell or None.
+        """
+        flags = 0
+        for key, value in assembler.flags.copy().items():
+            if value:
+                flags |= FLAG_BITS[key]
+        if write_address is None:
+            has_write, write_address, value = 0, 0, 0
+        else:
+            has_write, value = 1, assembler.memory[write_address]
+        self.store(RECORD.pack(
+            assembler.step_count & 0xFFFFFFFF,
+            pc,
+            cmd.code,
+            cmd.register,
+            cmd.literal,
+            cmd.address,
+            assembler.R['SP'],
+            flags,
+            has_write,
+            write_address,
+            value,
+        ))
+
+    def store(self, record):
+        raise NotImplementedError
+
+
+class RingTracer(Tracer):
+    """
+    Bounded in-memory trace: only the last capacity records are kept
+    """
+    def __init__(self, capacity=DEFAULT_RING_CAPACITY):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD_SIZE)
+        self.count = 0 # Count of all stored records
+
+    def store(self, record):
+        position = (self.count % self.capacity) * RECORD_SIZE
+        self.buffer[position:position+RECORD_SIZE] = record
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def to_bytes(self):
+        """
+        Kept records from the oldest to the newest
+        """
+        if self.count <= self.capacity:
+            return bytes(self.buffer[:self.count * RECORD_SIZE])
+        position = (self.count % self.capacity) * RECORD_SIZE
+        return bytes(self.buffer[position:] + self.buffer[:position])
+
+    def records(self):
+        """
+        Decoded records from the oldest to the newest
+        """
+        return decode_records(self.to_bytes())
+
+    def save(self, path):
+        """
+        Save kept records to trace file
+        """
+        with open(path, 'wb') as f:
+            f.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, RECORD_SIZE))
+            f.write(self.to_bytes())
+
+
+class FileTracer(Tracer):
+    """
+    Streaming trace to file. Records are collected in buffer and written
+    by buffer_records at once. Tracer must be closed at the end.
+    """
+    def __init__(self, path, buffer_records=DEFAULT_FILE_BUFFER):
+        self.path = path
+        self.buffer_size = buffer_records * RECORD_SIZE
+        self.buffer = bytearray()
+        self.count = 0
+        self.file = open(path, 'wb')
+        self.file.write(
+            TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, RECORD_SIZE))
+
+    def store(self, record):
+        self.buffer += record
+        self.count += 1
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def decode_records(data):
+    """
+    Decode packed records to list of TraceRecord.
+    Flags are decoded to dict, write address and value are None,
+    if command didn't change memory.
+    """
+    records = []
+    for (step, pc, code, register, literal, address, sp, flags, has_write,
+            write_address, value) in RECORD.iter_unpack(data):
+        if not has_write:
+            write_address = value = None
+        records.append(TraceRecord(
+            step, pc, code, register, literal, address, sp,
+            {key: bool(flags & bit) for key, bit in FLAG_BITS.items()},
+            write_address, value,
+        ))
+    return records
+
+
+def read_trace(path):
+    """
+    Read trace file, which was written by FileTracer or RingTracer.save
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < TRACE_HEADER.size:
+        raise ValueError(f'{path} is not a pyasm trace file')
+    magic, version, record_size = TRACE_HEADER.unpack_from(data)
+    if magic != TRACE_MAGIC or record_size != RECORD_SIZE:
+        raise ValueError(f'{path} is not a pyasm trace file')
+    if version != TRACE_VERSION:
+        raise ValueError(
+            f'{path}: version {version} of trace file is not supported')
+    data = data[TRACE_HEADER.size:]
+    # Last record can be incomplete, if program was killed
+    return decode_records(data[:len(data) - len(data) % RECORD_SIZE])
+
+
+def format_record(record):
+    """
+    One line of text for trace record
+    """
+    name = COMMAND_NAMES.get(record.code, f'?{record.code}')
+    flags = ''.join(key if value else '-'
+        for key, value in record.flags.items())
+    line = (
+        f'{record.step:>8} PC={record.pc:02X} {name:<4} '
+        f'lit={record.literal:02X} addr={record.address:02X} '
+        f'reg={record.register} SP={record.sp} {flags}'
+    )
+    if record.write_address is not None:
+        line += f' [{record.write_address:02X}]={record.write_value}'
+    return line
+
+
+def add_parser(subparsers):
+    """
+    Add 'trace' command to command line interface
+    """
+    parser = subparsers.add_parser(
+        'trace',
+        help='print trace file',
+        description='Decode and print trace of executed commands.',
+    )
+    parser.add_argument('path', help='trace file')
+    parser.add_argument(
+        '--last', type=int, default=None,
+        help='print only the last N records')
+    parser.set_defaults(func=main)
+
+
+def main(args):
+    """
+    Entry point of 'pyasm trace'
+    """
+    try:
+        records = read_trace(args.path)
+    except (OSError, ValueError) as ex:
+        print(ex)
+        return 1
+    if args.last is not None:
+        records = records[-args.last:]
+    for record in records:
+        print(format_record(record))
+    return 0
@@ -0,0 +1,423 @@
+from array import array
+
+import numpy as np
+
+from .decoder import (
+    JMP_CODE,
+    PUSH_CODE,
+    POP_CODE,
+    CONDITIONAL_JUMPS,
+)
+from .constants import (
+    CMD_CODES,
+    MODE_NONE,
+    MODE_LITERAL,
+    MODE_DIRECT,
+    MODE_REGISTER,
+    MODE_INDIRECT,
+    HALT_END,
+    HALT_MAX_STEPS,
+    HALT_ERROR,
+    HALT_STACK_OVERFLOW,
+    HALT_STACK_UNDERFLOW,
+    HALT_VALUE_OVERFLOW,
+)
+from .assembler_lang import (
+    Assembler,
+    RunResult,
+    StackError,
+    MEMORY_TYPECODE,
+    STACK_TYPECODE,
+)
+
+
+FLAGS = ['Z', 'S', 'P', 'C', 'O']
+# Codes of lane halt reasons in VectorEngine.halt_codes
+HALT_REASONS = [
+    None, HALT_END, HALT_MAX_STEPS, HALT_ERROR,
+    HALT_STACK_OVERFLOW, HALT_STACK_UNDERFLOW, HALT_VALUE_OVERFLOW,
+]
+(RUNNING, END, MAX_STEPS, ERROR,
+    STACK_OVERFLOW, STACK_UNDERFLOW,
+    VALUE_OVERFLOW) = range(len(HALT_REASONS))
+
+# Stack operations: command code -> (name, count of pops, count of pushes)
+ALU_OPS = {
+    int(CMD_CODES[name]): (name, pops, pushes) for name, pops, pushes in [
+        ('ADD', 2, 1), ('SUB', 2, 1), ('INC', 1, 1), ('DEC', 1, 1),
+        ('CMP', 2, 0), ('NOT', 1, 1), ('OR', 2, 1), ('AND', 2, 1),
+        ('XOR', 2, 1), ('NOR', 2, 1), ('SHL', 1, 1), ('SHR', 1, 1),
+        ('MUL', 2, 2), ('ADC', 2, 1),
+    ]
+}
+NOPE_CODE = int(CMD_CODES['NOPE'])
+# Bounds of 64-bit lanes
+INT64_MIN = -2**63
+INT64_MAX = 2**63 - 1
+# Operands of ADD, SUB, CMP and ADC in this range never overflow
+ADD_OPERAND_LIMIT = 2**62
+# Operations, which never go out of 64 bits
+SAFE_OPS = {'NOT', 'OR', 'AND', 'XOR', 'NOR', 'SHR'}
+
+
+class VectorEngine:
+    """
+    Lockstep execution engine: one program over many data sets at once.
+
+    Holds N copies (lanes) of machine state as NumPy arrays and executes
+    one command for all running lanes on every step. When lanes take
+    different branches at conditional jumps, they are grouped by PC and
+    every group is executed with masked (fancy indexed) array operations.
+
+    Commands are the same pre-decoded Instructions, as in Assembler.
+    Rare cases (stack or indirect address out of bounds, unknown
+    operands) of a lane are executed by Assembler handlers, so every
+    lane ends in the same state, as Assembler.run with its data.
+    Values are limited by 64-bit integers, as memory cells are: lanes,
+    where stack operation can go out of 64 bits, are also executed by
+    Assembler, which computes exact result and halts with
+    HALT_VALUE_OVERFLOW, if it can't be stored.
+    """
+    def __init__(self, assembler, n_lanes):
+        # Assembler with loaded program, its state is copied to all lanes
+        self.assembler = assembler
+        self.cmds = assembler.decoded_cmds
+        self.n_lanes = n_lanes
+        self.n_registers = assembler.config.n_registers
+        self.literal_length = assembler.config.literal_length
+        # Registers of lanes, indexed by number of register
+        self.R = np.zeros(
+            (n_lanes, self.n_registers + 1), dtype=np.int64)
+        for register in range(1, self.n_registers + 1):
+            self.R[:, register] = assembler.R[register]
+        self.pc = np.full(n_lanes, assembler.R['PC'], dtype=np.int64)
+        self.sp = np.full(n_lanes, assembler.R['SP'], dtype=np.int64)
+        self.flags = {
+            flag: np.full(n_lanes, assembler.flags[flag], dtype=bool)
+            for flag in FLAGS
+        }
+        self.stack = np.tile(
+            np.frombuffer(assembler.stack, dtype=np.int64), (n_lanes, 1))
+        # Stack high-water mark of every lane
+        self.stack_high_water = np.full(
+            n_lanes, assembler.stack_high_water, dtype=np.int64)
+        # Memory of lanes: change it to set data sets of lanes
+        self.memory = np.tile(
+            np.frombuffer(assembler.memory, dtype=np.int64), (n_lanes, 1))
+        # Count of executed commands and halt reason code of every lane
+        self.steps = np.zeros(n_lanes, dtype=np.int64)
+        self.halt_codes = np.zeros(n_lanes, dtype=np.int8)
+        # Error messages of lanes: lane -> message
+        self.errors = {}
+        # Assembler for execution of rare cases of one lane
+        self.__scalar = Assembler(
+            assembler.compiled_cmds,
+            assembler.valid_cmd_lines,
+            verbose=False,
+            jumps=assembler.jumps,
+            config=assembler.config,
+        )
+
+    def run(self, max_steps=None):
+        """
+        Execute all lanes, until every lane is halted.
+        Every lane stops at the end of program, after max_steps
+        commands or on error. Returns count of lockstep steps.
+        """
+        n_cmds = len(self.cmds)
+        lockstep = 0
+        while True:
+            running = self.halt_codes == RUNNING
+            self.halt_codes[running & (self.pc >= n_cmds)] = END
+            if max_steps is not None:
+                self.halt_codes[
+                    (self.halt_codes == RUNNING)
+                    & (self.steps >= max_steps)
+                ] = MAX_STEPS
+            lanes = np.flatnonzero(self.halt_codes == RUNNING)
+            if not lanes.size:
+                return lockstep
+            pcs = self.pc[lanes]
+            first_pc = pcs[0]
+            if (pcs == first_pc).all():
+                self.__execute(int(first_pc), lanes)
+            else:
+                groups, group_of_lane = np.unique(pcs, return_inverse=True)
+                for group, pc in enumerate(groups):
+                    self.__execute(int(pc), lanes[group_of_lane == group])
+            self.steps[lanes] += 1
+            lockstep += 1
+
+    def halt_reason(self, lane):
+        return HALT_REASONS[self.halt_codes[lane]]
+
+    def lane_state(self, lane):
+        """
+        State of one lane in the same format, as Assembler.get_state
+        """
+        R = {
+            register: int(self.R[lane, register])
+            for register in range(1, self.n_registers + 1)
+        }
+        R.update({
+            'PC': int(self.pc[lane]),
+            'SP': int(self.sp[lane]),
+        })
+        return {
+            'R': R,
+            'flags': {flag: bool(self.flags[flag][lane]) for flag in FLAGS},
+            'stack': array(STACK_TYPECODE, self.stack[lane].tobytes()),
+            'memory': array(MEMORY_TYPECODE, self.memory[lane].tobytes()),
+        }
+
+    def lane_result(self, lane):
+        """
+        RunResult of one lane
+        """
+        return RunResult(
+            self.halt_reason(lane),
+            int(self.steps[lane]),
+            self.lane_state(lane),
+            self.errors.get(lane),
+        )
+
+    def __execute(self, pc, lanes):
+        """
+        Execute command at PC for the group of lanes
+        """
+        cmd = self.cmds[pc]
+        code = cmd.code
+        if code in ALU_OPS:
+            name, pops, pushes = ALU_OPS[code]
+            lanes = self.__safe_stack(pc, lanes, pops, pushes)
+            lanes = self.__safe_values(name, lanes)
+            if lanes.size:
+                self.__alu(name, lanes)
+                self.pc[lanes] += 1
+        elif code == PUSH_CODE and cmd.mode != MODE_NONE:
+            lanes = self.__safe_stack(pc, lanes, 0, 1)
+            if cmd.mode == MODE_LITERAL:
+                value = np.full(lanes.size, cmd.literal, dtype=np.int64)
+            elif cmd.mode == MODE_REGISTER:
+                value = self.R[lanes, cmd.register]
+            elif cmd.mode == MODE_DIRECT:
+                value = self.memory[lanes, cmd.address]
+            else:
+                lanes = self.__safe_address(pc, lanes, cmd.register)
+                address = self.R[lanes, cmd.register]
+                value = self.memory[lanes, address]
+            self.__push(lanes, value)
+            self.pc[lanes] += 1
+        elif code == POP_CODE and cmd.mode != MODE_NONE:
+            lanes = self.__safe_stack(pc, lanes, 1, 0)
+            if cmd.mode == MODE_INDIRECT:
+                lanes = self.__safe_address(pc, lanes, cmd.register)
+                address = self.R[lanes, cmd.register]
+                self.memory[lanes, address] = self.__pop(lanes)
+            elif cmd.mode == MODE_DIRECT:
+                self.memory[lanes, cmd.address] = self.__pop(lanes)
+            elif cmd.mode == MODE_REGISTER:
+                self.R[lanes, cmd.register] = self.__pop(lanes)
+            self.pc[lanes] += 1
+        elif code == JMP_CODE:
+            self.pc[lanes] = cmd.address
+        elif code in CONDITIONAL_JUMPS:
+            flag, value = CONDITIONAL_JUMPS[code]
+            jump = self.flags[flag][lanes] == value
+            self.pc[lanes] = np.where(jump, cmd.address, pc + 1)
+        elif code == NOPE_CODE:
+            self.pc[lanes] += 1
+        else:
+            for lane in lanes:
+                self.__scalar_step(lane)
+
+    def __safe_stack(self, pc, lanes, pops, pushes):
+        """
+        Lanes, where command doesn't go out of stack bounds.
+        Other lanes are executed by assembler.
+        """
+        sp = self.sp[lanes]
+        safe = (sp >= pops) & (sp - pops + pushes <= self.stack.shape[1])
+        if safe.all():
+            return lanes
+        for lane in lanes[~safe]:
+            self.__scalar_step(lane)
+        return lanes[safe]
+
+    def __safe_address(self, pc, lanes, register):
+        """
+        Lanes, where indirect address is in memory.
+        Other lanes are executed by assembler.
+        """
+        address = self.R[lanes, register]
+        safe = (address >= 0) & (address < self.memory.shape[1])
+        if safe.all():
+            return lanes
+        for lane in lanes[~safe]:
+            self.__scalar_step(lane)
+        return lanes[safe]
+
+    def __safe_values(self, name, lanes):
+        """
+        Lanes, where stack operation doesn't go out of 64 bits.
+        Other lanes are executed by assembler.
+        """
+        if name in SAFE_OPS or not lanes.size:
+            return lanes
+        sp = self.sp[lanes]
+        op1 = self.stack[lanes, sp - 1]
+        if name == 'INC':
+            safe = op1 < INT64_MAX
+        elif name == 'DEC':
+            # abs(op1 - 1) must also be in 64 bits
+            safe = op1 > INT64_MIN + 1
+        elif name == 'SHL':
+            safe = (op1 >= INT64_MIN // 2) & (op1 <= INT64_MAX // 2)
+        else:
+            op2 = self.stack[lanes, sp - 2]
+            if name == 'MUL':
+                safe = (op1 != INT64_MIN) & (op2 != INT64_MIN)
+                a = np.abs(np.where(safe, op1, 0))
+                b = np.abs(np.where(safe, op2, 0))
+                safe &= a <= INT64_MAX // np.maximum(b, 1)
+            else:
+                safe = (
+                    (op1 >= -ADD_OPERAND_LIMIT) & (op1 < ADD_OPERAND_LIMIT)
+                    & (op2 >= -ADD_OPERAND_LIMIT) & (op2 < ADD_OPERAND_LIMIT)
+                )
+        if safe.all():
+            return lanes
+        for lane in lanes[~safe]:
+            self.__scalar_step(lane)
+        return lanes[safe]
+
+    def __scalar_step(self, lane):
+        """
+        Execute one command of one lane by assembler handlers
+        """
+        scalar = self.__scalar
+        state = self.lane_state(lane)
+        scalar.R = state['R']
+        scalar.flags.update(state['flags'])
+        scalar.stack = state['stack']
+        scalar.memory = state['memory']
+        scalar.stack_high_water = int(self.stack_high_water[lane])
+        cmd = self.cmds[scalar.R['PC']]
+        try:
+            scalar.dispatch[cmd.code](cmd)
+        except StackError as ex:
+            self.__halt(lane, HALT_REASONS.index(ex.halt_reason), ex)
+        except Exception as ex:
+            self.__halt(lane, ERROR, ex)
+        # State is copied back also after error, as it is in Assembler
+        try:
+            for register in range(1, self.n_registers + 1):
+                self.R[lane, register] = scalar.R[register]
+            self.pc[lane] = scalar.R['PC']
+            self.sp[lane] = scalar.R['SP']
+            for flag in FLAGS:
+                self.flags[flag][lane] = scalar.flags[flag]
+            self.stack[lane] = np.frombuffer(scalar.stack, dtype=np.int64)
+            self.stack_high_water[lane] = scalar.stack_high_water
+            self.memory[lane] = np.frombuffer(scalar.memory, dtype=np.int64)
+        except Exception as ex:
+            self.__halt(lane, ERROR, ex)
+
+    def __halt(self, lane, halt_code, ex):
+        """
+        Stop lane on exception of command
+        """
+        if self.halt_codes[lane] != RUNNING:
+            return
+        self.halt_codes[lane] = halt_code
+        if isinstance(ex, StackError):
+            self.errors[lane] = str(ex)
+        else:
+            self.errors[lane] = f'{type(ex).__name__}: {ex}'
+        # Failed command isn't counted, as in Assembler.run
+        self.steps[lane] -= 1
+
+    def __push(self, lanes, value):
+        sp = self.sp[lanes]
+        self.stack[lanes, sp] = value
+        sp += 1
+        self.sp[lanes] = sp
+        self.stack_high_water[lanes] = np.maximum(
+            self.stack_high_water[lanes], sp)
+
+    def __pop(self, lanes):
+        sp = self.sp[lanes] - 1
+        self.sp[lanes] = sp
+        return self.stack[lanes, sp]
+
+    def __update_flags(self, lanes, res):
+        self.flags['Z'][lanes] = res == 0
+        self.flags['S'][lanes] = res < 0
+        self.flags['P'][lanes] = res % 2 == 0
+        limit = 2 ** self.literal_length
+        self.flags['C'][lanes] = (2 * limit >= res) & (res >= limit)
+        self.flags['O'][lanes] = res >= limit
+
+    def __alu(self, name, lanes):
+        """
+        Stack operation for the group of lanes
+        """
+        max_literal = 2 ** self.literal_length - 1
+        if name in ['INC', 'DEC', 'NOT', 'SHL', 'SHR']:
+            op = self.__pop(lanes)
+            res = {
+                'INC': lambda: op + 1,
+                'DEC': lambda: op - 1,
+                'NOT': lambda: ~op,
+                'SHL': lambda: op << 1,
+                'SHR': lambda: op >> 1,
+            }[name]()
+            self.__push(lanes, np.abs(res) if name == 'DEC' else res)
+            self.__update_flags(lanes, res)
+            return
+        op1 = self.__pop(lanes)
+        op2 = self.__pop(lanes)
+        if name == 'ADC':
+            res = op1 + op2 + self.flags['C'][lanes]
+            self.__update_flags(lanes, res)
+            # If carry, push only junior bits of number
+            self.__push(lanes, np.where(
+                self.flags['C'][lanes], res & max_literal, res))
+            return
+        res = {
+            'ADD': lambda: op1 + op2,
+            'SUB': lambda: op2 - op1,
+            'CMP': lambda: op2 - op1,
+            'OR': lambda: op1 | op2,
+            'AND': lambda: op1 & op2,
+            'XOR': lambda: op1 ^ op2,
+            'NOR': lambda: ~(op1 | op2),
+            'MUL': lambda: op1 * op2,
+        }[name]()
+        self.__update_flags(lanes, res)
+        if name == 'SUB':
+            self.__push(lanes, np.abs(res))
+        elif name == 'MUL':
+            # On overflow, senior part is first literal_length bits
+            # of result and junior part is last literal_length bits
+            overflow = self.flags['O'][lanes]
+            junior = np.where(overflow, res & max_literal, res)
+            shift = np.maximum(_bit_length(res) - self.literal_length, 0)
+            senior = np.where(overflow, res >> shift, 0)
+            self.__push(lanes, senior)
+            self.__push(lanes, junior)
+        elif name != 'CMP':
+            self.__push(lanes, res)
+
+
+def _bit_length(values):
+    """
+    int.bit_length for array of non negative 64-bit integers
+    """
+    values = np.maximum(values, 0)
+    length = np.zeros(values.shape, dtype=np.int64)
+    for shift in [32, 16, 8, 4, 2, 1]:
+        big = values >= (1 << shift)
+        length[big] += shift
+        values = np.where(big, values >> shift, values)
+    return length + (values > 0)
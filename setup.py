@@ -9,4 +9,10 @@ setup(
     author="Darkovsky Ilya",
     description="A Assembler compiler",
     packages=find_packages(),
+    package_data={'pyasm': ['asm_grammar.txt']},
+    entry_points={
+        'console_scripts': [
+            'pyasm=pyasm.__main__:main',
+        ],
+    },
 )